@@ -1,5 +1,5 @@
 from datetime import datetime, timedelta
-from typing import List
+from typing import Dict, List
 
 import jwt
 from django.conf import settings
@@ -11,6 +11,7 @@ from ninja.security import HttpBearer
 from pydantic import BaseModel
 
 from .models import User, UserProfile
+from .principal import principal_cache
 
 router = Router()
 
@@ -39,6 +40,7 @@ class UserSchema(BaseModel):
     bio: str
     location: str
     is_profile_public: bool
+    avatar_urls: Dict[str, str] = {}
     created_at: datetime
 
     class Config:
@@ -53,34 +55,59 @@ class TokenSchema(BaseModel):
 
 # JWT Bearer token authentication
 class JWTAuth(HttpBearer):
-    def authenticate(self, request, token):
+    """Resolve the token to a User, served from the principal cache"""
+
+    def decode(self, token):
         try:
             payload = jwt.decode(
                 token,
                 settings.JWT_SETTINGS["SECRET_KEY"],
                 algorithms=[settings.JWT_SETTINGS["ALGORITHM"]],
             )
-            user_id = payload.get("user_id")
-            if user_id:
-                user = User.objects.get(id=user_id)
-                return user
-        except (jwt.InvalidTokenError, User.DoesNotExist):
-            pass
+        except jwt.InvalidTokenError:
+            return None
+        if not payload.get("user_id"):
+            return None
+        return payload
+
+    def authenticate(self, request, token):
+        payload = self.decode(token)
+        if payload:
+            return principal_cache.get(payload["user_id"], payload.get("ver", 0))
+        return None
+
+
+class JWTUserIdAuth(JWTAuth):
+    """
+    Resolve the token to the user id only, for endpoints that never need the
+    User model. Revocation is checked through the principal cache, which
+    loads the user on a miss, so only the model copy is skipped.
+    """
+
+    def authenticate(self, request, token):
+        payload = self.decode(token)
+        if payload and not principal_cache.is_revoked(
+            payload["user_id"], payload.get("ver", 0)
+        ):
+            return payload["user_id"]
         return None
 
 
 auth = JWTAuth()
+auth_id = JWTUserIdAuth()
 
 
 def create_tokens(user):
     """Create access and refresh tokens for a user"""
     access_payload = {
         "user_id": user.id,
+        "ver": user.token_version,
         "exp": datetime.utcnow()
         + timedelta(minutes=settings.JWT_SETTINGS["ACCESS_TOKEN_EXPIRE_MINUTES"]),
     }
     refresh_payload = {
         "user_id": user.id,
+        "ver": user.token_version,
         "exp": datetime.utcnow()
         + timedelta(days=settings.JWT_SETTINGS["REFRESH_TOKEN_EXPIRE_DAYS"]),
     }
@@ -0,0 +1,171 @@
+"""
+Geographic helpers for location-based features.
+
+Users are indexed by the geohash of their coordinates (``User.geo_cell``).
+Geohashes interleave longitude and latitude bits, so every cell is a prefix
+of the cells inside it and a cell's users form one contiguous range of the
+B-tree index. A radius search covers its bounding box with a handful of
+cells, reads their ranges, and refines the candidates with haversine.
+"""
+
+import math
+
+from django.db.models import Q
+
+EARTH_RADIUS_KM = 6371.0088
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+# About 4.8 m x 4.8 m at the equator
+GEOHASH_PRECISION = 9
+# Upper bound on cells read by a radius search
+MAX_COVERING_CELLS = 32
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in kilometres between two coordinates"""
+    lat1, lon1, lat2, lon2 = map(math.radians, map(float, (lat1, lon1, lat2, lon2)))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def encode(lat, lon, precision=GEOHASH_PRECISION):
+    """Geohash of a coordinate"""
+    lat, lon = float(lat), float(lon)
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits = value = 0
+    even = True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, lon) if even else (lat_range, lat)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = value = 0
+    return "".join(chars)
+
+
+def cell_size(precision):
+    """``(lat_degrees, lon_degrees)`` spanned by a cell of ``precision``"""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2**lat_bits, 360.0 / 2**lon_bits
+
+
+def bounding_box(lat, lon, radius_km):
+    """``(south, north, west, east)`` around a point; west > east across 180"""
+    lat, lon = float(lat), float(lon)
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    south, north = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    if south == -90.0 or north == 90.0:
+        return south, north, -180.0, 180.0
+    dlon = math.degrees(
+        math.asin(
+            min(
+                1.0, math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(lat))
+            )
+        )
+    )
+    if dlon >= 90.0:
+        return south, north, -180.0, 180.0
+    west, east = lon - dlon, lon + dlon
+    if west < -180.0:
+        west += 360.0
+    if east > 180.0:
+        east -= 360.0
+    return south, north, west, east
+
+
+def successor(prefix):
+    """Smallest geohash that sorts after every hash starting with ``prefix``"""
+    while prefix:
+        position = GEOHASH_ALPHABET.index(prefix[-1])
+        if position + 1 < len(GEOHASH_ALPHABET):
+            return prefix[:-1] + GEOHASH_ALPHABET[position + 1]
+        prefix = prefix[:-1]
+    return None
+
+
+def covering_cells(lat, lon, radius_km, max_cells=MAX_COVERING_CELLS):
+    """
+    Geohash prefixes whose cells together cover the circle around a point:
+    the finest precision at which its bounding box spans at most
+    ``max_cells`` cells.
+    """
+    south, north, west, east = bounding_box(lat, lon, radius_km)
+    lon_span = east - west if west <= east else east - west + 360.0
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_size, lon_size = cell_size(precision)
+        total_rows, total_columns = round(180.0 / lat_size), round(360.0 / lon_size)
+        first_row = int((south + 90.0) // lat_size)
+        last_row = min(int((north + 90.0) // lat_size), total_rows - 1)
+        first_column = int((west + 180.0) // lon_size)
+        last_column = int((west + 180.0 + lon_span) // lon_size)
+        rows = last_row - first_row + 1
+        columns = min(last_column - first_column + 1, total_columns)
+        if rows * columns <= max_cells:
+            break
+
+    cells = set()
+    for row in range(first_row, last_row + 1):
+        for offset in range(columns):
+            column = (first_column + offset) % total_columns
+            cells.add(
+                encode(
+                    -90.0 + (row + 0.5) * lat_size,
+                    -180.0 + (column + 0.5) * lon_size,
+                    precision,
+                )
+            )
+    return sorted(cells)
+
+
+def cell_ranges(cells):
+    """
+    Merge sorted geohash prefixes into ``(low, high)`` key ranges, where
+    ``high`` is exclusive (None when unbounded). Neighbouring cells are often
+    adjacent in geohash order and collapse into one range.
+    """
+    ranges = []
+    for cell in cells:
+        high = successor(cell)
+        if ranges and ranges[-1][1] == cell:
+            ranges[-1] = (ranges[-1][0], high)
+        else:
+            ranges.append((cell, high))
+    return ranges
+
+
+def radius_filter(lat, lon, radius_km, prefix=""):
+    """
+    Condition selecting users whose cell may lie within ``radius_km`` of a
+    point: the covering cells' key ranges, narrowed to the bounding box.
+    ``prefix`` reaches the user through a relation, e.g. ``"user__"``.
+    Callers refine the candidates with haversine_km.
+    """
+    cells = Q()
+    for low, high in cell_ranges(covering_cells(lat, lon, radius_km)):
+        cell = Q(**{f"{prefix}geo_cell__gte": low})
+        if high is not None:
+            cell &= Q(**{f"{prefix}geo_cell__lt": high})
+        cells |= cell
+
+    south, north, west, east = bounding_box(lat, lon, radius_km)
+    box = Q(**{f"{prefix}latitude__range": (south, north)})
+    if west <= east:
+        box &= Q(**{f"{prefix}longitude__range": (west, east)})
+    else:
+        box &= Q(**{f"{prefix}longitude__gte": west}) | Q(
+            **{f"{prefix}longitude__lte": east}
+        )
+    return cells & box
@@ -0,0 +1,281 @@
+"""
+Offline geocoding of the free-text ``User.location`` field.
+
+Places come from a local gazetteer: the bundled ``accounts/data/cities.csv``
+or a GeoNames ``cities*.txt`` dump named by ``GEOCODER["CITIES_PATH"]``.
+Nothing is fetched over the network. The gazetteer is loaded once per
+process into flat arrays, with names reachable through a dict keyed by the
+hash of their normalised form; a second dict keyed by single-character
+deletions of each name catches typos ("Edinbrugh", "Pariss").
+
+A location such as "Portland, OR" or "Shoreditch, London, UK" is split into
+segments. Each segment is tried as a place name in turn, with the segments
+after it read as country or state qualifiers; among several places of the
+same name the most populous one matching the qualifiers wins. Results are
+memoised in an LRU cache since profiles repeat the same few place strings.
+"""
+
+import csv
+import re
+import threading
+import unicodedata
+from array import array
+from collections import defaultdict, namedtuple
+from decimal import Decimal
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+COORDINATE_PLACES = Decimal("0.000001")
+# Shorter names are too ambiguous to correct
+MIN_FUZZY_LENGTH = 5
+SEGMENT_RE = re.compile(r"[,;/()|]|\s-\s")
+ABBREVIATIONS = {"st": "saint", "ste": "sainte", "mt": "mount", "ft": "fort"}
+
+
+class Place(namedtuple("Place", ["name", "country", "latitude", "longitude"])):
+    def coordinates(self):
+        """``(latitude, longitude)`` as Decimals fitting the User fields"""
+        return (
+            Decimal(self.latitude).quantize(COORDINATE_PLACES),
+            Decimal(self.longitude).quantize(COORDINATE_PLACES),
+        )
+
+
+def normalize(text):
+    """Lower-case, strip accents and punctuation, expand abbreviations"""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    words = re.sub(r"[^\w]+", " ", text.lower().replace("'", "")).split()
+    return " ".join(ABBREVIATIONS.get(word, word) for word in words)
+
+
+def deletions(key):
+    return {key[:i] + key[i + 1 :] for i in range(len(key))}
+
+
+def read_cities(path):
+    """
+    Yield ``(name, aliases, country, admin1, latitude, longitude, population)``
+    from the bundled CSV or a GeoNames dump (only its name and ASCII name are
+    used, its alternate names cover every language and would bloat the index).
+    """
+    with open(path, encoding="utf-8", newline="") as stream:
+        if str(path).endswith(".txt"):
+            for row in csv.reader(stream, delimiter="\t", quoting=csv.QUOTE_NONE):
+                yield (
+                    row[1],
+                    [row[2]],
+                    row[8],
+                    row[10],
+                    float(row[4]),
+                    float(row[5]),
+                    int(row[14] or 0),
+                )
+            return
+        for row in csv.DictReader(stream):
+            yield (
+                row["name"],
+                [alias for alias in row["alternate_names"].split("|") if alias],
+                row["country"],
+                row["admin1"],
+                float(row["latitude"]),
+                float(row["longitude"]),
+                int(row["population"] or 0),
+            )
+
+
+class Gazetteer:
+    def __init__(self, cities, countries=(), regions=(), cache_size=10000):
+        # Most populous first, so candidate tuples come out ranked
+        cities = sorted(cities, key=lambda city: -city[6])
+        self.names = []
+        self.countries = []
+        self.regions = []
+        self.latitudes = array("d")
+        self.longitudes = array("d")
+        by_name = defaultdict(list)
+        by_deletion = defaultdict(set)
+        for place_id, (name, aliases, country, admin1, lat, lon, _) in enumerate(
+            cities
+        ):
+            self.names.append(name)
+            self.countries.append(country)
+            self.regions.append(admin1)
+            self.latitudes.append(lat)
+            self.longitudes.append(lon)
+            for key in {normalize(alias) for alias in [name, *aliases]} - {""}:
+                by_name[hash(key)].append(place_id)
+                if len(key) >= MIN_FUZZY_LENGTH:
+                    for variant in deletions(key) | {key}:
+                        by_deletion[hash(variant)].add(place_id)
+        self.by_name = {key: tuple(ids) for key, ids in by_name.items()}
+        self.by_deletion = {key: tuple(sorted(ids)) for key, ids in by_deletion.items()}
+
+        # Qualifier -> country codes, and (country, qualifier) -> region codes
+        self.country_keys = defaultdict(set)
+        for code, names in countries:
+            for name in [code, *names]:
+                self.country_keys[normalize(name)].add(code)
+        self.region_keys = defaultdict(set)
+        for country, code, name in regions:
+            for key in (normalize(code), normalize(name)):
+                self.region_keys[key].add((country, code))
+
+        self.geocode = lru_cache(maxsize=cache_size)(self._geocode)
+
+    @classmethod
+    def load(cls, cities_path=None, cache_size=10000):
+        with open(DATA_DIR / "countries.csv", encoding="utf-8", newline="") as stream:
+            countries = [
+                (
+                    row["code"],
+                    [row["name"], *filter(None, row["alternate_names"].split("|"))],
+                )
+                for row in csv.DictReader(stream)
+            ]
+        with open(DATA_DIR / "admin1.csv", encoding="utf-8", newline="") as stream:
+            regions = [
+                (row["country"], row["code"], row["name"])
+                for row in csv.DictReader(stream)
+            ]
+        return cls(
+            read_cities(cities_path or DATA_DIR / "cities.csv"),
+            countries,
+            regions,
+            cache_size,
+        )
+
+    def __len__(self):
+        return len(self.names)
+
+    def place(self, place_id):
+        return Place(
+            self.names[place_id],
+            self.countries[place_id],
+            self.latitudes[place_id],
+            self.longitudes[place_id],
+        )
+
+    def _qualifies(self, place_id, qualifiers):
+        """Whether a place is in every country or region named by qualifiers"""
+        country = self.countries[place_id]
+        region = (country, self.regions[place_id])
+        return all(
+            country in self.country_keys.get(key, ())
+            or region in self.region_keys.get(key, ())
+            for key in qualifiers
+        )
+
+    def _known_qualifier(self, key):
+        return key in self.country_keys or key in self.region_keys
+
+    def _best(self, candidates, qualifiers):
+        for place_id in candidates:
+            if self._qualifies(place_id, qualifiers):
+                return place_id
+        return None
+
+    def _match(self, key, qualifiers, fuzzy):
+        place_id = self._best(self.by_name.get(hash(key), ()), qualifiers)
+        if place_id is None and fuzzy and len(key) >= MIN_FUZZY_LENGTH:
+            candidates = set()
+            for variant in deletions(key) | {key}:
+                candidates.update(self.by_deletion.get(hash(variant), ()))
+            place_id = self._best(sorted(candidates), qualifiers)
+        return place_id
+
+    def _geocode(self, text):
+        segments = [normalize(part) for part in SEGMENT_RE.split(text or "")]
+        segments = [segment for segment in segments if segment]
+        for fuzzy in (False, True):
+            for position, segment in enumerate(segments):
+                qualifiers = [
+                    key
+                    for key in segments[position + 1 :]
+                    if self._known_qualifier(key)
+                ]
+                place_id = self._match(segment, qualifiers, fuzzy)
+                if place_id is None:
+                    # "London UK", "Portland Oregon": trailing words qualify
+                    words = segment.split()
+                    for split in range(len(words) - 1, 0, -1):
+                        tail = " ".join(words[split:])
+                        if self._known_qualifier(tail):
+                            place_id = self._match(
+                                " ".join(words[:split]), [tail, *qualifiers], fuzzy
+                            )
+                            if place_id is not None:
+                                break
+                if place_id is not None:
+                    return self.place(place_id)
+        return None
+
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+
+def get_gazetteer():
+    """Return the process-wide gazetteer, loading it on first use"""
+    global _gazetteer
+    if _gazetteer is None:
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                options = settings.GEOCODER
+                _gazetteer = Gazetteer.load(
+                    options["CITIES_PATH"], options["CACHE_SIZE"]
+                )
+    return _gazetteer
+
+
+def geocode(text):
+    """Return the Place a free-text location names, or None"""
+    if not text or not text.strip():
+        return None
+    return get_gazetteer().geocode(text.strip())
+
+
+def backfill_coordinates(user_model, batch_size=5000, overwrite=False):
+    """
+    Geocode the location of users without coordinates (every user with a
+    location if ``overwrite``), walking the table by id. Users in a batch
+    that resolve to the same place are updated with one statement.
+    Returns ``(users_checked, users_located)``.
+    """
+    from .geo import encode
+
+    users = user_model.objects.exclude(location="")
+    if not overwrite:
+        users = users.filter(Q(latitude__isnull=True) | Q(longitude__isnull=True))
+    checked = located = 0
+    last_id = 0
+    while True:
+        batch = list(
+            users.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", "location")[:batch_size]
+        )
+        if not batch:
+            return checked, located
+        last_id = batch[-1][0]
+        by_place = defaultdict(list)
+        for user_id, location in batch:
+            place = geocode(location)
+            if place is not None:
+                by_place[place].append(user_id)
+        with transaction.atomic():
+            for place, user_ids in by_place.items():
+                latitude, longitude = place.coordinates()
+                # update() skips User.save(), so set the cell here too
+                user_model.objects.filter(id__in=user_ids).update(
+                    latitude=latitude,
+                    longitude=longitude,
+                    geo_cell=encode(latitude, longitude),
+                )
+                located += len(user_ids)
+        checked += len(batch)
@@ -0,0 +1,36 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from accounts.geocoder import backfill_coordinates, get_gazetteer
+
+
+class Command(BaseCommand):
+    help = "Fill user coordinates from their free-text location, offline"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--overwrite",
+            action="store_true",
+            help="Re-geocode users that already have coordinates",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        gazetteer = get_gazetteer()
+        self.stdout.write(
+            f"Loaded {len(gazetteer)} places in {time.perf_counter() - started:.1f}s"
+        )
+        started = time.perf_counter()
+        checked, located = backfill_coordinates(
+            get_user_model(),
+            batch_size=options["batch_size"],
+            overwrite=options["overwrite"],
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"Located {located} of {checked} users in {elapsed:.1f}s "
+            f"({checked / elapsed * 60 if elapsed else 0:.0f} profiles/min)"
+        )
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.1 on 2026-10-16 20:52
+
+from django.db import migrations, models
+
+import blobs.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0003_user_avatar_renditions"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="user",
+            name="avatar",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                storage=blobs.storage.get_storage,
+                upload_to="avatars/",
+            ),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.0.1 on 2026-10-16 20:56
+
+from django.db import migrations, models
+
+# Frozen copy of accounts.geo.encode at precision 9, so later changes there
+# cannot alter what this migration writes
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 9
+
+
+def encode(lat, lon):
+    lat, lon = float(lat), float(lon)
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits = value = 0
+    even = True
+    while len(chars) < GEOHASH_PRECISION:
+        interval, coordinate = (lon_range, lon) if even else (lat_range, lat)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = value = 0
+    return "".join(chars)
+
+
+def fill_geo_cells(apps, schema_editor):
+    User = apps.get_model("accounts", "User")
+    located = User.objects.filter(latitude__isnull=False, longitude__isnull=False)
+    last_id = 0
+    while True:
+        batch = list(
+            located.filter(id__gt=last_id)
+            .order_by("id")
+            .only("id", "latitude", "longitude")[:2000]
+        )
+        if not batch:
+            return
+        last_id = batch[-1].id
+        for user in batch:
+            user.geo_cell = encode(user.latitude, user.longitude)
+        User.objects.bulk_update(batch, ["geo_cell"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0004_alter_user_avatar"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="geo_cell",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=12, null=True
+            ),
+        ),
+        migrations.RunPython(fill_geo_cells, migrations.RunPython.noop),
+    ]
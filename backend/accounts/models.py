@@ -1,6 +1,8 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+from blobs.storage import get_storage
+
 
 class User(AbstractUser):
     """
@@ -12,7 +14,11 @@ class User(AbstractUser):
     last_name = models.CharField(max_length=30)
     bio = models.TextField(max_length=500, blank=True)
     location = models.CharField(max_length=100, blank=True)
-    avatar = models.ImageField(upload_to="avatars/", blank=True, null=True)
+    avatar = models.ImageField(
+        upload_to="avatars/", storage=get_storage, blank=True, null=True
+    )
+    # Stored resized copies of avatar (see bookexchange.renditions)
+    avatar_renditions = models.JSONField(default=dict, blank=True, editable=False)
     date_of_birth = models.DateField(blank=True, null=True)
     phone_number = models.CharField(max_length=20, blank=True)
 
@@ -28,6 +34,13 @@ class User(AbstractUser):
     longitude = models.DecimalField(
         max_digits=9, decimal_places=6, blank=True, null=True
     )
+    # Geohash of latitude/longitude, maintained by save() (see accounts.geo)
+    geo_cell = models.CharField(
+        max_length=12, blank=True, null=True, db_index=True, editable=False
+    )
+
+    # Bumped to revoke every token issued so far
+    token_version = models.PositiveIntegerField(default=0)
 
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
@@ -46,6 +59,66 @@ class User(AbstractUser):
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.email})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_location()
+        return instance
+
+    def _remember_location(self):
+        self._loaded_location = (
+            self.__dict__.get("location"),
+            self.__dict__.get("latitude"),
+            self.__dict__.get("longitude"),
+        )
+
+    def fill_coordinates(self):
+        """
+        Geocode ``location`` into latitude/longitude when they are missing, or
+        when the location changed and the coordinates were not set with it.
+        Returns whether the coordinates were set.
+        """
+        from .geocoder import geocode
+
+        if "location" in self.get_deferred_fields():
+            return False
+        loaded_location, *loaded_coordinates = getattr(
+            self, "_loaded_location", (None, None, None)
+        )
+        missing = self.latitude is None or self.longitude is None
+        moved = (
+            self.location != loaded_location
+            and [self.latitude, self.longitude] == loaded_coordinates
+        )
+        if not self.location or not (missing or moved):
+            return False
+        place = geocode(self.location)
+        if place is None:
+            return False
+        self.latitude, self.longitude = place.coordinates()
+        return True
+
+    def save(self, *args, **kwargs):
+        from .geo import encode
+
+        update_fields = kwargs.get("update_fields")
+        if (
+            update_fields is None or "location" in update_fields
+        ) and self.fill_coordinates():
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "latitude", "longitude"}
+
+        if self.latitude is None or self.longitude is None:
+            self.geo_cell = None
+        else:
+            self.geo_cell = encode(self.latitude, self.longitude)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"latitude", "longitude"} & set(update_fields):
+            kwargs["update_fields"] = {*update_fields, "geo_cell"}
+
+        super().save(*args, **kwargs)
+        self._remember_location()
+
     @property
     def full_name(self):
         return f"{self.first_name} {self.last_name}".strip()
@@ -54,33 +127,31 @@ class User(AbstractUser):
     def display_name(self):
         return self.full_name or self.username
 
+    @property
+    def avatar_urls(self):
+        from bookexchange.renditions import rendition_urls
+
+        return rendition_urls(self, "avatar")
+
+    def revoke_tokens(self):
+        """Invalidate all access and refresh tokens issued to this user"""
+        self.token_version = models.F("token_version") + 1
+        self.save(update_fields=["token_version"])
+        self.refresh_from_db(fields=["token_version"])
+
     def get_friends(self):
         """Get all friends for this user"""
-        from friendships.models import Friendship
+        from friendships.graph import friends
 
-        friendships = Friendship.objects.filter(
-            models.Q(user1=self, status="accepted")
-            | models.Q(user2=self, status="accepted")
-        )
-        friends = []
-        for friendship in friendships:
-            if friendship.user1 == self:
-                friends.append(friendship.user2)
-            else:
-                friends.append(friendship.user1)
-        return friends
+        return list(friends(self.pk))
 
     def get_friends_of_friends(self):
         """Get friends of friends (excluding direct friends and self)"""
-        friends = self.get_friends()
-        friends_of_friends = set()
-
-        for friend in friends:
-            for fof in friend.get_friends():
-                if fof != self and fof not in friends:
-                    friends_of_friends.add(fof)
+        from friendships.graph import friends_of_friends
 
-        return list(friends_of_friends)
+        ids = [user_id for user_id, _ in friends_of_friends(self.pk)]
+        users = User.objects.in_bulk(ids)
+        return [users[user_id] for user_id in ids if user_id in users]
 
 
 class UserProfile(models.Model):
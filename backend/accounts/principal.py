@@ -0,0 +1,123 @@
+"""
+Cached resolution of the authenticated principal for JWT requests.
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import User
+
+
+class PrincipalCache:
+    """
+    Bounded per-process LRU of authenticated users, optionally backed by a
+    shared Django cache so that workers warm each other up.
+
+    Entries are stored per user id and only served for tokens carrying the
+    same ``token_version`` as the cached user, so revoked tokens never
+    resolve from a stale entry.
+    """
+
+    key_prefix = "principal"
+
+    def __init__(self, max_size=10000, timeout=300, shared_cache_alias=""):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.shared_cache_alias = shared_cache_alias
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        options = settings.PRINCIPAL_CACHE
+        return cls(
+            max_size=options["MAX_SIZE"],
+            timeout=options["TIMEOUT"],
+            shared_cache_alias=options["SHARED_CACHE_ALIAS"],
+        )
+
+    @property
+    def shared(self):
+        if self.shared_cache_alias:
+            return caches[self.shared_cache_alias]
+        return None
+
+    def _shared_key(self, user_id):
+        return f"{self.key_prefix}:{user_id}"
+
+    def _get_local(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return user
+
+    def _set_local(self, user):
+        with self._lock:
+            self._entries[user.pk] = (time.monotonic() + self.timeout, user)
+            self._entries.move_to_end(user.pk)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _lookup(self, user_id):
+        user = self._get_local(user_id)
+        if user is None and self.shared is not None:
+            user = self.shared.get(self._shared_key(user_id))
+            if user is not None:
+                self._set_local(user)
+        return user
+
+    def set(self, user):
+        self._set_local(user)
+        if self.shared is not None:
+            self.shared.set(self._shared_key(user.pk), user, self.timeout)
+
+    def _resolve(self, user_id, token_version):
+        user = self._lookup(user_id)
+        if user is None or user.token_version < token_version:
+            user = User.objects.filter(id=user_id).first()
+            if user is None:
+                return None
+            self.set(user)
+
+        if user.token_version != token_version or not user.is_active:
+            return None
+        return user
+
+    def get(self, user_id, token_version=0):
+        """
+        Return a private copy of the active user for a token, or None if the
+        user does not exist, is inactive or the token has been revoked.
+        """
+        user = self._resolve(user_id, token_version)
+        return copy.copy(user) if user is not None else None
+
+    def is_revoked(self, user_id, token_version=0):
+        """
+        Check a token the way ``get`` does, without copying the user. A cache
+        miss loads the user, so missing and inactive users count as revoked.
+        """
+        return self._resolve(user_id, token_version) is None
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+        if self.shared is not None:
+            self.shared.delete(self._shared_key(user_id))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+principal_cache = PrincipalCache.from_settings()
@@ -0,0 +1,27 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from bookexchange import renditions
+
+from .models import User
+from .principal import principal_cache
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_principal(sender, instance, **kwargs):
+    """Drop the cached principal now and again once the change is committed"""
+    user_id = instance.pk
+    principal_cache.invalidate(user_id)
+    transaction.on_commit(lambda: principal_cache.invalidate(user_id))
+
+
+@receiver(post_save, sender=User)
+def render_avatar(sender, instance, **kwargs):
+    renditions.schedule(instance, "avatar")
+
+
+@receiver(post_delete, sender=User)
+def discard_avatar_renditions(sender, instance, **kwargs):
+    renditions.discard(instance, "avatar")
@@ -1,3 +1,126 @@
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase
 
-# Create your tests here.
+from .api import create_tokens
+from .geocoder import geocode
+from .models import User
+from .principal import principal_cache
+
+
+class GeocoderTests(SimpleTestCase):
+    def assertPlace(self, text, name, country):
+        place = geocode(text)
+        self.assertIsNotNone(place, text)
+        self.assertEqual((place.name, place.country), (name, country))
+
+    def test_qualifiers_pick_between_places_of_the_same_name(self):
+        self.assertPlace("London", "London", "GB")
+        self.assertPlace("London, Ontario", "London", "CA")
+        self.assertPlace("Portland, OR", "Portland", "US")
+        self.assertPlace("Portland Maine", "Portland", "US")
+        self.assertNotEqual(geocode("Portland, OR"), geocode("Portland, ME"))
+
+    def test_aliases_accents_and_typos(self):
+        self.assertPlace("Köln", "Cologne", "DE")
+        self.assertPlace("St Louis", "St. Louis", "US")
+        self.assertPlace("Edinbrugh", "Edinburgh", "GB")
+        self.assertPlace("Shoreditch, London, UK", "London", "GB")
+
+    def test_unknown_places(self):
+        self.assertIsNone(geocode(""))
+        self.assertIsNone(geocode("Paris, Texas"))
+        self.assertIsNone(geocode("Nowhere in particular"))
+
+
+class UserCoordinatesTests(TestCase):
+    def test_location_fills_coordinates_and_cell(self):
+        user = User.objects.create_user(
+            username="reader",
+            email="reader@example.com",
+            password="secret",
+            location="Edinburgh, Scotland",
+        )
+        self.assertEqual(str(user.latitude), "55.953300")
+        self.assertTrue(user.geo_cell.startswith("gcvwr"))
+
+        user = User.objects.get(pk=user.pk)
+        user.location = "Paris"
+        user.save(update_fields=["location"])
+        user.refresh_from_db()
+        self.assertEqual(str(user.latitude), "48.856600")
+        self.assertTrue(user.geo_cell.startswith("u09t"))
+
+    def test_explicit_coordinates_are_kept(self):
+        user = User.objects.create_user(
+            username="reader",
+            email="reader@example.com",
+            password="secret",
+            location="Berlin",
+            latitude="1.5",
+            longitude="2.5",
+        )
+        user.refresh_from_db()
+        self.assertEqual(
+            (str(user.latitude), str(user.longitude)), ("1.500000", "2.500000")
+        )
+
+
+class PrincipalCacheTests(TestCase):
+    def setUp(self):
+        principal_cache.clear()
+        self.user = User.objects.create_user(
+            username="reader", email="reader@example.com", password="secret"
+        )
+        self.access_token, _ = create_tokens(self.user)
+
+    def get(self, path, token):
+        return self.client.get(path, HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def test_repeat_lookups_are_served_from_the_cache(self):
+        principal_cache.invalidate(self.user.id)
+        with self.assertNumQueries(1):
+            principal_cache.get(self.user.id)
+        with self.assertNumQueries(0):
+            user = principal_cache.get(self.user.id)
+        self.assertEqual(user.username, "reader")
+        # Callers get a copy they cannot use to poison the cache
+        user.username = "changed"
+        self.assertEqual(principal_cache.get(self.user.id).username, "reader")
+
+    def test_saving_the_user_drops_the_cached_principal(self):
+        principal_cache.get(self.user.id)
+        self.user.first_name = "Ada"
+        self.user.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(principal_cache.get(self.user.id).first_name, "Ada")
+
+    def test_revoked_tokens_are_rejected(self):
+        self.assertEqual(self.get("/api/auth/me", self.access_token).status_code, 200)
+        self.user.revoke_tokens()
+        self.assertEqual(self.get("/api/auth/me", self.access_token).status_code, 401)
+        new_token, _ = create_tokens(self.user)
+        response = self.get("/api/auth/me", new_token)
+        self.assertEqual(response.json()["id"], self.user.id)
+
+    def test_inactive_users_are_rejected(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get("/api/auth/me", self.access_token).status_code, 401)
+
+    def test_user_id_auth_checks_revocation_against_the_cache(self):
+        response = self.get("/api/friends/", self.access_token)
+        self.assertEqual(response.status_code, 200)
+        self.user.revoke_tokens()
+        response = self.get("/api/friends/", self.access_token)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.get("/api/friends/", "not-a-jwt").status_code, 401)
+
+    def test_user_id_auth_rejects_deactivated_users(self):
+        self.assertEqual(self.get("/api/friends/", self.access_token).status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get("/api/friends/", self.access_token).status_code, 401)
+
+    def test_user_id_auth_rejects_deleted_users(self):
+        self.assertEqual(self.get("/api/friends/", self.access_token).status_code, 200)
+        self.user.delete()
+        self.assertEqual(self.get("/api/friends/", self.access_token).status_code, 401)
@@ -0,0 +1,90 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from blobs.models import Blob
+from blobs.storage import BLOB_PREFIX, content_addressed_storage, digest_of
+
+
+class Command(BaseCommand):
+    help = "Delete stored blobs that nothing references any more"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace-hours",
+            type=int,
+            default=24,
+            help="Keep unreferenced blobs this long, for uploads still in flight",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--scan-storage",
+            action="store_true",
+            help="Also delete stored files that have no Blob row",
+        )
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        backend = content_addressed_storage.backend
+        cutoff = timezone.now() - timedelta(hours=options["grace_hours"])
+        orphans = Blob.objects.filter(refcount__lte=0, updated_at__lt=cutoff)
+
+        deleted = freed = 0
+        last_id = 0
+        while True:
+            ids = list(
+                orphans.filter(id__gt=last_id)
+                .order_by("id")
+                .values_list("id", flat=True)[: options["batch_size"]]
+            )
+            if not ids:
+                break
+            last_id = ids[-1]
+            for blob_id in ids:
+                with transaction.atomic():
+                    # Re-check under the row lock, a new upload may reuse it
+                    blob = orphans.select_for_update().filter(id=blob_id).first()
+                    if blob is None:
+                        continue
+                    if not options["dry_run"]:
+                        backend.delete(blob.name)
+                        blob.delete()
+                    deleted += 1
+                    freed += blob.size
+        self.stdout.write(
+            f"Deleted {deleted} unreferenced blobs, {freed / 1_000_000:.1f} MB"
+        )
+
+        if options["scan_storage"]:
+            self.stdout.write(f"Untracked files removed: {self.scan(backend, options)}")
+
+    def scan(self, backend, options):
+        removed = 0
+        for names in self.walk(backend, BLOB_PREFIX):
+            digests = {digest_of(name): name for name in names if digest_of(name)}
+            known = set(
+                Blob.objects.filter(digest__in=list(digests)).values_list(
+                    "digest", flat=True
+                )
+            )
+            for digest, name in digests.items():
+                if digest in known:
+                    continue
+                # Skip files written moments ago by uploads not yet recorded
+                if backend.get_modified_time(name) > timezone.now() - timedelta(
+                    hours=options["grace_hours"]
+                ):
+                    continue
+                if not options["dry_run"]:
+                    backend.delete(name)
+                removed += 1
+        return removed
+
+    def walk(self, backend, path):
+        directories, files = backend.listdir(path)
+        if files:
+            yield [f"{path}/{name}" for name in files]
+        for directory in directories:
+            yield from self.walk(backend, f"{path}/{directory}")
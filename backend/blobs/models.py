@@ -0,0 +1,30 @@
+from django.db import models
+
+
+class Blob(models.Model):
+    """
+    A stored file identified by the SHA-256 of its content, shared by every
+    file field value with the same bytes (see blobs.storage)
+    """
+
+    digest = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=100, unique=True)  # Key in the storage
+    size = models.PositiveBigIntegerField()
+    # Number of stored references; unreferenced blobs are garbage collected
+    refcount = models.IntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "blobs_blob"
+        indexes = [
+            models.Index(
+                fields=["updated_at"],
+                name="blobs_blob_unreferenced",
+                condition=models.Q(refcount__lte=0),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} refs)"
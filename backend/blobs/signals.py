@@ -0,0 +1,58 @@
+from django.apps import apps
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_init, post_save
+
+from .storage import ContentAddressedStorage
+
+
+def blob_fields(model):
+    return [
+        field.name
+        for field in model._meta.concrete_fields
+        if isinstance(field, models.FileField)
+        and isinstance(field.storage, ContentAddressedStorage)
+    ]
+
+
+def _release(storage, name):
+    transaction.on_commit(lambda: storage.delete(name))
+
+
+def connect_file_fields():
+    """Track the file fields of every model stored through blobs.storage"""
+    for model in apps.get_models():
+        field_names = blob_fields(model)
+        if not field_names:
+            continue
+
+        def remember_names(sender, instance, field_names=field_names, **kwargs):
+            instance._blob_names = {
+                name: instance.__dict__.get(name) for name in field_names
+            }
+
+        def release_replaced(sender, instance, field_names=field_names, **kwargs):
+            previous = getattr(instance, "_blob_names", {})
+            for name in field_names:
+                file = getattr(instance, name)
+                old_name = previous.get(name)
+                old_name = getattr(old_name, "name", old_name)
+                if old_name and old_name != file.name:
+                    _release(file.storage, old_name)
+            remember_names(sender, instance)
+
+        def release_deleted(sender, instance, field_names=field_names, **kwargs):
+            for name in field_names:
+                file = getattr(instance, name)
+                if file:
+                    _release(file.storage, file.name)
+
+        dispatch_uid = f"blobs:{model._meta.label}"
+        post_init.connect(
+            remember_names, sender=model, weak=False, dispatch_uid=dispatch_uid
+        )
+        post_save.connect(
+            release_replaced, sender=model, weak=False, dispatch_uid=dispatch_uid
+        )
+        post_delete.connect(
+            release_deleted, sender=model, weak=False, dispatch_uid=dispatch_uid
+        )
@@ -0,0 +1,121 @@
+"""
+Content-addressed, deduplicating file storage.
+
+Files are written to the default storage under a key derived from the
+SHA-256 of their bytes (``blobs/ab/cd/abcd...<ext>``), so identical uploads
+are stored once and every URL is immutable. Each ``save`` adds a reference
+to the Blob row of that content and each ``delete`` removes one; the file
+itself is only removed by the ``gc_blobs`` command once nothing references
+it. ``blobs.signals`` deletes the previous file of a field when it is
+replaced or its row is deleted, which keeps the counts in step.
+
+Names that are not blob keys (files stored before this layer existed) are
+served from the underlying storage as they are and never deleted.
+"""
+
+import hashlib
+import os
+import re
+
+from django.core.files.storage import Storage, default_storage
+from django.db import transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+from .models import Blob
+
+BLOB_PREFIX = "blobs"
+BLOB_NAME_RE = re.compile(
+    rf"^{BLOB_PREFIX}/[0-9a-f]{{2}}/[0-9a-f]{{2}}/([0-9a-f]{{64}})(?:\.\w+)?$"
+)
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def content_digest(content):
+    """SHA-256 of a file's content, read in chunks"""
+    digest = hashlib.sha256()
+    if hasattr(content, "seek"):
+        content.seek(0)
+    for chunk in content.chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    if hasattr(content, "seek"):
+        content.seek(0)
+    return digest.hexdigest()
+
+
+def blob_name(digest, original_name):
+    extension = os.path.splitext(original_name)[1].lower()[:10]
+    return f"{BLOB_PREFIX}/{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+
+def digest_of(name):
+    match = BLOB_NAME_RE.match(name or "")
+    return match.group(1) if match else None
+
+
+@deconstructible
+class ContentAddressedStorage(Storage):
+    def __init__(self, backend=None):
+        self._backend = backend
+
+    @property
+    def backend(self):
+        return self._backend or default_storage
+
+    # Writing
+
+    def get_available_name(self, name, max_length=None):
+        # The final name depends on the content, see _save()
+        return name
+
+    def _save(self, name, content):
+        digest = content_digest(content)
+        with transaction.atomic():
+            blob, created = Blob.objects.select_for_update().get_or_create(
+                digest=digest,
+                defaults={"name": blob_name(digest, name), "size": content.size},
+            )
+            if created or not self.backend.exists(blob.name):
+                self.backend.save(blob.name, content)
+            Blob.objects.filter(pk=blob.pk).update(refcount=F("refcount") + 1)
+        return blob.name
+
+    def delete(self, name):
+        """Drop one reference; the content stays until gc_blobs removes it"""
+        digest = digest_of(name)
+        if digest:
+            Blob.objects.filter(digest=digest).update(refcount=F("refcount") - 1)
+
+    # Reading is delegated to the underlying storage
+
+    def _open(self, name, mode="rb"):
+        return self.backend.open(name, mode)
+
+    def exists(self, name):
+        return self.backend.exists(name)
+
+    def size(self, name):
+        return self.backend.size(name)
+
+    def url(self, name):
+        return self.backend.url(name)
+
+    def path(self, name):
+        return self.backend.path(name)
+
+    def listdir(self, path):
+        return self.backend.listdir(path)
+
+    def get_created_time(self, name):
+        return self.backend.get_created_time(name)
+
+    def get_modified_time(self, name):
+        return self.backend.get_modified_time(name)
+
+
+content_addressed_storage = ContentAddressedStorage()
+
+
+def get_storage():
+    """Storage callable for FileField(storage=...)"""
+    return content_addressed_storage
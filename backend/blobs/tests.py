@@ -0,0 +1,65 @@
+import io
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from books.models import Book
+
+from .models import Blob
+from .storage import content_addressed_storage
+
+
+class BlobRefcountTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # Renditions would add blobs of their own
+        schedule = patch("bookexchange.renditions.schedule")
+        schedule.start()
+        self.addCleanup(schedule.stop)
+
+    def book_with_cover(self, content, title="Dune"):
+        book = Book(title=title)
+        book.cover_image.save("cover.jpg", ContentFile(content), save=False)
+        book.save()
+        return book
+
+    def test_identical_uploads_share_one_blob(self):
+        first = self.book_with_cover(b"same bytes")
+        second = self.book_with_cover(b"same bytes", title="Dune Messiah")
+        self.assertEqual(first.cover_image.name, second.cover_image.name)
+        self.assertRegex(first.cover_image.name, r"^blobs/../../[0-9a-f]{64}\.jpg$")
+        blob = Blob.objects.get()
+        self.assertEqual((blob.refcount, blob.size), (2, 10))
+
+    def test_replacing_and_deleting_release_references(self):
+        first = self.book_with_cover(b"same bytes")
+        second = self.book_with_cover(b"same bytes", title="Dune Messiah")
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(Blob.objects.get().refcount, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second = Book.objects.get(pk=second.pk)
+            second.cover_image.save("new.jpg", ContentFile(b"other bytes"))
+        refcounts = dict(Blob.objects.values_list("size", "refcount"))
+        self.assertEqual(refcounts, {10: 0, 11: 1})
+
+    def test_gc_deletes_only_unreferenced_blobs(self):
+        kept = self.book_with_cover(b"kept")
+        dropped = self.book_with_cover(b"dropped", title="Dune Messiah")
+        dropped_name = dropped.cover_image.name
+        with self.captureOnCommitCallbacks(execute=True):
+            dropped.delete()
+
+        call_command("gc_blobs", grace_hours=0, stdout=io.StringIO())
+        self.assertEqual(list(Blob.objects.values_list("size", flat=True)), [4])
+        self.assertTrue(content_addressed_storage.exists(kept.cover_image.name))
+        self.assertFalse(content_addressed_storage.exists(dropped_name))
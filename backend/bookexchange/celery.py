@@ -0,0 +1,35 @@
+"""
+Celery application for background jobs.
+
+Configuration is read from the CELERY_* entries in Django settings and task
+modules are discovered from the installed apps.
+"""
+
+import logging
+import os
+
+from celery import Celery
+from kombu.exceptions import OperationalError
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "bookexchange.settings")
+
+app = Celery("bookexchange")
+app.config_from_object("django.conf:settings", namespace="CELERY")
+app.autodiscover_tasks()
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(task, *args):
+    """
+    Queue ``task`` with ``args``, or log and return False when the broker
+    cannot be reached. Publishing gives up after CELERY_PUBLISH_MAX_RETRIES
+    quick reconnects, so a request is never held up for long; callers leave
+    the work to be picked up later rather than running it in process.
+    """
+    try:
+        task.delay(*args)
+    except OperationalError as error:
+        logger.warning("Could not queue %s%r: %s", task.name, args, error)
+        return False
+    return True
@@ -0,0 +1,156 @@
+"""
+Resized renditions of uploaded images (book covers and avatars).
+
+Each rendition is a downscaled copy with EXIF and other metadata stripped,
+encoded as WebP (or JPEG) and stored next to the original as
+``<name>.<rendition>.<ext>``. The stored names are recorded in a JSON field
+on the model (``<field>_renditions``, e.g. ``cover_image_renditions``)
+together with the original they were made from, so a changed upload is
+detected and re-rendered.
+
+Rendering runs in the ``generate_image_renditions`` Celery task once the
+upload is committed. When no broker is reachable the original is served
+until ``manage.py generate_renditions`` renders the stale images.
+"""
+
+import io
+import logging
+import os
+import time
+
+from celery import shared_task
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from bookexchange.celery import enqueue
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {"WEBP": "webp", "JPEG": "jpg"}
+
+
+def renditions_field(field_name):
+    return f"{field_name}_renditions"
+
+
+def render(source, sizes=None, format=None, quality=None):
+    """
+    Return ``{rendition: bytes}`` for an open image file, each fitting in a
+    square of the rendition's size and never upscaled.
+    """
+    options = settings.IMAGE_RENDITIONS
+    sizes = sizes or options["SIZES"]
+    format = format or options["FORMAT"]
+    quality = quality or options["QUALITY"]
+
+    with Image.open(source) as image:
+        # Let the JPEG decoder downscale while decoding, which is much cheaper
+        image.draft("RGB", (max(sizes.values()),) * 2)
+        image = ImageOps.exif_transpose(image)
+        keep_alpha = format == "WEBP" and image.mode in ("RGBA", "LA", "P")
+        image = image.convert("RGBA" if keep_alpha else "RGB")
+
+        rendered = {}
+        # Largest first, so each smaller rendition resizes the previous one
+        for name, size in sorted(sizes.items(), key=lambda item: -item[1]):
+            image.thumbnail((size, size), Image.LANCZOS)
+            output = io.BytesIO()
+            # Saving a new image drops EXIF, XMP and ICC metadata
+            image.save(output, format=format, quality=quality, optimize=True)
+            rendered[name] = output.getvalue()
+        return rendered
+
+
+def generate(instance, field_name):
+    """
+    Render and store the renditions of ``instance.<field_name>``, replacing
+    older ones. Returns ``(renditions, source_bytes, seconds)``.
+    """
+    started = time.perf_counter()
+    file = getattr(instance, field_name)
+    storage = file.storage
+    current = getattr(instance, renditions_field(field_name)) or {}
+    for name, path in current.items():
+        if name != "source":
+            storage.delete(path)
+
+    renditions = {}
+    source_bytes = 0
+    if file:
+        format = settings.IMAGE_RENDITIONS["FORMAT"]
+        stem = os.path.splitext(file.name)[0]
+        with file.open("rb") as source:
+            rendered = render(source)
+            source_bytes = file.size
+        renditions["source"] = file.name
+        for name, content in rendered.items():
+            path = f"{stem}.{name}.{EXTENSIONS[format]}"
+            storage.delete(path)
+            renditions[name] = storage.save(path, ContentFile(content))
+
+    # update() skips the save signals that scheduled this work
+    type(instance).objects.filter(pk=instance.pk).update(
+        **{renditions_field(field_name): renditions}
+    )
+    setattr(instance, renditions_field(field_name), renditions)
+    return renditions, source_bytes, time.perf_counter() - started
+
+
+def discard(instance, field_name):
+    """Delete the stored renditions of an instance that is going away"""
+    file = getattr(instance, field_name)
+    for name, path in (getattr(instance, renditions_field(field_name)) or {}).items():
+        if name != "source":
+            file.storage.delete(path)
+
+
+def is_stale(instance, field_name):
+    file = getattr(instance, field_name)
+    current = getattr(instance, renditions_field(field_name)) or {}
+    return (file.name or None) != current.get("source")
+
+
+@shared_task
+def generate_image_renditions(model_label, pk, field_name):
+    """Render the renditions of one model instance's image field"""
+    instance = apps.get_model(model_label).objects.filter(pk=pk).first()
+    if instance is None or not is_stale(instance, field_name):
+        return None
+    renditions, source_bytes, seconds = generate(instance, field_name)
+    logger.info(
+        "Rendered %s %s.%s (%d bytes) in %.0fms",
+        model_label,
+        pk,
+        field_name,
+        source_bytes,
+        seconds * 1000,
+    )
+    return {"renditions": len(renditions), "seconds": seconds}
+
+
+def schedule(instance, field_name):
+    """Queue rendering after commit if the image changed since last render"""
+    if not is_stale(instance, field_name):
+        return
+    args = (instance._meta.label, instance.pk, field_name)
+    transaction.on_commit(lambda: enqueue(generate_image_renditions, *args))
+
+
+def rendition_urls(instance, field_name):
+    """
+    Return ``{rendition: url}`` for an image field. Renditions that are not
+    ready yet fall back to the original.
+    """
+    file = getattr(instance, field_name)
+    if not file:
+        return {}
+    current = getattr(instance, renditions_field(field_name)) or {}
+    if current.get("source") != file.name:
+        current = {}
+    return {
+        name: file.storage.url(current[name]) if name in current else file.url
+        for name in settings.IMAGE_RENDITIONS["SIZES"]
+    }
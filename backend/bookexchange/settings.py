@@ -38,6 +38,7 @@ THIRD_PARTY_APPS = [
 ]
 
 LOCAL_APPS = [
+    "blobs",
     "accounts",
     "books",
     "friendships",
@@ -158,6 +159,143 @@ JWT_SETTINGS = {
 # Redis Configuration
 REDIS_URL = config("REDIS_URL", default="redis://localhost:6379/0")
 
+# Cache Configuration
+# Defaults to a per-process cache; point CACHE_BACKEND at
+# django.core.cache.backends.redis.RedisCache to share it between workers.
+CACHES = {
+    "default": {
+        "BACKEND": config(
+            "CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": config("CACHE_LOCATION", default=""),
+    }
+}
+
+# Authenticated principal cache (see accounts.principal)
+PRINCIPAL_CACHE = {
+    "MAX_SIZE": config("PRINCIPAL_CACHE_MAX_SIZE", default=10000, cast=int),
+    "TIMEOUT": config("PRINCIPAL_CACHE_TIMEOUT", default=300, cast=int),
+    "SHARED_CACHE_ALIAS": config("PRINCIPAL_CACHE_SHARED_ALIAS", default=""),
+}
+
+# Friend graph (see friendships.graph)
+FRIEND_GRAPH = {
+    "CACHE_TIMEOUT": config("FRIEND_GRAPH_CACHE_TIMEOUT", default=3600, cast=int),
+    # Friends-of-friends sets go stale when two other users connect
+    "NETWORK_CACHE_TIMEOUT": config(
+        "FRIEND_GRAPH_NETWORK_CACHE_TIMEOUT", default=300, cast=int
+    ),
+    # Blocked sets (see friendships.blocking) are only invalidated across
+    # processes through a shared CACHE_BACKEND, so keep them short-lived
+    "BLOCKED_CACHE_TIMEOUT": config(
+        "FRIEND_GRAPH_BLOCKED_CACHE_TIMEOUT", default=60, cast=int
+    ),
+    # Keep a CSR copy of the graph in each process (see friendships.csr)
+    # Needs a shared CACHE_BACKEND when several processes serve requests
+    "IN_MEMORY": config("FRIEND_GRAPH_IN_MEMORY", default=False, cast=bool),
+    # Seconds between checks for changes committed by other processes
+    "SYNC_INTERVAL": config("FRIEND_GRAPH_SYNC_INTERVAL", default=5, cast=int),
+    # Upper bound for degree-of-separation searches
+    "MAX_PATH_DEPTH": config("FRIEND_GRAPH_MAX_PATH_DEPTH", default=6, cast=int),
+    # Users a single path search or network expansion may load friends for
+    "MAX_EXPANDED_NODES": config(
+        "FRIEND_GRAPH_MAX_EXPANDED_NODES", default=10000, cast=int
+    ),
+}
+
+# Fuzzy author and title matching (see books.fuzzy)
+FUZZY_SEARCH = {
+    "SIMILARITY_THRESHOLD": config(
+        "FUZZY_SIMILARITY_THRESHOLD", default=0.3, cast=float
+    ),
+}
+
+# Search-as-you-type prefix index (see books.autocomplete)
+AUTOCOMPLETE = {
+    "SNAPSHOT_PATH": config(
+        "AUTOCOMPLETE_SNAPSHOT_PATH",
+        default=str(BASE_DIR / "var" / "autocomplete.pickle"),
+    ),
+}
+
+# Item-item collaborative filtering (see books.recommendations)
+RECOMMENDATIONS = {
+    # Neighbours kept per book, and liked books combined per request
+    "NEIGHBORS": config("RECOMMENDATION_NEIGHBORS", default=50, cast=int),
+    "SEEDS": config("RECOMMENDATION_SEEDS", default=50, cast=int),
+    # Co-raters two books need before their similarity counts
+    "MIN_SUPPORT": config("RECOMMENDATION_MIN_SUPPORT", default=2, cast=int),
+    # Bound on the non-zeros of one block of the similarity product
+    "MAX_BLOCK_NNZ": config(
+        "RECOMMENDATION_MAX_BLOCK_NNZ", default=5_000_000, cast=int
+    ),
+}
+
+# Content-based similar books (see books.similarity)
+CONTENT_SIMILARITY = {
+    "INDEX_DIR": config(
+        "CONTENT_SIMILARITY_INDEX_DIR", default=str(BASE_DIR / "var" / "similarity")
+    ),
+    # float32 components per book; the scan reads 4 bytes each per book
+    "DIMENSIONS": config("CONTENT_SIMILARITY_DIMENSIONS", default=256, cast=int),
+    "CHUNK_SIZE": config("CONTENT_SIMILARITY_CHUNK_SIZE", default=2000, cast=int),
+}
+
+# Offline geocoding of profile locations (see accounts.geocoder); point
+# CITIES_PATH at a GeoNames cities*.txt dump for wider coverage
+GEOCODER = {
+    "CITIES_PATH": config(
+        "GEOCODER_CITIES_PATH",
+        default=str(BASE_DIR / "accounts" / "data" / "cities.csv"),
+    ),
+    "CACHE_SIZE": config("GEOCODER_CACHE_SIZE", default=10000, cast=int),
+}
+
+# Resized cover and avatar renditions (see bookexchange.renditions)
+IMAGE_RENDITIONS = {
+    # Longest side in pixels
+    "SIZES": {"thumb": 150, "card": 400, "full": 1200},
+    "FORMAT": config("IMAGE_RENDITION_FORMAT", default="WEBP"),
+    "QUALITY": config("IMAGE_RENDITION_QUALITY", default=80, cast=int),
+}
+
+# Bulk catalogue imports (see books.importer)
+CATALOGUE_IMPORT = {
+    "UPLOAD_DIR": config(
+        "CATALOGUE_IMPORT_UPLOAD_DIR", default=str(BASE_DIR / "var" / "imports")
+    ),
+    "CHUNK_SIZE": config("CATALOGUE_IMPORT_CHUNK_SIZE", default=1000, cast=int),
+    # Pending or running imports without progress for this long may be resumed
+    "STALE_AFTER_MINUTES": config(
+        "CATALOGUE_IMPORT_STALE_AFTER_MINUTES", default=30, cast=int
+    ),
+}
+
+# Friend invitations (see friendships.invitations)
+FRIEND_INVITATIONS = {
+    "EXPIRE_DAYS": config("FRIEND_INVITATION_EXPIRE_DAYS", default=14, cast=int),
+    "SEND_BATCH_SIZE": config(
+        "FRIEND_INVITATION_SEND_BATCH_SIZE", default=100, cast=int
+    ),
+    # Unsent invitations older than this are picked up by the periodic
+    # send_pending_friend_invitations task
+    "RETRY_AFTER_MINUTES": config(
+        "FRIEND_INVITATION_RETRY_AFTER_MINUTES", default=10, cast=int
+    ),
+    "ACCEPT_URL": config(
+        "FRIEND_INVITATION_ACCEPT_URL",
+        default="http://localhost:3000/register?invitation={code}",
+    ),
+}
+
+# Email
+EMAIL_BACKEND = config(
+    "EMAIL_BACKEND", default="django.core.mail.backends.console.EmailBackend"
+)
+DEFAULT_FROM_EMAIL = config(
+    "DEFAULT_FROM_EMAIL", default="BookExchange <noreply@localhost>"
+)
+
 # Celery Configuration
 CELERY_BROKER_URL = REDIS_URL
 CELERY_RESULT_BACKEND = REDIS_URL
@@ -165,6 +303,46 @@ CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = TIME_ZONE
+# Give up publishing quickly when the broker is down instead of holding the
+# request through kombu's reconnect loop (see bookexchange.celery.enqueue)
+CELERY_PUBLISH_MAX_RETRIES = config("CELERY_PUBLISH_MAX_RETRIES", default=1, cast=int)
+CELERY_BROKER_TRANSPORT_OPTIONS = {"max_retries": CELERY_PUBLISH_MAX_RETRIES}
+CELERY_RESULT_BACKEND_TRANSPORT_OPTIONS = {
+    "retry_policy": {"max_retries": CELERY_PUBLISH_MAX_RETRIES}
+}
+# Run tasks in the calling process, for development without a worker
+CELERY_TASK_ALWAYS_EAGER = config("CELERY_TASK_ALWAYS_EAGER", default=False, cast=bool)
+CELERY_BEAT_SCHEDULE = {
+    "refresh-friend-suggestions": {
+        "task": "friendships.tasks.refresh_friend_suggestions",
+        "schedule": 60 * 60,
+        "kwargs": {"incremental": True},
+    },
+    "send-pending-invitations": {
+        "task": "friendships.tasks.send_pending_friend_invitations",
+        "schedule": 15 * 60,
+    },
+    "sweep-expired-invitations": {
+        "task": "friendships.tasks.sweep_expired_invitations",
+        "schedule": 24 * 60 * 60,
+    },
+    "rebuild-autocomplete-index": {
+        "task": "books.tasks.rebuild_autocomplete_index",
+        "schedule": 60 * 60,
+    },
+    "reconcile-book-stats": {
+        "task": "books.tasks.reconcile_book_stats",
+        "schedule": 24 * 60 * 60,
+    },
+    "build-book-neighbors": {
+        "task": "books.tasks.build_book_neighbors",
+        "schedule": 24 * 60 * 60,
+    },
+    "build-similarity-index": {
+        "task": "books.tasks.build_similarity_index",
+        "schedule": 24 * 60 * 60,
+    },
+}
 
 # Google Cloud Storage (for production)
 if not DEBUG:
@@ -1,8 +1,12 @@
-from datetime import datetime
-from typing import List
+from datetime import date, datetime
+from typing import Dict, List, Literal, Optional
 
-from ninja import Router
-from pydantic import BaseModel
+from ninja import File, Form, Router, UploadedFile
+from ninja.pagination import paginate
+from pydantic import BaseModel, Field
+
+from accounts.api import auth, auth_id
+from bookexchange.pagination import CursorPagination
 
 router = Router()
 
@@ -12,20 +16,453 @@ class BookSchema(BaseModel):
     id: int
     title: str
     author_names: str
-    isbn_13: str
-    publication_date: datetime = None
+    genre_names: List[str] = []
+    publisher_name: Optional[str] = None
+    cover_urls: Dict[str, str] = {}
+    isbn_13: Optional[str] = None
+    publication_date: Optional[date] = None
+    review_count: int = 0
+    average_rating: float = 0
+    owner_count: int = 0
+    available_count: int = 0
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class UserBookSchema(BaseModel):
+    id: int
+    book: BookSchema
+    status: str
+    condition: str
+    available_for_exchange: bool
+    current_page: int
+    reading_progress: float
+    added_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class BookSearchResultSchema(BaseModel):
+    results: List[BookSchema]
+    page: int
+    has_next: bool
+    did_you_mean: Optional[str] = None
+
+
+class AuthorMatchSchema(BaseModel):
+    id: int
+    full_name: str
+    similarity: float
+
+
+class BookMatchSchema(BaseModel):
+    book: BookSchema
+    similarity: float
+
+
+class ErrorSchema(BaseModel):
+    error: str
+
+
+class IsbnLookupRequestSchema(BaseModel):
+    isbns: List[str] = Field(..., max_length=500)
+
+
+class IsbnLookupResultSchema(BaseModel):
+    isbn: str
+    isbn_13: Optional[str] = None
+    book: Optional[BookSchema] = None
+    error: Optional[str] = None
+
+
+class CatalogueImportSchema(BaseModel):
+    id: int
+    source: str
+    format: str
+    status: str
+    records_processed: int
+    books_created: int
+    books_skipped: int
+    rows_per_second: float
+    error: str
     created_at: datetime
+    finished_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
 
 
+class AutocompleteSchema(BaseModel):
+    kind: str
+    id: int
+    label: str
+    weight: int
+
+
+class AvailableCopySchema(BaseModel):
+    id: int
+    book: BookSchema
+    owner_id: int
+    owner_name: str
+    condition: str
+    hops: Optional[int] = None
+    distance_km: Optional[float] = None
+
+
+class RecommendationSchema(BaseModel):
+    book: BookSchema
+    score: float
+
+
+class SimilarBookSchema(BaseModel):
+    book: BookSchema
+    score: float
+
+
+class NearbyCopySchema(BaseModel):
+    id: int
+    book: BookSchema
+    owner_id: int
+    owner_name: str
+    condition: str
+    distance_km: float
+
+
+BOOK_SORTS = {
+    "title": ("title", "id"),
+    "popular": ("-owner_count", "-id"),
+    "rating": ("-average_rating", "-review_count", "-id"),
+}
+
+
 @router.get("/", response=List[BookSchema])
-def list_books(request):
-    """List all books"""
+@paginate(CursorPagination, ordering=BOOK_SORTS["title"])
+def list_books(request, sort: Literal["title", "popular", "rating"] = "title"):
+    """List all books by title, owners or rating, one cursor page at a time"""
+    from .models import Book
+
+    return Book.objects.with_related().order_by(*BOOK_SORTS[sort])
+
+
+@router.get("/search", response=BookSearchResultSchema)
+def search_books(
+    request,
+    q: str,
+    language: Optional[str] = None,
+    genre_id: Optional[int] = None,
+    page: int = 1,
+    page_size: int = 20,
+):
+    """Full-text search over titles, subtitles, descriptions and authors"""
+    from .search import search_books
+
+    page = max(page, 1)
+    page_size = min(max(page_size, 1), 100)
+    books, has_next = search_books(
+        q, language=language, genre_id=genre_id, page=page, page_size=page_size
+    )
+    suggestion = None
+    if not books and page == 1:
+        from .fuzzy import did_you_mean
+
+        suggestion = did_you_mean(q)
+    return {
+        "results": books,
+        "page": page,
+        "has_next": has_next,
+        "did_you_mean": suggestion,
+    }
+
+
+@router.get("/autocomplete", response=List[AutocompleteSchema])
+def autocomplete(request, q: str, limit: int = 10):
+    """Suggest titles, authors and genres starting with a prefix"""
+    from .autocomplete import get_index
+
+    matches = get_index().complete(q, limit=min(max(limit, 1), 50))
+    return [
+        {"kind": kind, "id": object_id, "label": label, "weight": weight}
+        for kind, object_id, label, weight in matches
+    ]
+
+
+@router.get("/fuzzy", response=List[BookMatchSchema])
+def fuzzy_books(request, q: str, threshold: Optional[float] = None, limit: int = 10):
+    """Find books whose title resembles a possibly misspelled query"""
+    from .fuzzy import similar_books
+
+    matches = similar_books(q, threshold=threshold, limit=min(max(limit, 1), 50))
+    return [{"book": book, "similarity": score} for book, score in matches]
+
+
+@router.get("/authors/fuzzy", response=List[AuthorMatchSchema])
+def fuzzy_authors(request, q: str, threshold: Optional[float] = None, limit: int = 10):
+    """Find authors whose name resembles a possibly misspelled query"""
+    from .fuzzy import similar_authors
+
+    matches = similar_authors(q, threshold=threshold, limit=min(max(limit, 1), 50))
+    return [
+        {"id": author.id, "full_name": author.full_name, "similarity": score}
+        for author, score in matches
+    ]
+
+
+@router.post("/isbn/lookup", response=List[IsbnLookupResultSchema])
+def lookup_isbns(request, data: IsbnLookupRequestSchema):
+    """Resolve a batch of scanned ISBNs, reporting each one's outcome"""
+    from .isbn import to_isbn13
+    from .models import Book
+
+    keys = {}
+    errors = {}
+    for isbn in data.isbns:
+        try:
+            keys[isbn] = to_isbn13(isbn)
+        except ValueError as error:
+            errors[isbn] = str(error)
+    books = Book.objects.with_related().in_bulk(
+        set(keys.values()), field_name="isbn_key"
+    )
+    return [
+        {
+            "isbn": isbn,
+            "isbn_13": keys.get(isbn),
+            "book": books.get(keys.get(isbn)),
+            "error": errors.get(isbn) or (None if keys[isbn] in books else "Not found"),
+        }
+        for isbn in data.isbns
+    ]
+
+
+@router.get("/isbn/{isbn}", response={200: BookSchema, 400: ErrorSchema})
+def get_book_by_isbn(request, isbn: str):
+    """Get a book by ISBN-10 or ISBN-13, with or without hyphens"""
+    from django.shortcuts import get_object_or_404
+
+    from .isbn import to_isbn13
+    from .models import Book
+
+    try:
+        key = to_isbn13(isbn)
+    except ValueError as error:
+        return 400, {"error": str(error)}
+    return get_object_or_404(Book.objects.with_related(), isbn_key=key)
+
+
+@router.post(
+    "/imports",
+    response={
+        202: CatalogueImportSchema,
+        400: ErrorSchema,
+        403: ErrorSchema,
+        503: ErrorSchema,
+    },
+    auth=auth,
+)
+def start_catalogue_import(
+    request, file: UploadedFile = File(...), format: str = Form("csv")
+):
+    """Upload a CSV or JSON-lines catalogue dump and import it (staff only)"""
+    import os
+    import uuid
+
+    from django.conf import settings
+
+    from . import importer
+    from .models import CatalogueImport
+
+    if not request.auth.is_staff:
+        return 403, {"error": "Staff only"}
+    if format not in ("csv", "jsonl"):
+        return 400, {"error": "Format must be csv or jsonl"}
+
+    upload_dir = settings.CATALOGUE_IMPORT["UPLOAD_DIR"]
+    os.makedirs(upload_dir, exist_ok=True)
+    path = os.path.join(upload_dir, f"{uuid.uuid4().hex}.{format}")
+    with open(path, "wb") as destination:
+        for chunk in file.chunks():
+            destination.write(chunk)
+
+    catalogue_import = CatalogueImport.objects.create(
+        source=path, format=format, created_by=request.auth
+    )
+    if not importer.queue(catalogue_import):
+        return 503, {"error": catalogue_import.error}
+    return 202, catalogue_import
+
+
+@router.get(
+    "/imports/{import_id}",
+    response={200: CatalogueImportSchema, 403: ErrorSchema},
+    auth=auth,
+)
+def get_catalogue_import(request, import_id: int):
+    """Get the progress of a catalogue import (staff only)"""
+    from django.shortcuts import get_object_or_404
+
+    from .models import CatalogueImport
+
+    if not request.auth.is_staff:
+        return 403, {"error": "Staff only"}
+    return get_object_or_404(CatalogueImport, id=import_id)
+
+
+@router.post(
+    "/imports/{import_id}/resume",
+    response={
+        202: CatalogueImportSchema,
+        400: ErrorSchema,
+        403: ErrorSchema,
+        503: ErrorSchema,
+    },
+    auth=auth,
+)
+def resume_catalogue_import(request, import_id: int):
+    """Resume a failed or stalled catalogue import (staff only)"""
+    from django.shortcuts import get_object_or_404
+
+    from . import importer
+    from .models import CatalogueImport
+
+    if not request.auth.is_staff:
+        return 403, {"error": "Staff only"}
+    catalogue_import = get_object_or_404(CatalogueImport, id=import_id)
+    if catalogue_import.status == "completed":
+        return 400, {"error": "Import already completed"}
+    if not importer.claim_for_resume(catalogue_import):
+        return 400, {"error": "Import is still running"}
+    if not importer.queue(catalogue_import):
+        return 503, {"error": catalogue_import.error}
+    return 202, catalogue_import
+
+
+@router.get("/mine", response=List[UserBookSchema], auth=auth_id)
+@paginate(CursorPagination, ordering=("-added_at", "-id"))
+def list_my_books(request, status: Optional[str] = None):
+    """List the current user's books with their reading progress"""
+    from .models import UserBook
+
+    user_books = UserBook.objects.filter(user_id=request.auth).with_book()
+    if status:
+        user_books = user_books.filter(status=status)
+    return user_books
+
+
+@router.get(
+    "/nearby",
+    response={200: List[NearbyCopySchema], 400: ErrorSchema},
+    auth=auth_id,
+)
+def nearby_books(
+    request,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+    radius_km: float = 10,
+    book_id: Optional[int] = None,
+    limit: int = 20,
+):
+    """List copies available for exchange near a point, nearest first"""
+    from accounts.models import User
+
+    from .nearby import MAX_RADIUS_KM, nearby_copies
+
+    if latitude is None or longitude is None:
+        # Default to the caller's own location
+        latitude, longitude = (
+            User.objects.filter(pk=request.auth)
+            .values_list("latitude", "longitude")
+            .first()
+        ) or (None, None)
+        if latitude is None or longitude is None:
+            return 400, {"error": "No location given and none set on the profile"}
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return 400, {"error": "Invalid coordinates"}
+    if not 0 < radius_km <= MAX_RADIUS_KM:
+        return 400, {"error": f"radius_km must be between 0 and {MAX_RADIUS_KM}"}
+
+    copies = nearby_copies(
+        latitude,
+        longitude,
+        radius_km,
+        limit=max(1, min(limit, 100)),
+        book_id=book_id,
+        user_id=request.auth,
+    )
+    return 200, [
+        {
+            "id": user_book.id,
+            "book": user_book.book,
+            "owner_id": user_book.user_id,
+            "owner_name": user_book.user.display_name,
+            "condition": user_book.condition,
+            "distance_km": distance_km,
+        }
+        for user_book, distance_km in copies
+    ]
+
+
+@router.get(
+    "/available",
+    response={200: List[AvailableCopySchema], 400: ErrorSchema},
+    auth=auth,
+)
+def available_in_network(
+    request,
+    scope: Literal["friends", "network", "radius"] = "network",
+    book_id: Optional[int] = None,
+    radius_km: float = 10,
+    limit: int = 20,
+):
+    """List copies available from friends, friends of friends or nearby users"""
+    from .availability import available_copies
+    from .nearby import DISTANCE_DECIMALS, MAX_RADIUS_KM
+
+    user = request.auth
+    if scope == "radius":
+        if user.latitude is None or user.longitude is None:
+            return 400, {"error": "Set a location on your profile first"}
+        if not 0 < radius_km <= MAX_RADIUS_KM:
+            return 400, {"error": f"radius_km must be between 0 and {MAX_RADIUS_KM}"}
+
+    copies = available_copies(
+        user,
+        scope,
+        book_id=book_id,
+        radius_km=radius_km,
+        limit=max(1, min(limit, 100)),
+    )
+    return 200, [
+        {
+            "id": user_book.id,
+            "book": user_book.book,
+            "owner_id": user_book.user_id,
+            "owner_name": user_book.user.display_name,
+            "condition": user_book.condition,
+            "hops": None if scope == "radius" else rank,
+            "distance_km": (
+                round(rank, DISTANCE_DECIMALS) if scope == "radius" else None
+            ),
+        }
+        for user_book, rank in copies
+    ]
+
+
+@router.get("/recommendations", response=List[RecommendationSchema], auth=auth_id)
+def recommended_books(request, limit: int = 20):
+    """Books liked by readers with similar taste to the current user"""
     from .models import Book
+    from .recommendations import recommend
 
-    return Book.objects.all()[:20]
+    ranked = recommend(request.auth, limit=max(1, min(limit, 100)))
+    books = Book.objects.with_related().in_bulk([book_id for book_id, _ in ranked])
+    return [
+        {"book": books[book_id], "score": score}
+        for book_id, score in ranked
+        if book_id in books
+    ]
 
 
 @router.get("/{book_id}", response=BookSchema)
@@ -35,5 +472,23 @@ def get_book(request, book_id: int):
 
     from .models import Book
 
-    book = get_object_or_404(Book, id=book_id)
+    book = get_object_or_404(Book.objects.with_related(), id=book_id)
     return book
+
+
+@router.get("/{book_id}/similar", response=List[SimilarBookSchema])
+def similar_books(request, book_id: int, limit: int = 10):
+    """Books whose description, genres and authors resemble this book's"""
+    from django.shortcuts import get_object_or_404
+
+    from .models import Book
+    from .similarity import similar_books as rank_similar
+
+    get_object_or_404(Book.objects.only("id"), id=book_id)
+    ranked = rank_similar(book_id, limit=max(1, min(limit, 50)))
+    books = Book.objects.with_related().in_bulk([similar for similar, _ in ranked])
+    return [
+        {"book": books[similar], "score": score}
+        for similar, score in ranked
+        if similar in books
+    ]
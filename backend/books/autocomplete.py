@@ -0,0 +1,324 @@
+"""
+In-memory prefix index for search-as-you-type over titles, authors and genres.
+
+Every entry is reachable from its normalised label and from each later word
+in it ("harry potter" and "potter"), stored as ``(key, kind, id)`` tuples in
+one sorted list that is searched with bisect. Entries are weighted by
+popularity (the number of UserBook owners) and the best matches of very short
+prefixes are precomputed, since their ranges cover a large part of the list;
+a ranking that is full when one of its entries is removed or loses weight
+is refilled from that range.
+
+The index is loaded from a snapshot file when one exists, otherwise built
+from the database, and updated in place by the signal handlers in
+``books.signals``. Processes pick up newer snapshots written by
+``build_autocomplete_index`` automatically, so requests never query the
+database once the index is warm.
+"""
+
+import heapq
+import os
+import pickle
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+
+from .models import Author, Book, Genre
+
+SNAPSHOT_VERSION = 1
+SHORT_PREFIX_LENGTH = 2
+MAX_RESULTS = 50
+SCAN_LIMIT = 5000
+RELOAD_CHECK_SECONDS = 60
+
+
+def normalize(text):
+    """Lower-case, strip accents and collapse whitespace"""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(text.lower().split())
+
+
+def index_keys(label):
+    """Return the keys an entry is reachable from"""
+    words = normalize(label).split()
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+
+class PrefixIndex:
+    """Sorted-array prefix index of weighted autocomplete entries"""
+
+    def __init__(self):
+        self.keys = []
+        # (kind, id) -> [label, weight]
+        self.entries = {}
+        self.short_prefixes = {}
+        self.built_at = None
+        self._lock = threading.RLock()
+
+    # Building
+
+    @classmethod
+    def from_database(cls):
+        index = cls()
+        # Weights come from the owner counts kept on Book (see books.stats)
+        owners = Coalesce(Sum("books__owner_count"), 0)
+        books = Book.objects.values_list("id", "title", "owner_count")
+        authors = Author.objects.annotate(owners=owners).values_list(
+            "id", "first_name", "last_name", "owners"
+        )
+        genres = Genre.objects.annotate(owners=owners).values_list(
+            "id", "name", "owners"
+        )
+        for book_id, title, owners in books.iterator():
+            index._add_entry("book", book_id, title, owners)
+        for author_id, first_name, last_name, owners in authors.iterator():
+            index._add_entry("author", author_id, f"{first_name} {last_name}", owners)
+        for genre_id, name, owners in genres.iterator():
+            index._add_entry("genre", genre_id, name, owners)
+        index.keys.sort()
+        index._rebuild_short_prefixes()
+        index.built_at = time.time()
+        return index
+
+    def _add_entry(self, kind, object_id, label, weight):
+        self.entries[(kind, object_id)] = [label, weight]
+        self.keys.extend((key, kind, object_id) for key in index_keys(label))
+
+    def _rebuild_short_prefixes(self):
+        buckets = {}
+        for key, kind, object_id in self.keys:
+            for length in range(1, min(SHORT_PREFIX_LENGTH, len(key)) + 1):
+                buckets.setdefault(key[:length], set()).add((kind, object_id))
+        self.short_prefixes = {
+            prefix: self._top(refs, MAX_RESULTS) for prefix, refs in buckets.items()
+        }
+
+    def _top(self, refs, limit):
+        return heapq.nlargest(
+            limit, refs, key=lambda ref: (self.entries[ref][1], ref[0], -ref[1])
+        )
+
+    # Snapshots
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.tmp"
+        with self._lock, open(temporary, "wb") as snapshot:
+            pickle.dump(
+                (SNAPSHOT_VERSION, self.keys, self.entries, self.short_prefixes),
+                snapshot,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as snapshot:
+            version, keys, entries, short_prefixes = pickle.load(snapshot)
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported autocomplete snapshot version {version}")
+        index = cls()
+        index.keys, index.entries, index.short_prefixes = keys, entries, short_prefixes
+        index.built_at = os.path.getmtime(path)
+        return index
+
+    # Queries
+
+    def complete(self, prefix, limit=10):
+        """Return up to ``limit`` ``(kind, id, label, weight)`` matches"""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        limit = min(limit, MAX_RESULTS)
+        with self._lock:
+            if len(prefix) <= SHORT_PREFIX_LENGTH:
+                refs = self.short_prefixes.get(prefix, [])[:limit]
+            else:
+                start = bisect_left(self.keys, (prefix,))
+                end = bisect_left(self.keys, (prefix + "\uffff",), lo=start)
+                refs = {
+                    (kind, object_id)
+                    for _, kind, object_id in self.keys[
+                        start : min(end, start + SCAN_LIMIT)
+                    ]
+                }
+                refs = self._top(refs, limit)
+            return [
+                (kind, object_id, *self.entries[(kind, object_id)])
+                for kind, object_id in refs
+            ]
+
+    # Incremental updates
+
+    def upsert(self, kind, object_id, label, weight=None):
+        """Add an entry or update its label, keeping its weight by default"""
+        with self._lock:
+            ref = (kind, object_id)
+            current = self.entries.get(ref)
+            if current is not None:
+                if weight is None:
+                    weight = current[1]
+                self._discard(ref, current[0])
+            self.entries[ref] = [label, weight or 0]
+            for key in index_keys(label):
+                insort(self.keys, (key, kind, object_id))
+            self._refresh_short_prefixes(ref, label)
+
+    def remove(self, kind, object_id):
+        with self._lock:
+            ref = (kind, object_id)
+            current = self.entries.get(ref)
+            if current is None:
+                return
+            self._discard(ref, current[0])
+            del self.entries[ref]
+
+    def add_weight(self, kind, object_id, delta):
+        with self._lock:
+            ref = (kind, object_id)
+            current = self.entries.get(ref)
+            if current is None:
+                return
+            current[1] = max(current[1] + delta, 0)
+            if delta < 0:
+                # Entries outside a full ranking may now outrank this one
+                for prefix in self._short_prefixes_of(current[0]):
+                    if len(self.short_prefixes.get(prefix, [])) >= MAX_RESULTS:
+                        self._refill_short_prefix(prefix)
+            self._refresh_short_prefixes(ref, current[0])
+
+    def _discard(self, ref, label):
+        """Drop the keys and short-prefix rankings of an entry's ``label``"""
+        for key in index_keys(label):
+            position = bisect_left(self.keys, (key, *ref))
+            if position < len(self.keys) and self.keys[position] == (key, *ref):
+                del self.keys[position]
+        for prefix in self._short_prefixes_of(label):
+            refs = self.short_prefixes.get(prefix, [])
+            if ref in refs:
+                refs.remove(ref)
+                # A capped ranking may have left out the next best entries
+                if len(refs) == MAX_RESULTS - 1:
+                    self._refill_short_prefix(prefix)
+
+    def _short_prefixes_of(self, label):
+        return {
+            key[:length]
+            for key in index_keys(label)
+            for length in range(1, min(SHORT_PREFIX_LENGTH, len(key)) + 1)
+        }
+
+    def _refill_short_prefix(self, prefix):
+        """Re-rank a short prefix from the keys that start with it"""
+        start = bisect_left(self.keys, (prefix,))
+        end = bisect_left(self.keys, (prefix + "\uffff",), lo=start)
+        refs = {(kind, object_id) for _, kind, object_id in self.keys[start:end]}
+        if refs:
+            self.short_prefixes[prefix] = self._top(refs, MAX_RESULTS)
+        else:
+            self.short_prefixes.pop(prefix, None)
+
+    def _refresh_short_prefixes(self, ref, label):
+        for prefix in self._short_prefixes_of(label):
+            refs = set(self.short_prefixes.get(prefix, []))
+            refs.add(ref)
+            self.short_prefixes[prefix] = self._top(refs, MAX_RESULTS)
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "keys": len(self.keys),
+            "short_prefixes": len(self.short_prefixes),
+            "built_at": self.built_at,
+        }
+
+
+_index = None
+_index_lock = threading.Lock()
+_last_reload_check = 0.0
+
+
+def snapshot_path():
+    return str(settings.AUTOCOMPLETE["SNAPSHOT_PATH"])
+
+
+def build_index(save_snapshot=True):
+    """Rebuild the index from the database and make it this process's index"""
+    global _index
+    index = PrefixIndex.from_database()
+    if save_snapshot:
+        index.save(snapshot_path())
+    _index = index
+    return index
+
+
+def get_index():
+    """
+    Return the process-wide index, warm-starting from the snapshot file and
+    switching to a newer snapshot when one appears.
+    """
+    global _index, _last_reload_check
+    path = snapshot_path()
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                if os.path.exists(path):
+                    _index = PrefixIndex.load(path)
+                else:
+                    build_index()
+                _last_reload_check = time.monotonic()
+    elif time.monotonic() - _last_reload_check > RELOAD_CHECK_SECONDS:
+        _last_reload_check = time.monotonic()
+        if os.path.exists(path) and os.path.getmtime(path) > (_index.built_at or 0):
+            _index = PrefixIndex.load(path)
+    return _index
+
+
+def loaded_index():
+    """Return the index only if this process already has one"""
+    return _index
+
+
+def update_entry(kind, object_id, label):
+    index = loaded_index()
+    if index is not None:
+        index.upsert(kind, object_id, label)
+
+
+def remove_entry(kind, object_id):
+    index = loaded_index()
+    if index is not None:
+        index.remove(kind, object_id)
+
+
+def book_refs(book_id):
+    """Entries whose popularity follows the owners of ``book_id``"""
+    refs = [("book", book_id)]
+    refs.extend(
+        ("author", author_id)
+        for author_id in Book.authors.through.objects.filter(
+            book_id=book_id
+        ).values_list("author_id", flat=True)
+    )
+    refs.extend(
+        ("genre", genre_id)
+        for genre_id in Book.genres.through.objects.filter(book_id=book_id).values_list(
+            "genre_id", flat=True
+        )
+    )
+    return refs
+
+
+def owners_changed(book_id, delta):
+    """Apply a change in the number of UserBook owners of a book"""
+    index = loaded_index()
+    if index is None:
+        return
+    for kind, object_id in book_refs(book_id):
+        index.add_weight(kind, object_id, delta)
@@ -0,0 +1,80 @@
+"""
+"Who in my network has this book available?"
+
+``friends`` and ``network`` (friends and friends of friends) scopes resolve
+to the cached hop map in ``friendships.graph``, ranked by hops, without
+blocked users. Available copies are then read for those owners in rank
+order with one ``UserBook`` query per chunk of owners (served by the partial
+``books_userbook_available`` index), stopping as soon as the page is full,
+so the nearest part of a large network is usually answered in one query.
+
+The ``radius`` scope is a single ``UserBook`` query instead: the geohash
+prefilter on the owners' cells, the availability and active-owner
+conditions and the blocked-set exclusion all go into it (see
+``books.nearby``), ranked by distance.
+
+Only the copies on the page are then loaded with their books.
+"""
+
+from friendships import blocking
+from friendships.graph import friend_ids, network_hops
+
+from .models import UserBook
+from .nearby import nearby_copies
+
+OWNER_CHUNK_SIZE = 2000
+
+
+def scope_owners(user, scope):
+    """Return ``{owner_id: hops}`` for the friends or network scope"""
+    if scope == "friends":
+        blocked = blocking.blocked_ids(user.pk)
+        return {owner_id: 1 for owner_id in friend_ids(user.pk) - blocked}
+    return network_hops(user.pk)
+
+
+def available_copies(user, scope, book_id=None, radius_km=None, limit=20):
+    """
+    Return up to ``limit`` ``(user_book, rank)`` pairs of copies available in
+    the scope, best ranked owners first. ``rank`` is hops or kilometres.
+    """
+    if scope == "radius":
+        if user.latitude is None or user.longitude is None:
+            return []
+        return nearby_copies(
+            user.latitude,
+            user.longitude,
+            radius_km,
+            limit=limit,
+            book_id=book_id,
+            user_id=user.pk,
+        )
+
+    owners = scope_owners(user, scope)
+    ranked = sorted(owners, key=lambda owner_id: (owners[owner_id], owner_id))
+    found = []
+    for start in range(0, len(ranked), OWNER_CHUNK_SIZE):
+        chunk = ranked[start : start + OWNER_CHUNK_SIZE]
+        user_books = UserBook.objects.filter(
+            user_id__in=chunk, available_for_exchange=True, user__is_active=True
+        )
+        if book_id is not None:
+            user_books = user_books.filter(book_id=book_id)
+        found.extend(user_books.values_list("id", "user_id"))
+        # Owners are ranked, so a full page from the best chunks is final
+        if len(found) >= limit:
+            break
+    found.sort(key=lambda row: (owners[row[1]], row[1], row[0]))
+    found = found[:limit]
+
+    user_books = (
+        UserBook.objects.filter(id__in=[copy_id for copy_id, _ in found])
+        .select_related("user")
+        .with_book()
+        .in_bulk()
+    )
+    return [
+        (user_books[copy_id], owners[owner_id])
+        for copy_id, owner_id in found
+        if copy_id in user_books
+    ]
@@ -0,0 +1,201 @@
+"""
+Typo-tolerant matching of author names and book titles.
+
+Similarity is the trigram Jaccard score used by PostgreSQL's pg_trgm: text is
+lower-cased, split into words, each word padded with two leading blanks and
+one trailing blank, and the score is shared / (a + b - shared) distinct
+trigrams. PostgreSQL answers from GIN trigram indexes on the source columns;
+other databases use the TrigramIndexEntry table maintained by books.signals.
+"""
+
+import math
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, FloatField, Max, Value
+from django.db.models.functions import Cast
+
+from .models import Author, Book, TrigramIndexEntry
+
+WORD_RE = re.compile(r"[^\W_]+")
+
+# Searchable text of each indexed kind, as a SQL expression on its table
+POSTGRES_EXPRESSIONS = {
+    "author": ("books_author", "(first_name || ' ' || last_name)"),
+    "book": ("books_book", "title"),
+}
+
+
+def trigrams(text):
+    """Return the set of pg_trgm style trigrams of ``text``"""
+    grams = set()
+    for word in WORD_RE.findall(text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def use_pg_trgm():
+    return connection.vendor == "postgresql"
+
+
+def _default_threshold(threshold):
+    if threshold is None:
+        return settings.FUZZY_SEARCH["SIMILARITY_THRESHOLD"]
+    return threshold
+
+
+# Portable index maintenance
+
+
+def index_texts(kind, texts):
+    """Replace the trigram rows of ``{object_id: text}`` for one kind"""
+    if use_pg_trgm() or not texts:
+        return
+    rows = []
+    for object_id, text in texts.items():
+        grams = trigrams(text)
+        rows.extend((kind, object_id, gram, len(grams)) for gram in grams)
+    with transaction.atomic(), connection.cursor() as cursor:
+        TrigramIndexEntry.objects.filter(kind=kind, object_id__in=list(texts)).delete()
+        # Plain tuples instead of model instances, as bulk imports index a lot
+        cursor.executemany(
+            f"INSERT INTO {TrigramIndexEntry._meta.db_table} "
+            "(kind, object_id, trigram, gram_count) VALUES (%s, %s, %s, %s)",
+            rows,
+        )
+
+
+def unindex(kind, object_ids):
+    if use_pg_trgm():
+        return
+    TrigramIndexEntry.objects.filter(kind=kind, object_id__in=list(object_ids)).delete()
+
+
+def index_authors(author_ids):
+    index_texts(
+        "author",
+        {
+            author_id: f"{first_name} {last_name}"
+            for author_id, first_name, last_name in Author.objects.filter(
+                id__in=list(author_ids)
+            ).values_list("id", "first_name", "last_name")
+        },
+    )
+
+
+def index_book_titles(book_ids):
+    index_texts(
+        "book",
+        dict(Book.objects.filter(id__in=list(book_ids)).values_list("id", "title")),
+    )
+
+
+# Lookups
+
+
+def _similar_postgres(kind, text, threshold, limit):
+    table, expression = POSTGRES_EXPRESSIONS[kind]
+    with transaction.atomic(), connection.cursor() as cursor:
+        # The % operator uses the GIN index and honours this threshold
+        cursor.execute("SET LOCAL pg_trgm.similarity_threshold = %s", [threshold])
+        cursor.execute(
+            f"""
+            SELECT id, similarity({expression}, %s) AS score
+            FROM {table}
+            WHERE {expression} %% %s
+            ORDER BY score DESC, id
+            LIMIT %s
+            """,
+            [text, text, limit],
+        )
+        return cursor.fetchall()
+
+
+def _similar_portable(kind, text, threshold, limit):
+    grams = trigrams(text)
+    if not grams:
+        return []
+    # similarity >= threshold implies at least threshold * |grams| shared
+    min_shared = max(1, math.ceil(threshold * len(grams)))
+    rows = (
+        TrigramIndexEntry.objects.filter(kind=kind, trigram__in=grams)
+        .values("object_id")
+        .annotate(shared=Count("id"), total=Max("gram_count"))
+        .filter(shared__gte=min_shared)
+        .annotate(
+            score=Cast(F("shared"), FloatField())
+            / (Value(len(grams)) + F("total") - F("shared"))
+        )
+        .filter(score__gte=threshold)
+        .order_by("-score", "object_id")
+        .values_list("object_id", "score")[:limit]
+    )
+    return list(rows)
+
+
+def similar(kind, text, threshold=None, limit=10):
+    """
+    Return ``(object_id, similarity)`` pairs of ``kind`` ("author" or "book")
+    whose text is at least ``threshold`` similar to ``text``, best first.
+    """
+    threshold = _default_threshold(threshold)
+    if use_pg_trgm():
+        return _similar_postgres(kind, text, threshold, limit)
+    return _similar_portable(kind, text, threshold, limit)
+
+
+def similar_authors(name, threshold=None, limit=10):
+    """Return ``(author, similarity)`` pairs for a possibly misspelled name"""
+    matches = similar("author", name, threshold=threshold, limit=limit)
+    authors = Author.objects.in_bulk([author_id for author_id, _ in matches])
+    return [
+        (authors[author_id], score)
+        for author_id, score in matches
+        if author_id in authors
+    ]
+
+
+def similar_books(title, threshold=None, limit=10):
+    """Return ``(book, similarity)`` pairs for a possibly misspelled title"""
+    matches = similar("book", title, threshold=threshold, limit=limit)
+    books = Book.objects.with_related().in_bulk([book_id for book_id, _ in matches])
+    return [(books[book_id], score) for book_id, score in matches if book_id in books]
+
+
+def did_you_mean(query, threshold=None):
+    """Suggest the closest known title or author name for a query"""
+    candidates = [
+        (score, book.title) for book, score in similar_books(query, threshold, 1)
+    ] + [
+        (score, author.full_name)
+        for author, score in similar_authors(query, threshold, 1)
+    ]
+    if not candidates:
+        return None
+    suggestion = max(candidates)[1]
+    return None if suggestion.lower() == query.strip().lower() else suggestion
+
+
+def find_duplicate_authors(threshold=0.6, chunk_size=500):
+    """
+    Yield ``(author_id, duplicate_id, similarity)`` for pairs of authors whose
+    names look alike, reusing the fuzzy index for candidate lookup.
+    """
+    last_id = 0
+    while True:
+        chunk = list(
+            Author.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", "first_name", "last_name")[:chunk_size]
+        )
+        if not chunk:
+            return
+        for author_id, first_name, last_name in chunk:
+            for other_id, score in similar(
+                "author", f"{first_name} {last_name}", threshold=threshold
+            ):
+                if other_id > author_id:
+                    yield author_id, other_id, score
+        last_id = chunk[-1][0]
@@ -0,0 +1,403 @@
+"""
+Streaming bulk import of catalogue dumps (CSV or JSON lines).
+
+Records are read lazily and processed in fixed-size chunks, so memory is
+bounded by the chunk size rather than the file. Each chunk resolves its
+authors, publishers and genres with set-based lookups, creates the missing
+ones in bulk, skips books that already exist (by ISBN, or by title,
+publication date and publisher) and writes books and their M2M rows in bulk,
+using COPY on PostgreSQL. Every chunk commits together with the import's
+checkpoint, so an interrupted import resumes after the last committed chunk.
+Uploaded imports run in the ``import_catalogue`` Celery task and are never
+run in the request; one that cannot be queued is marked failed for a later
+resume.
+
+Recognised fields: title, subtitle, isbn_10, isbn_13, authors, publisher,
+genres, publication_date, edition, language, pages, format, description.
+``authors`` and ``genres`` are lists in JSON lines and ``;``-separated in
+CSV. ``bulk_create`` and COPY bypass the model signals, so the search,
+fuzzy, content similarity and this process's autocomplete indexes are
+updated here for each chunk. Other processes only read autocomplete
+snapshots, so a completed import also rebuilds the snapshot.
+"""
+
+import csv
+import json
+import logging
+import time
+from datetime import date, timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from bookexchange.celery import enqueue
+
+from . import autocomplete, fuzzy, search, similarity
+from .isbn import book_isbn_key, is_valid_isbn10, is_valid_isbn13
+from .isbn import normalize as normalize_isbn
+from .models import Author, Book, CatalogueImport, Genre, Publisher
+
+logger = logging.getLogger(__name__)
+
+LIST_SEPARATOR = ";"
+LOOKUP_CHUNK_SIZE = 500
+LANGUAGES = {code for code, _ in Book.LANGUAGE_CHOICES}
+
+
+# Reading
+
+
+def read_records(stream, format):
+    """Yield raw record dicts from a text stream, one at a time"""
+    if format == "csv":
+        yield from csv.DictReader(stream)
+    elif format == "jsonl":
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        raise ValueError(f"Unsupported catalogue format: {format}")
+
+
+def _text(record, field, max_length=None):
+    value = record.get(field)
+    value = "" if value is None else str(value).strip()
+    return value[:max_length] if max_length else value
+
+
+def _names(value):
+    if isinstance(value, str):
+        value = value.split(LIST_SEPARATOR)
+    return list(dict.fromkeys(str(name).strip() for name in value or [] if name))
+
+
+def split_author_name(name):
+    first_name, _, last_name = name.rpartition(" ")
+    return first_name[:100], last_name[:100]
+
+
+def parse_record(record):
+    """Normalise one raw record, or return None if it has no title"""
+    title = _text(record, "title", 300)
+    if not title:
+        return None
+    isbn_10 = normalize_isbn(_text(record, "isbn_10"))
+    isbn_13 = normalize_isbn(_text(record, "isbn_13"))
+    isbn_10 = isbn_10 if is_valid_isbn10(isbn_10) else None
+    isbn_13 = isbn_13 if is_valid_isbn13(isbn_13) else None
+    try:
+        publication_date = date.fromisoformat(_text(record, "publication_date"))
+    except ValueError:
+        publication_date = None
+    pages = _text(record, "pages")
+    language = _text(record, "language").lower()
+    return {
+        "title": title,
+        "subtitle": _text(record, "subtitle", 300),
+        "isbn_10": isbn_10,
+        "isbn_13": isbn_13,
+        "isbn_key": book_isbn_key(isbn_13, isbn_10),
+        "authors": [
+            split_author_name(name[:201]) for name in _names(record.get("authors"))
+        ],
+        "publisher": _text(record, "publisher", 200),
+        "genres": [name[:50] for name in _names(record.get("genres"))],
+        "publication_date": publication_date,
+        "edition": _text(record, "edition", 50),
+        "language": language if language in LANGUAGES else "other",
+        "pages": int(pages) if pages.isdigit() else None,
+        "format": _text(record, "format", 50),
+        "description": _text(record, "description"),
+    }
+
+
+# Set-based resolution of related rows
+
+
+def _chunks(items, size=LOOKUP_CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def _resolve_names(model, names):
+    """Return ``{name: id}`` for a model with a unique name, creating misses"""
+    ids = {}
+    for chunk in _chunks(names):
+        ids.update(model.objects.filter(name__in=chunk).values_list("name", "id"))
+    missing = [model(name=name) for name in names if name not in ids]
+    if missing:
+        # A concurrent import may have created some of them meanwhile
+        model.objects.bulk_create(missing, ignore_conflicts=True)
+        for chunk in _chunks(missing):
+            ids.update(
+                model.objects.filter(
+                    name__in=[instance.name for instance in chunk]
+                ).values_list("name", "id")
+            )
+    return ids
+
+
+def _resolve_authors(names):
+    """Return ``{(first_name, last_name): id}``, creating unknown authors"""
+    ids = {}
+    for chunk in _chunks({last_name for _, last_name in names}):
+        for author_id, first_name, last_name in (
+            Author.objects.filter(last_name__in=chunk)
+            .order_by("id")
+            .values_list("id", "first_name", "last_name")
+        ):
+            ids.setdefault((first_name, last_name), author_id)
+    missing = [
+        Author(first_name=first_name, last_name=last_name)
+        for first_name, last_name in names
+        if (first_name, last_name) not in ids
+    ]
+    created = Author.objects.bulk_create(missing)
+    ids.update({(author.first_name, author.last_name): author.id for author in created})
+    return ids, [author.id for author in created]
+
+
+def _existing_books(rows, publisher_ids):
+    """Return the indexes of rows that match a book already in the catalogue"""
+    isbns = {
+        value
+        for row in rows
+        for value in (row["isbn_key"], row["isbn_10"], row["isbn_13"])
+        if value
+    }
+    known_isbns = set()
+    for chunk in _chunks(isbns):
+        for values in Book.objects.filter(
+            Q(isbn_key__in=chunk) | Q(isbn_10__in=chunk) | Q(isbn_13__in=chunk)
+        ).values_list("isbn_key", "isbn_10", "isbn_13"):
+            known_isbns.update(value for value in values if value)
+
+    known_editions = set()
+    for chunk in _chunks({row["title"] for row in rows}):
+        known_editions.update(
+            Book.objects.filter(title__in=chunk).values_list(
+                "title", "publication_date", "publisher_id"
+            )
+        )
+
+    existing = set()
+    for position, row in enumerate(rows):
+        row_isbns = {row["isbn_key"], row["isbn_10"], row["isbn_13"]} - {None}
+        edition = (
+            row["title"],
+            row["publication_date"],
+            publisher_ids.get(row["publisher"]),
+        )
+        # Books without an ISBN also match on missing dates or publishers,
+        # which the unique constraint ignores, so re-imports add no duplicates
+        same_edition = edition in known_editions and (
+            not row_isbns or None not in edition
+        )
+        if row_isbns & known_isbns or same_edition:
+            existing.add(position)
+        known_isbns.update(row_isbns)
+        known_editions.add(edition)
+    return existing
+
+
+# Writing
+
+
+def use_copy():
+    return connection.vendor == "postgresql"
+
+
+def _copy_instances(model, instances):
+    """Insert ``instances`` (with primary keys set) through COPY"""
+    fields = model._meta.concrete_fields
+    columns = ", ".join(connection.ops.quote_name(field.column) for field in fields)
+    with connection.cursor() as cursor:
+        with cursor.copy(f"COPY {model._meta.db_table} ({columns}) FROM STDIN") as copy:
+            for instance in instances:
+                copy.write_row(
+                    [
+                        field.get_db_prep_save(
+                            field.pre_save(instance, add=True), connection
+                        )
+                        for field in fields
+                    ]
+                )
+
+
+def _reserve_ids(model, count):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, 'id')) "
+            "FROM generate_series(1, %s)",
+            [model._meta.db_table, count],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _insert(model, instances):
+    if not instances:
+        return instances
+    if use_copy():
+        for instance, pk in zip(instances, _reserve_ids(model, len(instances))):
+            instance.pk = pk
+        _copy_instances(model, instances)
+        return instances
+    return model.objects.bulk_create(instances, batch_size=1000)
+
+
+def import_chunk(records):
+    """
+    Import one chunk of raw records in the current transaction. Returns
+    ``(books_created, records_skipped)``.
+    """
+    rows = [row for row in map(parse_record, records) if row is not None]
+    skipped = len(records) - len(rows)
+
+    publisher_ids = _resolve_names(
+        Publisher, {row["publisher"] for row in rows if row["publisher"]}
+    )
+    existing = _existing_books(rows, publisher_ids)
+    rows = [row for position, row in enumerate(rows) if position not in existing]
+    skipped += len(existing)
+
+    author_ids, new_author_ids = _resolve_authors(
+        {name for row in rows for name in row["authors"]}
+    )
+    genre_ids = _resolve_names(Genre, {name for row in rows for name in row["genres"]})
+
+    related = ("authors", "publisher", "genres")
+    books = _insert(
+        Book,
+        [
+            Book(
+                publisher_id=publisher_ids.get(row["publisher"]),
+                **{key: value for key, value in row.items() if key not in related},
+            )
+            for row in rows
+        ],
+    )
+
+    book_authors = {
+        (book.id, author_ids[name])
+        for book, row in zip(books, rows)
+        for name in row["authors"]
+    }
+    book_genres = {
+        (book.id, genre_ids[name])
+        for book, row in zip(books, rows)
+        for name in row["genres"]
+    }
+    _insert(
+        Book.authors.through,
+        [
+            Book.authors.through(book_id=book_id, author_id=author_id)
+            for book_id, author_id in book_authors
+        ],
+    )
+    _insert(
+        Book.genres.through,
+        [
+            Book.genres.through(book_id=book_id, genre_id=genre_id)
+            for book_id, genre_id in book_genres
+        ],
+    )
+
+    book_ids = [book.id for book in books]
+    search.index_books(book_ids)
+    fuzzy.index_book_titles(book_ids)
+    fuzzy.index_authors(new_author_ids)
+    similarity.books_changed(book_ids)
+    for book in books:
+        autocomplete.update_entry("book", book.id, book.title)
+    new_author_ids = set(new_author_ids)
+    for (first_name, last_name), author_id in author_ids.items():
+        if author_id in new_author_ids:
+            autocomplete.update_entry("author", author_id, f"{first_name} {last_name}")
+    for name, genre_id in genre_ids.items():
+        autocomplete.update_entry("genre", genre_id, name)
+    return len(books), skipped
+
+
+def run_import(catalogue_import, stream, chunk_size=1000, progress=None):
+    """
+    Import ``stream`` into the catalogue, resuming after the records already
+    committed by ``catalogue_import``. ``progress`` is called with the
+    import after every chunk.
+    """
+    records = read_records(stream, catalogue_import.format)
+    # Fast-forward past chunks committed by an earlier, interrupted run
+    for _ in islice(records, catalogue_import.records_processed):
+        pass
+
+    catalogue_import.status = "running"
+    catalogue_import.error = ""
+    catalogue_import.save(update_fields=["status", "error", "updated_at"])
+    try:
+        while True:
+            started = time.perf_counter()
+            chunk = list(islice(records, chunk_size))
+            if not chunk:
+                break
+            with transaction.atomic():
+                created, skipped = import_chunk(chunk)
+                catalogue_import.records_processed += len(chunk)
+                catalogue_import.books_created += created
+                catalogue_import.books_skipped += skipped
+                catalogue_import.elapsed_seconds += time.perf_counter() - started
+                catalogue_import.save()
+            if progress:
+                progress(catalogue_import)
+    except Exception as error:
+        catalogue_import.status = "failed"
+        catalogue_import.error = str(error)
+        catalogue_import.save(update_fields=["status", "error", "updated_at"])
+        raise
+
+    catalogue_import.status = "completed"
+    catalogue_import.finished_at = timezone.now()
+    catalogue_import.save()
+    autocomplete.build_index()
+    return catalogue_import
+
+
+def import_file(catalogue_import, chunk_size=1000, progress=None):
+    """Run an import whose source is a local file path"""
+    with open(catalogue_import.source, encoding="utf-8", newline="") as stream:
+        return run_import(catalogue_import, stream, chunk_size, progress)
+
+
+def queue(catalogue_import):
+    """
+    Queue (or resume) a committed import. An import that cannot be queued is
+    marked failed so that it can be resumed, and False is returned.
+    """
+    from .tasks import import_catalogue
+
+    if enqueue(import_catalogue, catalogue_import.id):
+        return True
+    catalogue_import.status = "failed"
+    catalogue_import.error = "Could not queue the import, resume it later"
+    catalogue_import.save(update_fields=["status", "error", "updated_at"])
+    return False
+
+
+def claim_for_resume(catalogue_import):
+    """
+    Reset a failed import, or one left pending or running without progress
+    for ``STALE_AFTER_MINUTES``, to pending. The conditional update lets
+    only one of several concurrent resumes through. Returns whether it did.
+    """
+    stale = timezone.now() - timedelta(
+        minutes=settings.CATALOGUE_IMPORT["STALE_AFTER_MINUTES"]
+    )
+    claimed = CatalogueImport.objects.filter(
+        Q(status="failed") | Q(status__in=["pending", "running"], updated_at__lt=stale),
+        id=catalogue_import.id,
+    ).update(status="pending", error="", updated_at=timezone.now())
+    if claimed:
+        catalogue_import.refresh_from_db()
+    return bool(claimed)
@@ -0,0 +1,116 @@
+"""
+ISBN normalisation and ISBN-10/ISBN-13 unification.
+
+Every book with a valid ISBN gets a canonical ISBN-13 in ``Book.isbn_key``,
+so a lookup by either form, with or without hyphens, is a single unique
+index hit.
+"""
+
+import re
+
+SEPARATORS_RE = re.compile(r"[\s\-]")
+
+
+def normalize(value):
+    """Strip separators and upper-case a trailing ``x`` check digit"""
+    return SEPARATORS_RE.sub("", value or "").upper()
+
+
+def isbn10_check_digit(digits):
+    total = sum((10 - position) * int(digit) for position, digit in enumerate(digits))
+    check = (11 - total % 11) % 11
+    return "X" if check == 10 else str(check)
+
+
+def isbn13_check_digit(digits):
+    total = sum(
+        int(digit) * (3 if position % 2 else 1) for position, digit in enumerate(digits)
+    )
+    return str((10 - total % 10) % 10)
+
+
+def is_valid_isbn10(value):
+    return (
+        len(value) == 10
+        and value[:9].isdigit()
+        and isbn10_check_digit(value[:9]) == value[9]
+    )
+
+
+def is_valid_isbn13(value):
+    return (
+        len(value) == 13
+        and value.isdigit()
+        and isbn13_check_digit(value[:12]) == value[12]
+    )
+
+
+def to_isbn13(value):
+    """
+    Return the canonical ISBN-13 of an ISBN-10 or ISBN-13 in any common
+    notation. Raises ValueError if it is malformed or its checksum is wrong.
+    """
+    value = normalize(value)
+    if is_valid_isbn13(value):
+        return value
+    if is_valid_isbn10(value):
+        digits = "978" + value[:9]
+        return digits + isbn13_check_digit(digits)
+    raise ValueError(f"Invalid ISBN: {value or '(empty)'}")
+
+
+def book_isbn_key(isbn_13, isbn_10):
+    """Canonical key for a book's stored ISBNs, or None if neither is valid"""
+    for value in (isbn_13, isbn_10):
+        if value:
+            try:
+                return to_isbn13(value)
+            except ValueError:
+                continue
+    return None
+
+
+def backfill_keys(book_model, batch_size=1000):
+    """
+    Fill ``isbn_key`` for books that lack it, walking the table by id in
+    batches. Books whose key already belongs to another book keep no key.
+    Returns ``(updated, conflicts)``.
+    """
+    missing = book_model.objects.filter(isbn_key__isnull=True).exclude(
+        isbn_10__isnull=True, isbn_13__isnull=True
+    )
+    updated = conflicts = 0
+    last_id = 0
+    while True:
+        batch = list(
+            missing.filter(id__gt=last_id)
+            .order_by("id")
+            .only("id", "isbn_10", "isbn_13")[:batch_size]
+        )
+        if not batch:
+            return updated, conflicts
+        last_id = batch[-1].id
+
+        keyed = {}
+        for book in batch:
+            key = book_isbn_key(book.isbn_13, book.isbn_10)
+            if key is None:
+                continue
+            if key in keyed:
+                conflicts += 1
+                continue
+            keyed[key] = book
+        taken = set(
+            book_model.objects.filter(isbn_key__in=list(keyed)).values_list(
+                "isbn_key", flat=True
+            )
+        )
+        books = []
+        for key, book in keyed.items():
+            if key in taken:
+                conflicts += 1
+                continue
+            book.isbn_key = key
+            books.append(book)
+        book_model.objects.bulk_update(books, ["isbn_key"])
+        updated += len(books)
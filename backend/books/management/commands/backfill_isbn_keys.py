@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from books.isbn import backfill_keys
+from books.models import Book
+
+
+class Command(BaseCommand):
+    help = "Fill the canonical ISBN-13 key of books that do not have one yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        updated, conflicts = backfill_keys(Book, batch_size=options["batch_size"])
+        self.stdout.write(
+            f"Keyed {updated} books, skipped {conflicts} with a duplicate ISBN"
+        )
@@ -0,0 +1,87 @@
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import reset_queries, transaction
+
+from accounts.geo import encode
+from books.models import Book, UserBook
+from books.nearby import nearby_copies
+from friendships import benchmarks
+
+
+class Command(BaseCommand):
+    help = "Time /books/nearby searches over synthetic users around a few cities"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1_000_000)
+        parser.add_argument("--cities", type=int, default=50)
+        parser.add_argument("--radius-km", type=float, default=10)
+        parser.add_argument("--samples", type=int, default=200)
+        parser.add_argument("--batch-size", type=int, default=10000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--keep", action="store_true", help="Keep the synthetic data"
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        # Most users live around a city, the rest anywhere in a Europe-sized box
+        cities = [
+            (rng.uniform(36, 60), rng.uniform(-10, 30))
+            for _ in range(options["cities"])
+        ]
+
+        def location():
+            if rng.random() < 0.3:
+                return rng.uniform(36, 60), rng.uniform(-10, 30)
+            lat, lon = rng.choice(cities)
+            return lat + rng.gauss(0, 0.15), lon + rng.gauss(0, 0.2)
+
+        User = get_user_model()
+        count, batch_size = options["users"], options["batch_size"]
+        with transaction.atomic():
+            book = Book.objects.create(title="Benchmark book")
+            start = User.objects.order_by("-id").values_list("id", flat=True).first()
+            start = start or 0
+            for offset in range(0, count, batch_size):
+                users = []
+                for i in range(offset, min(offset + batch_size, count)):
+                    lat, lon = location()
+                    users.append(
+                        User(
+                            email=f"nearby{start + i}@example.com",
+                            username=f"nearby{start + i}",
+                            password="!",
+                            latitude=round(lat, 6),
+                            longitude=round(lon, 6),
+                            # bulk_create skips save(), which sets the cell
+                            geo_cell=encode(lat, lon),
+                        )
+                    )
+                users = User.objects.bulk_create(users)
+                # A third of the users offer a copy
+                UserBook.objects.bulk_create(
+                    UserBook(user_id=user.id, book=book, available_for_exchange=True)
+                    for user in users
+                    if rng.random() < 1 / 3
+                )
+            self.stdout.write(f"Created {count} users around {len(cities)} cities")
+
+            # The inserts above filled the debug query log
+            reset_queries()
+            origins = [location() for _ in range(options["samples"])]
+            radius_km = options["radius_km"]
+
+            def search(origin):
+                return nearby_copies(*origin, radius_km)
+
+            self.stdout.write(
+                benchmarks.format_stats(
+                    f"nearby copies within {radius_km:g} km",
+                    benchmarks.measure(search, origins),
+                )
+            )
+
+            if not options["keep"]:
+                transaction.set_rollback(True)
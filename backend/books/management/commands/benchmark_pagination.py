@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from bookexchange.pagination import CursorPagination, encode_cursor
+from books.models import Book
+from friendships import benchmarks
+
+
+class Command(BaseCommand):
+    help = "Compare OFFSET and cursor pagination of the book list at a deep page"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--page", type=int, default=10000)
+        parser.add_argument("--page-size", type=int, default=20)
+        parser.add_argument("--samples", type=int, default=20)
+        parser.add_argument("--batch-size", type=int, default=10000)
+        parser.add_argument(
+            "--keep", action="store_true", help="Keep the synthetic data"
+        )
+
+    def handle(self, *args, **options):
+        page, page_size = options["page"], options["page_size"]
+        total = (page + options["samples"]) * page_size
+        with transaction.atomic():
+            # bulk_create skips the search and autocomplete signal handlers
+            Book.objects.bulk_create(
+                (
+                    Book(title=f"Benchmark book {i % 5000:05d}", edition=str(i))
+                    for i in range(total)
+                ),
+                batch_size=options["batch_size"],
+            )
+            self.stdout.write(f"Created {total} books")
+
+            books = Book.objects.with_related()
+            keys = list(books.order_by("title", "id").values_list("title", "id"))
+            pages = range(page, page + options["samples"])
+            cursors = {
+                number: encode_cursor(keys[(number - 1) * page_size - 1])
+                for number in pages
+            }
+            paginator = CursorPagination(ordering=("title", "id"))
+
+            def offset_page(number):
+                offset = (number - 1) * page_size
+                return (
+                    list(books.order_by("title", "id")[offset : offset + page_size]),
+                    books.count(),
+                )
+
+            def cursor_page(number):
+                pagination = CursorPagination.Input(
+                    cursor=cursors[number], limit=page_size
+                )
+                return paginator.paginate_queryset(books, pagination)
+
+            self.stdout.write(
+                benchmarks.format_stats(
+                    f"OFFSET + COUNT page {page}",
+                    benchmarks.measure(offset_page, pages),
+                )
+            )
+            self.stdout.write(
+                benchmarks.format_stats(
+                    f"cursor page {page}", benchmarks.measure(cursor_page, pages)
+                )
+            )
+
+            if not options["keep"]:
+                transaction.set_rollback(True)
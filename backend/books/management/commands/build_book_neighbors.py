@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from books.recommendations import build_neighbors
+
+
+class Command(BaseCommand):
+    help = "Recompute item-item book neighbours from ratings, reviews and shelves"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--neighbors", type=int, default=None)
+        parser.add_argument("--min-support", type=int, default=None)
+        parser.add_argument(
+            "--max-block-nnz",
+            type=int,
+            default=None,
+            help="Bound on the non-zeros of one similarity block (memory)",
+        )
+
+    def handle(self, *args, **options):
+        def progress(done, total):
+            self.stdout.write(f"  {done}/{total} books")
+
+        stats = build_neighbors(
+            neighbors=options["neighbors"],
+            max_block_nnz=options["max_block_nnz"],
+            min_support=options["min_support"],
+            progress=progress,
+        )
+        self.stdout.write(
+            f"Stored {stats['neighbors']} neighbours for {stats['books']} books "
+            f"from {stats['preferences']} preferences of {stats['users']} users "
+            f"in {stats['seconds']:.1f}s"
+        )
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from books.similarity import build_index, index_dir
+
+
+class Command(BaseCommand):
+    help = "Rebuild the TF-IDF content vectors behind similar-book lookups"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dimensions", type=int, default=None)
+        parser.add_argument("--chunk-size", type=int, default=None)
+
+    def handle(self, *args, **options):
+        def progress(done, total):
+            self.stdout.write(f"  {done}/{total} books")
+
+        stats = build_index(
+            dimensions=options["dimensions"],
+            chunk_size=options["chunk_size"],
+            progress=progress,
+        )
+        self.stdout.write(
+            f"Indexed {stats['books']} books over {stats['terms']} terms "
+            f"({stats['dimensions']} dimensions) in {stats['seconds']:.1f}s, "
+            f"files in {index_dir()}"
+        )
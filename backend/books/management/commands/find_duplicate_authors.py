@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from books.fuzzy import find_duplicate_authors
+from books.models import Author
+
+
+class Command(BaseCommand):
+    help = "List pairs of authors whose names are probably the same person"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threshold", type=float, default=0.6)
+
+    def handle(self, *args, **options):
+        found = 0
+        for author_id, other_id, score in find_duplicate_authors(
+            threshold=options["threshold"]
+        ):
+            authors = Author.objects.in_bulk([author_id, other_id])
+            self.stdout.write(
+                f"{score:.2f}  #{author_id} {authors[author_id].full_name}"
+                f"  ~  #{other_id} {authors[other_id].full_name}"
+            )
+            found += 1
+        self.stdout.write(f"Found {found} likely duplicates")
@@ -0,0 +1,54 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from bookexchange import renditions
+from books.models import Book
+
+TARGETS = {
+    "covers": (Book, "cover_image"),
+    "avatars": (get_user_model(), "avatar"),
+}
+
+
+class Command(BaseCommand):
+    help = "Render missing or outdated cover and avatar renditions in process"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--only", choices=sorted(TARGETS))
+        parser.add_argument(
+            "--force", action="store_true", help="Re-render up-to-date images too"
+        )
+        parser.add_argument("--chunk-size", type=int, default=200)
+
+    def handle(self, *args, **options):
+        for target, (model, field_name) in TARGETS.items():
+            if options["only"] and options["only"] != target:
+                continue
+            images = source_bytes = 0
+            started = time.perf_counter()
+            queryset = model.objects.exclude(**{field_name: ""}).exclude(
+                **{f"{field_name}__isnull": True}
+            )
+            last_id = 0
+            while True:
+                chunk = list(
+                    queryset.filter(id__gt=last_id).order_by("id")[
+                        : options["chunk_size"]
+                    ]
+                )
+                if not chunk:
+                    break
+                last_id = chunk[-1].id
+                for instance in chunk:
+                    if options["force"] or renditions.is_stale(instance, field_name):
+                        _, size, _ = renditions.generate(instance, field_name)
+                        images += 1
+                        source_bytes += size
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"{target}: rendered {images} images in {elapsed:.1f}s, "
+                f"{images / elapsed if elapsed else 0:.1f} images/s, "
+                f"{source_bytes / 1_000_000 / elapsed if elapsed else 0:.1f} MB/s"
+            )
@@ -0,0 +1,68 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from books.importer import import_file
+from books.models import CatalogueImport
+
+FORMATS_BY_EXTENSION = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+
+
+class Command(BaseCommand):
+    help = "Stream a CSV or JSON-lines catalogue dump into the book catalogue"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["csv", "jsonl"])
+        parser.add_argument(
+            "--chunk-size", type=int, default=settings.CATALOGUE_IMPORT["CHUNK_SIZE"]
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Continue the last unfinished import of this file",
+        )
+
+    def handle(self, *args, **options):
+        path = os.path.abspath(options["path"])
+        if not os.path.exists(path):
+            raise CommandError(f"No such file: {path}")
+        format = options["format"] or FORMATS_BY_EXTENSION.get(
+            os.path.splitext(path)[1].lower()
+        )
+        if format is None:
+            raise CommandError("Cannot infer the format, pass --format")
+
+        catalogue_import = None
+        if options["resume"]:
+            catalogue_import = (
+                CatalogueImport.objects.filter(
+                    source=path, status__in=["pending", "running", "failed"]
+                )
+                .order_by("-created_at")
+                .first()
+            )
+            if catalogue_import:
+                self.stdout.write(
+                    f"Resuming after {catalogue_import.records_processed} records"
+                )
+        if catalogue_import is None:
+            catalogue_import = CatalogueImport.objects.create(
+                source=path, format=format
+            )
+
+        def progress(catalogue_import):
+            self.stdout.write(
+                f"{catalogue_import.records_processed} records, "
+                f"{catalogue_import.books_created} books created, "
+                f"{catalogue_import.rows_per_second:.0f} rows/s"
+            )
+
+        import_file(catalogue_import, options["chunk_size"], progress)
+        self.stdout.write(
+            f"Imported {catalogue_import.books_created} books "
+            f"({catalogue_import.books_skipped} skipped) from "
+            f"{catalogue_import.records_processed} records at "
+            f"{catalogue_import.rows_per_second:.0f} rows/s"
+        )
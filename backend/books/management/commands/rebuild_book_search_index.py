@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from books.models import Book
+from books.search import index_books
+
+
+class Command(BaseCommand):
+    help = "Reindex every book in the full-text search index"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        last_id = 0
+        indexed = 0
+        while True:
+            ids = list(
+                Book.objects.filter(id__gt=last_id)
+                .order_by("id")
+                .values_list("id", flat=True)[:chunk_size]
+            )
+            if not ids:
+                break
+            index_books(ids)
+            indexed += len(ids)
+            last_id = ids[-1]
+        self.stdout.write(f"Indexed {indexed} books")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from books.stats import reconcile
+
+
+class Command(BaseCommand):
+    help = "Recompute the review and owner counters of every book in chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        checked, fixed = reconcile(chunk_size=options["chunk_size"])
+        self.stdout.write(f"Checked {checked} books, corrected {fixed}")
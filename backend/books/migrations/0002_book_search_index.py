@@ -0,0 +1,69 @@
+# Generated by Django 5.0.1 on 2026-10-16 20:45
+
+from django.db import migrations
+
+POSTGRES_FORWARD = """
+ALTER TABLE books_book ADD COLUMN search_vector tsvector;
+CREATE INDEX books_book_search_vector ON books_book USING GIN (search_vector);
+UPDATE books_book b SET search_vector =
+    setweight(to_tsvector('simple', b.title), 'A')
+    || setweight(to_tsvector('simple', b.subtitle), 'B')
+    || setweight(to_tsvector('simple', coalesce((
+        SELECT string_agg(a.first_name || ' ' || a.last_name, ' ')
+        FROM books_book_authors ba
+        JOIN books_author a ON a.id = ba.author_id
+        WHERE ba.book_id = b.id
+    ), '')), 'B')
+    || setweight(to_tsvector('simple', b.description), 'C');
+"""
+
+POSTGRES_REVERSE = """
+DROP INDEX IF EXISTS books_book_search_vector;
+ALTER TABLE books_book DROP COLUMN IF EXISTS search_vector;
+"""
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE books_book_fts
+    USING fts5(title, subtitle, authors, description, tokenize = 'unicode61')
+    """,
+    """
+    INSERT INTO books_book_fts (rowid, title, subtitle, authors, description)
+    SELECT b.id, b.title, b.subtitle, coalesce((
+        SELECT group_concat(a.first_name || ' ' || a.last_name, ' ')
+        FROM books_book_authors ba
+        JOIN books_author a ON a.id = ba.author_id
+        WHERE ba.book_id = b.id
+    ), ''), b.description
+    FROM books_book b
+    """,
+]
+
+SQLITE_REVERSE = ["DROP TABLE IF EXISTS books_book_fts"]
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(POSTGRES_FORWARD)
+    elif schema_editor.connection.vendor == "sqlite":
+        for statement in SQLITE_FORWARD:
+            schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(POSTGRES_REVERSE)
+    elif schema_editor.connection.vendor == "sqlite":
+        for statement in SQLITE_REVERSE:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
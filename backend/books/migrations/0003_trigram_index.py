@@ -0,0 +1,108 @@
+# Generated by Django 5.0.1 on 2026-10-16 20:39
+
+import re
+
+from django.db import migrations, models
+
+POSTGRES_FORWARD = """
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX books_author_name_trgm ON books_author
+    USING GIN ((first_name || ' ' || last_name) gin_trgm_ops);
+CREATE INDEX books_book_title_trgm ON books_book USING GIN (title gin_trgm_ops);
+"""
+
+POSTGRES_REVERSE = """
+DROP INDEX IF EXISTS books_author_name_trgm;
+DROP INDEX IF EXISTS books_book_title_trgm;
+"""
+
+
+def _trigrams(text):
+    grams = set()
+    for word in re.findall(r"[^\W_]+", text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(POSTGRES_FORWARD)
+        return
+
+    # Backfill the portable index used by other databases
+    Author = apps.get_model("books", "Author")
+    Book = apps.get_model("books", "Book")
+    TrigramIndexEntry = apps.get_model("books", "TrigramIndexEntry")
+    sources = [
+        (
+            "author",
+            Author.objects.values_list("id", "first_name", "last_name").iterator(),
+        ),
+        ("book", Book.objects.values_list("id", "title").iterator()),
+    ]
+    for kind, rows in sources:
+        entries = []
+        for object_id, *parts in rows:
+            grams = _trigrams(" ".join(parts))
+            entries.extend(
+                TrigramIndexEntry(
+                    kind=kind, object_id=object_id, trigram=gram, gram_count=len(grams)
+                )
+                for gram in grams
+            )
+            if len(entries) >= 5000:
+                TrigramIndexEntry.objects.bulk_create(entries)
+                entries = []
+        TrigramIndexEntry.objects.bulk_create(entries)
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(POSTGRES_REVERSE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books", "0002_book_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TrigramIndexEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("author", "Author"), ("book", "Book")], max_length=10
+                    ),
+                ),
+                ("object_id", models.BigIntegerField()),
+                ("trigram", models.CharField(max_length=3)),
+                ("gram_count", models.PositiveIntegerField()),
+            ],
+            options={
+                "db_table": "books_trigram_index",
+                "indexes": [
+                    models.Index(
+                        fields=["kind", "trigram", "object_id"],
+                        name="books_trigram_lookup",
+                    ),
+                    models.Index(
+                        fields=["kind", "object_id"], name="books_trigram_object"
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.0.1 on 2026-10-16 20:45
+
+import re
+
+from django.db import migrations, models
+
+# Frozen copy of the books.isbn rules, so later changes there cannot alter
+# what this migration writes
+
+
+def isbn_key(isbn_13, isbn_10):
+    """Canonical ISBN-13 of the first valid stored ISBN, or None"""
+    for value in (isbn_13, isbn_10):
+        value = re.sub(r"[\s\-]", "", value or "").upper()
+        if len(value) == 13 and value.isdigit():
+            digits, check = value[:12], value[12]
+        elif len(value) == 10 and value[:9].isdigit():
+            total = sum((10 - i) * int(digit) for i, digit in enumerate(value[:9]))
+            if "0123456789X"[(11 - total % 11) % 11] != value[9]:
+                continue
+            digits, check = "978" + value[:9], None
+        else:
+            continue
+        total = sum(int(digit) * (3 if i % 2 else 1) for i, digit in enumerate(digits))
+        computed = str((10 - total % 10) % 10)
+        if check is None or check == computed:
+            return digits + computed
+    return None
+
+
+def backfill_isbn_keys(apps, schema_editor):
+    # Books whose key another book already holds keep no key
+    Book = apps.get_model("books", "Book")
+    missing = Book.objects.filter(isbn_key__isnull=True).exclude(
+        isbn_10__isnull=True, isbn_13__isnull=True
+    )
+    last_id = 0
+    while True:
+        batch = list(
+            missing.filter(id__gt=last_id)
+            .order_by("id")
+            .only("id", "isbn_10", "isbn_13")[:2000]
+        )
+        if not batch:
+            return
+        last_id = batch[-1].id
+
+        keyed = {}
+        for book in batch:
+            key = isbn_key(book.isbn_13, book.isbn_10)
+            if key is not None:
+                keyed.setdefault(key, book)
+        taken = set(
+            Book.objects.filter(isbn_key__in=list(keyed)).values_list(
+                "isbn_key", flat=True
+            )
+        )
+        books = []
+        for key, book in keyed.items():
+            if key not in taken:
+                book.isbn_key = key
+                books.append(book)
+        Book.objects.bulk_update(books, ["isbn_key"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books", "0004_book_books_book_title_keyset"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="book",
+            name="isbn_key",
+            field=models.CharField(
+                blank=True, editable=False, max_length=13, null=True, unique=True
+            ),
+        ),
+        migrations.RunPython(backfill_isbn_keys, migrations.RunPython.noop),
+    ]
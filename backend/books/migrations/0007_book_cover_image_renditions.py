@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-16 20:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books", "0006_catalogueimport"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="book",
+            name="cover_image_renditions",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.1 on 2026-10-16 20:52
+
+from django.db import migrations, models
+
+import blobs.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books", "0007_book_cover_image_renditions"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="book",
+            name="cover_image",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                storage=blobs.storage.get_storage,
+                upload_to="book_covers/",
+            ),
+        ),
+    ]
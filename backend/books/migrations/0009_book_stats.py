@@ -0,0 +1,110 @@
+# Generated by Django 5.0.1 on 2026-10-16 20:54
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def compute_book_stats(apps, schema_editor):
+    # Self-contained so later changes to books.stats cannot alter history
+    Book = apps.get_model("books", "Book")
+    BookReview = apps.get_model("books", "BookReview")
+    UserBook = apps.get_model("books", "UserBook")
+
+    def aggregate(queryset, value):
+        return Coalesce(
+            models.Subquery(
+                queryset.filter(book_id=models.OuterRef("pk"))
+                .values("book_id")
+                .annotate(value=value)
+                .values("value")
+            ),
+            0,
+        )
+
+    public_reviews = BookReview.objects.filter(is_public=True)
+    last_id = 0
+    while True:
+        books = list(
+            Book.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .annotate(
+                review_total=aggregate(public_reviews, models.Count("id")),
+                rating_total=aggregate(public_reviews, models.Sum("rating")),
+                owner_total=aggregate(UserBook.objects, models.Count("id")),
+                available_total=aggregate(
+                    UserBook.objects.filter(available_for_exchange=True),
+                    models.Count("id"),
+                ),
+            )
+            .only("id")[:1000]
+        )
+        if not books:
+            return
+        last_id = books[-1].id
+        for book in books:
+            book.review_count = book.review_total
+            book.rating_sum = book.rating_total
+            book.average_rating = (
+                book.rating_total / book.review_total if book.review_total else 0.0
+            )
+            book.owner_count = book.owner_total
+            book.available_count = book.available_total
+        Book.objects.bulk_update(
+            books,
+            [
+                "review_count",
+                "rating_sum",
+                "average_rating",
+                "owner_count",
+                "available_count",
+            ],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books", "0008_alter_book_cover_image"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="book",
+            name="available_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="average_rating",
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="owner_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="rating_sum",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="review_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(
+                fields=["-owner_count", "-id"], name="books_book_popularity"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(
+                fields=["-average_rating", "-review_count", "-id"],
+                name="books_book_rating",
+            ),
+        ),
+        migrations.RunPython(compute_book_stats, migrations.RunPython.noop),
+    ]
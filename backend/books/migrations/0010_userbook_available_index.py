@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-16 21:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books", "0009_book_stats"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="userbook",
+            index=models.Index(
+                condition=models.Q(("available_for_exchange", True)),
+                fields=["book", "user"],
+                name="books_userbook_available",
+            ),
+        ),
+    ]
@@ -1,7 +1,13 @@
+import logging
+
 from django.conf import settings
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 
+from blobs.storage import get_storage
+
+logger = logging.getLogger(__name__)
+
 
 class Genre(models.Model):
     """Book genres"""
@@ -62,6 +68,12 @@ class Publisher(models.Model):
         return self.name
 
 
+class BookQuerySet(models.QuerySet):
+    def with_related(self):
+        """Load publisher, authors and genres in a fixed number of queries"""
+        return self.select_related("publisher").prefetch_related("authors", "genres")
+
+
 class Book(models.Model):
     """Book information"""
 
@@ -84,6 +96,11 @@ class Book(models.Model):
     authors = models.ManyToManyField(Author, related_name="books")
     isbn_10 = models.CharField(max_length=10, blank=True, unique=True, null=True)
     isbn_13 = models.CharField(max_length=13, blank=True, unique=True, null=True)
+    # Canonical ISBN-13 of isbn_13 or isbn_10, maintained by save(); left
+    # empty when another book already holds the same key
+    isbn_key = models.CharField(
+        max_length=13, unique=True, null=True, blank=True, editable=False
+    )
 
     # Publication details
     publisher = models.ForeignKey(
@@ -102,28 +119,117 @@ class Book(models.Model):
     genres = models.ManyToManyField(Genre, related_name="books", blank=True)
 
     # Metadata
-    cover_image = models.ImageField(upload_to="book_covers/", blank=True, null=True)
+    cover_image = models.ImageField(
+        upload_to="book_covers/", storage=get_storage, blank=True, null=True
+    )
+    # Stored resized copies of cover_image (see bookexchange.renditions)
+    cover_image_renditions = models.JSONField(default=dict, blank=True, editable=False)
     goodreads_id = models.CharField(max_length=50, blank=True)
     google_books_id = models.CharField(max_length=50, blank=True)
 
+    # Aggregates over public reviews and copies, maintained by books.stats
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    average_rating = models.FloatField(default=0, editable=False)
+    owner_count = models.PositiveIntegerField(default=0, editable=False)
+    available_count = models.PositiveIntegerField(default=0, editable=False)
+
+    STAT_FIELDS = [
+        "review_count",
+        "rating_sum",
+        "average_rating",
+        "owner_count",
+        "available_count",
+    ]
+
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = BookQuerySet.as_manager()
+
     class Meta:
         db_table = "books_book"
         ordering = ["title"]
         unique_together = [
             ["title", "publication_date", "publisher"],
         ]
+        indexes = [
+            # Keyset pagination of the catalogue
+            models.Index(fields=["title", "id"], name="books_book_title_keyset"),
+            # Sorting by popularity and by rating
+            models.Index(fields=["-owner_count", "-id"], name="books_book_popularity"),
+            models.Index(
+                fields=["-average_rating", "-review_count", "-id"],
+                name="books_book_rating",
+            ),
+        ]
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_isbns = instance._isbns()
+        return instance
+
+    def _isbns(self):
+        if {"isbn_10", "isbn_13"} & self.get_deferred_fields():
+            return None
+        return self.isbn_13, self.isbn_10
+
+    def _update_isbn_key(self):
+        """Recompute isbn_key when the stored ISBNs changed since loading"""
+        from .isbn import book_isbn_key
+
+        isbns = self._isbns()
+        if isbns is None or (
+            not self._state.adding and isbns == getattr(self, "_loaded_isbns", None)
+        ):
+            return False
+        key = book_isbn_key(*isbns)
+        if key and Book.objects.filter(isbn_key=key).exclude(pk=self.pk).exists():
+            logger.warning("Book %s shares ISBN key %s with another book", self.pk, key)
+            key = None
+        self.isbn_key = key
+        return True
+
+    def save(self, *args, **kwargs):
+        isbn_key_changed = self._update_isbn_key()
+        if kwargs.get("update_fields") is None and not self._state.adding:
+            # Never write back counters that F() updates may have moved on
+            skipped = {*self.STAT_FIELDS, *self.get_deferred_fields()}
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skipped
+            ]
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and isbn_key_changed:
+            kwargs["update_fields"] = {*update_fields, "isbn_key"}
+
+        super().save(*args, **kwargs)
+        self._loaded_isbns = self._isbns()
+
     @property
     def author_names(self):
         return ", ".join([author.full_name for author in self.authors.all()])
 
+    @property
+    def genre_names(self):
+        return [genre.name for genre in self.genres.all()]
+
+    @property
+    def publisher_name(self):
+        return self.publisher.name if self.publisher_id else None
+
+    @property
+    def cover_urls(self):
+        from bookexchange.renditions import rendition_urls
+
+        return rendition_urls(self, "cover_image")
+
     @property
     def display_title(self):
         if self.subtitle:
@@ -131,6 +237,14 @@ class Book(models.Model):
         return self.title
 
 
+class UserBookQuerySet(models.QuerySet):
+    def with_book(self):
+        """Join the book (for reading_progress) and batch its relations"""
+        return self.select_related("book__publisher").prefetch_related(
+            "book__authors", "book__genres"
+        )
+
+
 class UserBook(models.Model):
     """User's personal book collection"""
 
@@ -197,10 +311,20 @@ class UserBook(models.Model):
     added_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = UserBookQuerySet.as_manager()
+
     class Meta:
         db_table = "books_user_book"
         unique_together = ["user", "book"]
         ordering = ["-added_at"]
+        indexes = [
+            # Available copies of a book among a set of owners
+            models.Index(
+                fields=["book", "user"],
+                condition=models.Q(available_for_exchange=True),
+                name="books_userbook_available",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.display_name} - {self.book.title}"
@@ -272,3 +396,103 @@ class BookReview(models.Model):
 
     def __str__(self):
         return f"Review of {self.book.title} by {self.user.display_name}"
+
+
+class TrigramIndexEntry(models.Model):
+    """
+    Portable trigram index used for fuzzy author and title matching on
+    databases without pg_trgm (see books.fuzzy)
+    """
+
+    KIND_CHOICES = [
+        ("author", "Author"),
+        ("book", "Book"),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    trigram = models.CharField(max_length=3)
+    # Number of distinct trigrams in the indexed text, for similarity scores
+    gram_count = models.PositiveIntegerField()
+
+    class Meta:
+        db_table = "books_trigram_index"
+        indexes = [
+            models.Index(
+                fields=["kind", "trigram", "object_id"], name="books_trigram_lookup"
+            ),
+            models.Index(fields=["kind", "object_id"], name="books_trigram_object"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}:{self.object_id} '{self.trigram}'"
+
+
+class CatalogueImport(models.Model):
+    """A bulk catalogue import and its resume checkpoint (see books.importer)"""
+
+    FORMAT_CHOICES = [
+        ("csv", "CSV"),
+        ("jsonl", "JSON lines"),
+    ]
+
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("completed", "Completed"),
+        ("failed", "Failed"),
+    ]
+
+    source = models.CharField(max_length=500)
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="catalogue_imports",
+    )
+
+    # Records committed so far; a resumed import skips this many
+    records_processed = models.PositiveBigIntegerField(default=0)
+    books_created = models.PositiveBigIntegerField(default=0)
+    books_skipped = models.PositiveBigIntegerField(default=0)
+    elapsed_seconds = models.FloatField(default=0)
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = "books_catalogue_import"
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"Import of {self.source} ({self.status})"
+
+    @property
+    def rows_per_second(self):
+        if not self.elapsed_seconds:
+            return 0.0
+        return self.records_processed / self.elapsed_seconds
+
+
+class BookNeighbor(models.Model):
+    """
+    A book's nearest neighbours by co-rating, rebuilt by the batch job in
+    books.recommendations
+    """
+
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="neighbors")
+    neighbor = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="+")
+    # Cosine similarity of the two books' preference vectors
+    score = models.FloatField()
+
+    class Meta:
+        db_table = "books_book_neighbor"
+        unique_together = ["book", "neighbor"]
+
+    def __str__(self):
+        return f"{self.book_id} ~ {self.neighbor_id} ({self.score:.3f})"
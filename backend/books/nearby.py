@@ -0,0 +1,62 @@
+"""
+Copies available for exchange near a point.
+
+Owners are prefiltered through the geohash index on ``User.geo_cell`` (see
+``accounts.geo``) and refined with the exact haversine distance. Owners who
+hide their location are never matched, nor are owners blocked by or blocking
+the caller, and distances are rounded so they do not reveal an exact
+position.
+"""
+
+from accounts.geo import haversine_km, radius_filter
+from friendships import blocking
+
+from .models import UserBook
+
+MAX_RADIUS_KM = 200
+DISTANCE_DECIMALS = 1
+
+
+def nearby_copies(lat, lon, radius_km, limit=20, book_id=None, user_id=None):
+    """
+    Return up to ``limit`` ``(user_book, distance_km)`` pairs of available
+    copies within ``radius_km``, nearest first. When ``user_id`` is given its
+    own copies and those of users in its blocked set are left out.
+    """
+    copies = UserBook.objects.filter(
+        radius_filter(lat, lon, radius_km, prefix="user__"),
+        available_for_exchange=True,
+        user__is_active=True,
+        user__show_location=True,
+    )
+    if book_id is not None:
+        copies = copies.filter(book_id=book_id)
+    if user_id is not None:
+        copies = blocking.exclude_blocked(
+            copies.exclude(user_id=user_id), user_id, "user"
+        )
+
+    nearest = []
+    for copy_id, latitude, longitude in copies.values_list(
+        "id", "user__latitude", "user__longitude"
+    ):
+        distance_km = haversine_km(lat, lon, latitude, longitude)
+        if distance_km <= radius_km:
+            nearest.append((distance_km, copy_id))
+    nearest.sort()
+    nearest = nearest[:limit]
+
+    user_books = (
+        UserBook.objects.filter(id__in=[copy_id for _, copy_id in nearest])
+        .select_related("user")
+        .with_book()
+        .in_bulk()
+    )
+    return [
+        (
+            user_books[copy_id],
+            round(distance_km, DISTANCE_DECIMALS),
+        )
+        for distance_km, copy_id in nearest
+        if copy_id in user_books
+    ]
@@ -0,0 +1,248 @@
+"""
+"Readers like you also liked": item-item collaborative filtering.
+
+Every (user, book) pair gets a preference in [0, 1]: the user's review
+rating, else their UserBook rating, else a weak implicit value from the
+shelf status. The batch job arranges the preferences in a sparse
+user-by-book matrix, normalises each book's column and computes cosine
+similarities as ``X.T @ X`` one block of books at a time. Blocks are sized
+by an upper bound of the product's non-zeros, so memory stays bounded
+however many ratings there are; each block's top neighbours replace that
+block's rows in BookNeighbor in their own transaction.
+
+At request time a user's best-liked books are looked up in BookNeighbor
+with one query and their neighbours are summed, weighted by preference.
+"""
+
+import logging
+import time
+from array import array
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from scipy import sparse
+
+from .models import Book, BookNeighbor, BookReview, UserBook
+
+logger = logging.getLogger(__name__)
+
+# Preference of books a user shelved without rating them
+IMPLICIT_PREFERENCE = {
+    "read": 0.5,
+    "reading": 0.5,
+    "want_to_read": 0.4,
+}
+DEFAULT_IMPLICIT_PREFERENCE = 0.3
+FETCH_CHUNK_SIZE = 20000
+
+
+def rating_preference(rating):
+    """Map a 1-5 rating to [0, 1]; a 1-star rating is no preference at all"""
+    return (rating - 1) / 4
+
+
+def _preference_rows(queryset, fields, preference):
+    """Stream ``(user_id, book_id, preference)`` into compact arrays"""
+    users, books, preferences = array("q"), array("q"), array("f")
+    for row in queryset.values_list(*fields).iterator(chunk_size=FETCH_CHUNK_SIZE):
+        users.append(row[0])
+        books.append(row[1])
+        preferences.append(preference(*row[2:]))
+    return (
+        np.frombuffer(users, dtype=np.int64),
+        np.frombuffer(books, dtype=np.int64),
+        np.frombuffer(preferences, dtype=np.float32),
+    )
+
+
+def _shelf_preference(status, rating):
+    if rating is not None:
+        return rating_preference(rating)
+    return IMPLICIT_PREFERENCE.get(status, DEFAULT_IMPLICIT_PREFERENCE)
+
+
+def preference_matrix():
+    """
+    Return ``(matrix, book_ids)``: a CSR users-by-books matrix of preferences
+    and the book id of each column. Reviews override shelf ratings.
+    """
+    shelf = _preference_rows(
+        UserBook.objects.order_by(),
+        ("user_id", "book_id", "status", "rating"),
+        _shelf_preference,
+    )
+    reviews = _preference_rows(
+        BookReview.objects.order_by(),
+        ("user_id", "book_id", "rating"),
+        rating_preference,
+    )
+    # Reviews first, so np.unique keeps them over the shelf entry
+    users = np.concatenate([reviews[0], shelf[0]])
+    books = np.concatenate([reviews[1], shelf[1]])
+    preferences = np.concatenate([reviews[2], shelf[2]])
+    _, first = np.unique((users << 32) | books, return_index=True)
+    first = first[preferences[first] > 0]
+
+    user_ids, rows = np.unique(users[first], return_inverse=True)
+    book_ids, columns = np.unique(books[first], return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (preferences[first], (rows, columns)),
+        shape=(len(user_ids), len(book_ids)),
+        dtype=np.float32,
+    )
+    return matrix, book_ids
+
+
+def _blocks(work, max_block_nnz):
+    """Split rows into consecutive blocks whose summed ``work`` fits the bound"""
+    start, total = 0, 0
+    for row, row_work in enumerate(work):
+        if total and total + row_work > max_block_nnz:
+            yield start, row
+            start, total = row, 0
+        total += row_work
+    if start < len(work):
+        yield start, len(work)
+
+
+def _top_neighbors(similarity, support, row_offset, neighbors, min_support):
+    """Yield ``(row, columns, scores)`` of each block row's best neighbours"""
+    similarity = similarity.multiply(support >= min_support).tocsr()
+    similarity.sort_indices()
+    for local_row in range(similarity.shape[0]):
+        start, end = similarity.indptr[local_row], similarity.indptr[local_row + 1]
+        columns = similarity.indices[start:end]
+        scores = similarity.data[start:end]
+        keep = columns != row_offset + local_row
+        columns, scores = columns[keep], scores[keep]
+        if len(scores) > neighbors:
+            best = np.argpartition(-scores, neighbors)[:neighbors]
+            columns, scores = columns[best], scores[best]
+        if len(scores):
+            yield row_offset + local_row, columns, scores
+
+
+def similar_items(matrix, neighbors, max_block_nnz, min_support):
+    """
+    Yield ``(start, end, top)`` for consecutive blocks of the columns of a
+    users-by-items matrix, where ``top`` lists ``(item, items, scores)`` of
+    each item's best cosine neighbours within the block.
+    """
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    normalized = (matrix @ sparse.diags(1 / np.maximum(norms, 1e-12))).tocsr()
+    normalized.data = normalized.data.astype(np.float32)
+    by_item = normalized.T.tocsr()
+    present = normalized.copy()
+    present.data[:] = 1
+    present_by_item = present.T.tocsr()
+
+    # Non-zeros of a block row are bounded by the ratings of its raters
+    user_degrees = np.diff(present.indptr).astype(np.int64)
+    work = present_by_item @ user_degrees
+
+    for start, end in _blocks(work, max_block_nnz):
+        similarity = by_item[start:end] @ normalized
+        support = present_by_item[start:end] @ present
+        top = list(_top_neighbors(similarity, support, start, neighbors, min_support))
+        yield start, end, top
+
+
+def build_neighbors(
+    neighbors=None, max_block_nnz=None, min_support=None, progress=None
+):
+    """
+    Recompute BookNeighbor from all preferences. Returns build statistics.
+    """
+    options = settings.RECOMMENDATIONS
+    started = time.perf_counter()
+    matrix, book_ids = preference_matrix()
+
+    stored = 0
+    for start, end, top in similar_items(
+        matrix,
+        neighbors or options["NEIGHBORS"],
+        max_block_nnz or options["MAX_BLOCK_NNZ"],
+        min_support or options["MIN_SUPPORT"],
+    ):
+        rows = [
+            BookNeighbor(
+                book_id=int(book_ids[row]),
+                neighbor_id=int(book_ids[column]),
+                score=float(score),
+            )
+            for row, columns, scores in top
+            for column, score in zip(columns, scores)
+        ]
+        with transaction.atomic():
+            BookNeighbor.objects.filter(
+                book_id__in=book_ids[start:end].tolist()
+            ).delete()
+            BookNeighbor.objects.bulk_create(rows, batch_size=5000)
+        stored += len(rows)
+        if progress:
+            progress(end, len(book_ids))
+
+    # Books nobody rates any more keep no neighbours
+    stale = set(BookNeighbor.objects.values_list("book_id", flat=True).distinct())
+    stale = list(stale - set(book_ids.tolist()))
+    for offset in range(0, len(stale), 5000):
+        BookNeighbor.objects.filter(book_id__in=stale[offset : offset + 5000]).delete()
+
+    stats = {
+        "users": matrix.shape[0],
+        "books": matrix.shape[1],
+        "preferences": int(matrix.nnz),
+        "neighbors": stored,
+        "seconds": time.perf_counter() - started,
+    }
+    logger.info("Built book neighbours: %s", stats)
+    return stats
+
+
+def user_preferences(user_id):
+    """``{book_id: preference}`` of one user, reviews over shelf ratings"""
+    preferences = {
+        book_id: _shelf_preference(status, rating)
+        for book_id, status, rating in UserBook.objects.filter(
+            user_id=user_id
+        ).values_list("book_id", "status", "rating")
+    }
+    preferences.update(
+        (book_id, rating_preference(rating))
+        for book_id, rating in BookReview.objects.filter(user_id=user_id).values_list(
+            "book_id", "rating"
+        )
+    )
+    return preferences
+
+
+def recommend(user_id, limit=20, seeds=None):
+    """
+    Return up to ``limit`` ``(book_id, score)`` pairs for a user, combining
+    the stored neighbours of their ``seeds`` best-liked books. Users with no
+    preferences yet get the most owned books.
+    """
+    seeds = seeds or settings.RECOMMENDATIONS["SEEDS"]
+    preferences = user_preferences(user_id)
+    liked = sorted(
+        (book_id for book_id, preference in preferences.items() if preference > 0),
+        key=lambda book_id: -preferences[book_id],
+    )[:seeds]
+
+    scores = defaultdict(float)
+    for book_id, neighbor_id, score in BookNeighbor.objects.filter(
+        book_id__in=liked
+    ).values_list("book_id", "neighbor_id", "score"):
+        if neighbor_id not in preferences:
+            scores[neighbor_id] += score * preferences[book_id]
+    if not scores:
+        popular = (
+            Book.objects.exclude(id__in=list(preferences))
+            .order_by("-owner_count", "-id")
+            .values_list("id", flat=True)[:limit]
+        )
+        return [(book_id, 0.0) for book_id in popular]
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+    return ranked[:limit]
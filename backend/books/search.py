@@ -0,0 +1,145 @@
+"""
+Relevance-ranked full-text search over the book catalogue.
+
+The searchable document of a book is its title, subtitle, author names and
+description. On PostgreSQL it is kept in the ``books_book.search_vector``
+tsvector column (GIN indexed); on SQLite it lives in the ``books_book_fts``
+FTS5 table keyed by book id. Both are created by migration 0002 and kept up
+to date incrementally by ``books.signals`` through ``index_books``.
+"""
+
+from collections import defaultdict
+
+from django.db import connection
+
+from .models import Book
+
+FTS_TABLE = "books_book_fts"
+TEXT_SEARCH_CONFIG = "simple"
+
+
+def _documents(book_ids):
+    """Return ``{book_id: (title, subtitle, authors, description)}``"""
+    authors = defaultdict(list)
+    for book_id, first_name, last_name in Book.authors.through.objects.filter(
+        book_id__in=book_ids
+    ).values_list("book_id", "author__first_name", "author__last_name"):
+        authors[book_id].append(f"{first_name} {last_name}".strip())
+    return {
+        book_id: (title, subtitle, " ".join(authors[book_id]), description)
+        for book_id, title, subtitle, description in Book.objects.filter(
+            id__in=book_ids
+        ).values_list("id", "title", "subtitle", "description")
+    }
+
+
+def index_books(book_ids):
+    """(Re)index the given books, dropping ids that no longer exist"""
+    book_ids = list(book_ids)
+    if not book_ids:
+        return
+    documents = _documents(book_ids)
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.executemany(
+                f"""
+                UPDATE books_book SET search_vector =
+                    setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', %s), 'A')
+                    || setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', %s), 'B')
+                    || setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', %s), 'B')
+                    || setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', %s), 'C')
+                WHERE id = %s
+                """,
+                [(*document, book_id) for book_id, document in documents.items()],
+            )
+        else:
+            cursor.executemany(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid = %s",
+                [(book_id,) for book_id in book_ids],
+            )
+            cursor.executemany(
+                f"""
+                INSERT INTO {FTS_TABLE} (rowid, title, subtitle, authors, description)
+                VALUES (%s, %s, %s, %s, %s)
+                """,
+                [(book_id, *document) for book_id, document in documents.items()],
+            )
+
+
+def unindex_books(book_ids):
+    """Remove deleted books from the SQLite index (PostgreSQL drops the row)"""
+    if connection.vendor == "postgresql":
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"DELETE FROM {FTS_TABLE} WHERE rowid = %s",
+            [(book_id,) for book_id in book_ids],
+        )
+
+
+def _fts5_query(query):
+    # Quote every term so user input cannot use FTS5 operators
+    terms = [term.replace('"', '""') for term in query.split()]
+    return " ".join(f'"{term}"' for term in terms if term)
+
+
+def search_book_ids(query, language=None, genre_id=None, offset=0, limit=20):
+    """
+    Return the ids of books matching ``query``, most relevant first, for one
+    page of results.
+    """
+    filters = []
+    params = []
+    if language:
+        filters.append("b.language = %s")
+        params.append(language)
+    if genre_id:
+        filters.append(
+            "EXISTS (SELECT 1 FROM books_book_genres bg "
+            "WHERE bg.book_id = b.id AND bg.genre_id = %s)"
+        )
+        params.append(genre_id)
+    where = "".join(f" AND {condition}" for condition in filters)
+
+    if connection.vendor == "postgresql":
+        sql = f"""
+            SELECT b.id
+            FROM books_book b,
+                 websearch_to_tsquery('{TEXT_SEARCH_CONFIG}', %s) tsq
+            WHERE b.search_vector @@ tsq{where}
+            ORDER BY ts_rank_cd(b.search_vector, tsq) DESC, b.id
+            LIMIT %s OFFSET %s
+        """
+        params = [query, *params, limit, offset]
+    else:
+        match = _fts5_query(query)
+        if not match:
+            return []
+        # bm25 column weights follow the PostgreSQL A/B/B/C weighting
+        sql = f"""
+            SELECT b.id
+            FROM {FTS_TABLE} f
+            JOIN books_book b ON b.id = f.rowid
+            WHERE {FTS_TABLE} MATCH %s{where}
+            ORDER BY bm25({FTS_TABLE}, 10.0, 4.0, 4.0, 1.0), b.id
+            LIMIT %s OFFSET %s
+        """
+        params = [match, *params, limit, offset]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_books(query, language=None, genre_id=None, page=1, page_size=20):
+    """
+    Return ``(books, has_next)`` for one page of ranked search results.
+    """
+    offset = (page - 1) * page_size
+    ids = search_book_ids(
+        query, language=language, genre_id=genre_id, offset=offset, limit=page_size + 1
+    )
+    has_next = len(ids) > page_size
+    ids = ids[:page_size]
+    books = Book.objects.with_related().in_bulk(ids)
+    return [books[book_id] for book_id in ids if book_id in books], has_next
@@ -0,0 +1,113 @@
+from django.db.models import signals
+from django.dispatch import receiver
+
+from bookexchange import renditions
+
+from . import autocomplete, fuzzy, search, similarity, stats
+from .models import Author, Book, BookReview, Genre, UserBook
+
+
+@receiver(signals.post_save, sender=Book)
+def index_book(sender, instance, **kwargs):
+    search.index_books([instance.pk])
+    fuzzy.index_book_titles([instance.pk])
+    autocomplete.update_entry("book", instance.pk, instance.title)
+    similarity.books_changed([instance.pk])
+    renditions.schedule(instance, "cover_image")
+
+
+@receiver(signals.post_delete, sender=Book)
+def unindex_book(sender, instance, **kwargs):
+    search.unindex_books([instance.pk])
+    fuzzy.unindex("book", [instance.pk])
+    autocomplete.remove_entry("book", instance.pk)
+    similarity.books_deleted([instance.pk])
+    renditions.discard(instance, "cover_image")
+
+
+@receiver(signals.m2m_changed, sender=Book.authors.through)
+def reindex_book_authors(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and reverse:
+        # Remember the books losing this author before the rows disappear
+        instance._cleared_book_ids = list(instance.books.values_list("id", flat=True))
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        book_ids = [instance.pk]
+    elif action == "post_clear":
+        book_ids = getattr(instance, "_cleared_book_ids", [])
+    else:
+        book_ids = pk_set
+    search.index_books(book_ids)
+    similarity.books_changed(book_ids)
+
+
+@receiver(signals.m2m_changed, sender=Book.genres.through)
+def revectorize_book_genres(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and reverse:
+        instance._cleared_book_ids = list(instance.books.values_list("id", flat=True))
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        similarity.books_changed([instance.pk])
+    elif action == "post_clear":
+        similarity.books_changed(getattr(instance, "_cleared_book_ids", []))
+    else:
+        similarity.books_changed(pk_set)
+
+
+@receiver(signals.post_save, sender=Author)
+def reindex_author_books(sender, instance, created, **kwargs):
+    fuzzy.index_authors([instance.pk])
+    autocomplete.update_entry("author", instance.pk, instance.full_name)
+    if not created:
+        search.index_books(instance.books.values_list("id", flat=True))
+
+
+@receiver(signals.post_delete, sender=Author)
+def unindex_author(sender, instance, **kwargs):
+    fuzzy.unindex("author", [instance.pk])
+    autocomplete.remove_entry("author", instance.pk)
+
+
+@receiver(signals.post_save, sender=Genre)
+def update_genre_completion(sender, instance, **kwargs):
+    autocomplete.update_entry("genre", instance.pk, instance.name)
+
+
+@receiver(signals.post_delete, sender=Genre)
+def remove_genre_completion(sender, instance, **kwargs):
+    autocomplete.remove_entry("genre", instance.pk)
+
+
+@receiver(signals.post_init, sender=UserBook)
+def remember_copy(sender, instance, **kwargs):
+    stats.remember(instance, stats.user_book_contribution)
+
+
+@receiver(signals.post_save, sender=UserBook)
+def count_new_owner(sender, instance, created, **kwargs):
+    if created:
+        autocomplete.owners_changed(instance.book_id, 1)
+    stats.changed(instance, stats.user_book_contribution, created)
+
+
+@receiver(signals.post_delete, sender=UserBook)
+def count_removed_owner(sender, instance, **kwargs):
+    autocomplete.owners_changed(instance.book_id, -1)
+    stats.removed(instance)
+
+
+@receiver(signals.post_init, sender=BookReview)
+def remember_review(sender, instance, **kwargs):
+    stats.remember(instance, stats.review_contribution)
+
+
+@receiver(signals.post_save, sender=BookReview)
+def count_review(sender, instance, created, **kwargs):
+    stats.changed(instance, stats.review_contribution, created)
+
+
+@receiver(signals.post_delete, sender=BookReview)
+def count_removed_review(sender, instance, **kwargs):
+    stats.removed(instance)
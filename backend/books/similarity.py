@@ -0,0 +1,510 @@
+"""
+Content-based "similar books", for books nobody has rated yet.
+
+Each book is described by TF-IDF weights over the words of its title,
+subtitle and description and over its genres and authors (as ``genre:<id>``
+and ``author:<id>`` terms). Terms are hashed and every term adds its signed
+weight to a few fixed components of a dense float32 vector (a sparse random
+projection of the TF-IDF vector, which keeps dot products close enough to
+rank by). Vectors are L2-normalised, so a dot product is a cosine.
+
+``build_index`` counts document frequencies in one pass over the catalogue
+and writes the vectors in a second, into a new directory under
+``CONTENT_SIMILARITY["INDEX_DIR"]`` holding ``vectors.f32`` (one row per
+book), ``ids.i64`` (the book of each row) and ``idf.npz``. ``manifest.json``
+names the current build and its number of rows and is replaced atomically.
+Every process memory-maps the current build, so a query is one
+matrix-vector product over the mapped rows and an argpartition.
+
+Books created or edited after a build are appended (or rewritten in place)
+by ``add_books`` with the build's document frequencies, so no rebuild is
+needed; terms the build never saw count as the rarest ones. Readers see
+appended rows as soon as the manifest names them.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from .autocomplete import normalize
+from .models import Book
+
+INDEX_VERSION = 1
+MANIFEST = "manifest.json"
+# Components every term is projected onto
+TERM_SPREAD = 4
+# Term counts of a title word, genre or author, relative to a description word
+TITLE_WEIGHT = 3
+GENRE_WEIGHT = 3
+AUTHOR_WEIGHT = 3
+STOP_WORDS = frozenset(
+    "a an and are as at be but by for from has have he her his in is it its of "
+    "on or she that the their they this to was were which who will with you".split()
+)
+WORD_RE = re.compile(r"[^\W_]+")
+# Seeds of the TERM_SPREAD projections of a term hash (wrapping multiples)
+SPREAD_SEEDS = np.arange(1, TERM_SPREAD + 1, dtype=np.uint64) * np.uint64(
+    0x9E3779B97F4A7C15
+)
+# Per-chunk document frequencies merged together at a time
+MERGE_PARTS = 32
+
+
+# Terms and vectors
+
+
+def words(text):
+    return [
+        word
+        for word in WORD_RE.findall(normalize(text))
+        if len(word) > 1 and word not in STOP_WORDS
+    ]
+
+
+@lru_cache(maxsize=500_000)
+def term_hash(term):
+    """Stable 64-bit hash of a term (``hash()`` differs between processes)"""
+    digest = hashlib.blake2b(term.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def book_terms(book_ids):
+    """Return ``[(book_id, Counter of term counts)]`` in id order"""
+    book_ids = sorted(set(book_ids))
+    terms = defaultdict(Counter)
+    for book_id, title, subtitle, description in Book.objects.filter(
+        id__in=book_ids
+    ).values_list("id", "title", "subtitle", "description"):
+        counts = terms[book_id]
+        for word in words(f"{title} {subtitle}"):
+            counts[word] += TITLE_WEIGHT
+        counts.update(words(description))
+    for through, field, kind, weight in (
+        (Book.genres.through, "genre_id", "genre", GENRE_WEIGHT),
+        (Book.authors.through, "author_id", "author", AUTHOR_WEIGHT),
+    ):
+        for book_id, related_id in through.objects.filter(
+            book_id__in=book_ids
+        ).values_list("book_id", field):
+            if book_id in terms:
+                terms[book_id][f"{kind}:{related_id}"] += weight
+    return [(book_id, terms[book_id]) for book_id in book_ids if book_id in terms]
+
+
+def catalogue_terms(chunk_size):
+    """Yield ``book_terms`` of the whole catalogue, chunk by chunk"""
+    last_id = 0
+    while True:
+        book_ids = list(
+            Book.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", flat=True)[:chunk_size]
+        )
+        if not book_ids:
+            return
+        last_id = book_ids[-1]
+        yield book_terms(book_ids)
+
+
+def _mix(values):
+    """splitmix64 finaliser over an array of uint64"""
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+class Vocabulary:
+    """Inverse document frequencies of term hashes, sorted for searchsorted"""
+
+    def __init__(self, hashes, idf, documents):
+        self.hashes = hashes
+        self.idf = idf
+        self.documents = documents
+        # Terms the build never saw are weighted like terms seen once
+        self.unseen_idf = np.float32(np.log((1 + documents) / 2) + 1)
+
+    @classmethod
+    def from_frequencies(cls, hashes, frequencies, documents):
+        idf = np.log((1 + documents) / (1 + frequencies)) + 1
+        return cls(hashes, idf.astype(np.float32), documents)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["hashes"], data["idf"], int(data["documents"]))
+
+    def save(self, path):
+        with open(path, "wb") as stream:
+            np.savez(stream, hashes=self.hashes, idf=self.idf, documents=self.documents)
+
+    def lookup(self, hashes):
+        if not len(self.hashes):
+            return np.full(len(hashes), self.unseen_idf, dtype=np.float32)
+        positions = np.searchsorted(self.hashes, hashes)
+        positions = np.minimum(positions, len(self.hashes) - 1)
+        found = self.hashes[positions] == hashes
+        return np.where(found, self.idf[positions], self.unseen_idf)
+
+
+def vectorize(documents, vocabulary, dimensions):
+    """Return the normalised ``(len(documents), dimensions)`` float32 vectors"""
+    rows, hashes, counts = [], [], []
+    for row, (_, terms) in enumerate(documents):
+        for term, count in terms.items():
+            rows.append(row)
+            hashes.append(term_hash(term))
+            counts.append(count)
+    rows = np.array(rows, dtype=np.int64)
+    hashes = np.array(hashes, dtype=np.uint64)
+    weights = (1 + np.log(np.array(counts, dtype=np.float64))) * vocabulary.lookup(
+        hashes
+    )
+
+    size = len(documents) * dimensions
+    vectors = np.zeros(size)
+    for seed in SPREAD_SEEDS:
+        mixed = _mix(hashes + seed)
+        positions = rows * dimensions + (mixed % np.uint64(dimensions)).astype(np.int64)
+        signs = np.where(mixed >> np.uint64(63), -1.0, 1.0)
+        vectors += np.bincount(positions, weights=weights * signs, minlength=size)
+    vectors = vectors.reshape(len(documents), dimensions)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.maximum(norms, 1e-12)).astype(np.float32)
+
+
+# Index files
+
+
+def index_dir():
+    return str(settings.CONTENT_SIMILARITY["INDEX_DIR"])
+
+
+def _read_manifest():
+    with open(os.path.join(index_dir(), MANIFEST), encoding="utf-8") as stream:
+        manifest = json.load(stream)
+    if manifest["version"] != INDEX_VERSION:
+        raise ValueError(f"Unsupported similarity index version {manifest['version']}")
+    return manifest
+
+
+def _write_manifest(manifest):
+    path = os.path.join(index_dir(), MANIFEST)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as stream:
+        json.dump(manifest, stream)
+    os.replace(f"{path}.tmp", path)
+
+
+@contextmanager
+def _write_lock():
+    """Serialise writers across processes"""
+    os.makedirs(index_dir(), exist_ok=True)
+    with open(os.path.join(index_dir(), ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class ContentIndex:
+    """One process's memory-mapped view of a build"""
+
+    def __init__(self, manifest, stamp):
+        self.build = manifest["build"]
+        self.dimensions = manifest["dimensions"]
+        self.path = os.path.join(index_dir(), self.build)
+        self.vocabulary = Vocabulary.load(os.path.join(self.path, "idf.npz"))
+        self.row_of = {}
+        self.mapped = (np.zeros((0, self.dimensions), dtype=np.float32), [])
+        self.refresh(manifest, stamp)
+
+    def refresh(self, manifest, stamp):
+        """Map the rows appended since this view was opened"""
+        count = manifest["rows"]
+        known = len(self.mapped[1])
+        if count:
+            vectors = np.memmap(
+                os.path.join(self.path, "vectors.f32"),
+                dtype=np.float32,
+                mode="r",
+                shape=(count, self.dimensions),
+            )
+            ids = np.memmap(
+                os.path.join(self.path, "ids.i64"),
+                dtype=np.int64,
+                mode="r",
+                shape=(count,),
+            )
+            self.row_of.update(zip(ids[known:count].tolist(), range(known, count)))
+            # Swapped as one tuple so queries see matching vectors and ids
+            self.mapped = (vectors, ids)
+        self.stamp = stamp
+
+    def vector(self, book_id):
+        row = self.row_of.get(book_id)
+        if row is not None:
+            return np.array(self.mapped[0][row])
+        documents = book_terms([book_id])
+        if not documents:
+            return None
+        return vectorize(documents, self.vocabulary, self.dimensions)[0]
+
+    def nearest(self, vector, limit, exclude=None):
+        """Return up to ``limit`` ``(book_id, score)`` pairs, best first"""
+        vectors, ids = self.mapped
+        if not len(ids):
+            return []
+        scores = vectors @ vector
+        count = min(limit + 1, len(scores))
+        best = np.argpartition(-scores, count - 1)[:count]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [
+            (int(ids[row]), float(scores[row]))
+            for row in best
+            if scores[row] > 0 and ids[row] != exclude
+        ][:limit]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def _manifest_stamp():
+    try:
+        stat = os.stat(os.path.join(index_dir(), MANIFEST))
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def get_index():
+    """
+    Return this process's view of the current build, or None before the
+    first build. New builds and appended rows are picked up on the next call.
+    """
+    global _index
+    stamp = _manifest_stamp()
+    if stamp is None:
+        return None
+    if _index is not None and _index.stamp == stamp:
+        return _index
+    with _index_lock:
+        if _index is None or _index.stamp != stamp:
+            manifest = _read_manifest()
+            path = os.path.join(index_dir(), manifest["build"])
+            if _index is not None and _index.path == path:
+                _index.refresh(manifest, stamp)
+            else:
+                _index = ContentIndex(manifest, stamp)
+    return _index
+
+
+def similar_books(book_id, limit=10):
+    """
+    Return up to ``limit`` ``(book_id, score)`` pairs of books with the most
+    similar content. Books missing from the index are vectorised on the fly.
+    """
+    index = get_index()
+    if index is None:
+        return []
+    vector = index.vector(book_id)
+    if vector is None:
+        return []
+    return index.nearest(vector, limit, exclude=book_id)
+
+
+# Building and incremental updates
+
+
+def _write_rows(index, documents, vectors):
+    """Rewrite known books in place and append the others, then publish"""
+    vectors_path = os.path.join(index.path, "vectors.f32")
+    ids_path = os.path.join(index.path, "ids.i64")
+    row_size = index.dimensions * 4
+    count = len(index.mapped[1])
+    appended = [
+        position
+        for position, (book_id, _) in enumerate(documents)
+        if book_id not in index.row_of
+    ]
+    rewritten = [
+        (index.row_of[book_id], position)
+        for position, (book_id, _) in enumerate(documents)
+        if book_id in index.row_of
+    ]
+    if rewritten:
+        with open(vectors_path, "r+b") as stream:
+            for row, position in rewritten:
+                stream.seek(row * row_size)
+                stream.write(vectors[position].tobytes())
+    if appended:
+        # Drop rows a failed writer left past the published count
+        os.truncate(vectors_path, count * row_size)
+        os.truncate(ids_path, count * 8)
+        with open(vectors_path, "ab") as stream:
+            stream.write(vectors[appended].tobytes())
+        with open(ids_path, "ab") as stream:
+            ids = np.array([documents[position][0] for position in appended])
+            stream.write(ids.astype(np.int64).tobytes())
+        manifest = _read_manifest()
+        manifest["rows"] = count + len(appended)
+        _write_manifest(manifest)
+
+
+def _add_books(book_ids):
+    index = get_index()
+    if index is None:
+        return 0
+    documents = book_terms(book_ids)
+    if documents:
+        vectors = vectorize(documents, index.vocabulary, index.dimensions)
+        _write_rows(index, documents, vectors)
+        get_index()
+    return len(documents)
+
+
+def add_books(book_ids):
+    """
+    Vectorise new or edited books into the current build. Returns the
+    number of books written; nothing is written before the first build.
+    """
+    book_ids = list(book_ids)
+    if not book_ids or _manifest_stamp() is None:
+        return 0
+    with _write_lock():
+        return _add_books(book_ids)
+
+
+def remove_books(book_ids):
+    """Zero the vectors of deleted books so they stop matching"""
+    if _manifest_stamp() is None:
+        return
+    with _write_lock():
+        index = get_index()
+        rows = sorted(
+            index.row_of[book_id] for book_id in book_ids if book_id in index.row_of
+        )
+        if not rows:
+            return
+        empty = bytes(index.dimensions * 4)
+        with open(os.path.join(index.path, "vectors.f32"), "r+b") as stream:
+            for row in rows:
+                stream.seek(row * len(empty))
+                stream.write(empty)
+
+
+def books_changed(book_ids):
+    """Update the index once the current transaction commits"""
+    if _manifest_stamp() is not None:
+        book_ids = list(book_ids)
+        transaction.on_commit(lambda: add_books(book_ids))
+
+
+def books_deleted(book_ids):
+    if _manifest_stamp() is not None:
+        book_ids = list(book_ids)
+        transaction.on_commit(lambda: remove_books(book_ids))
+
+
+def _merge_frequencies(parts):
+    """Merge ``(hashes, frequencies)`` pairs into one sorted pair"""
+    hashes, inverse = np.unique(
+        np.concatenate([part[0] for part in parts]), return_inverse=True
+    )
+    frequencies = np.bincount(
+        inverse,
+        weights=np.concatenate([part[1] for part in parts]),
+        minlength=len(hashes),
+    )
+    return hashes, frequencies.astype(np.int64)
+
+
+def _document_frequencies(chunk_size):
+    """Return ``(sorted term hashes, document frequencies, documents, last id)``"""
+    parts = [(np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.int64))]
+    documents = last_id = 0
+    for chunk in catalogue_terms(chunk_size):
+        # Terms are unique within a document, so counts are frequencies
+        parts.append(
+            np.unique(
+                np.fromiter(
+                    (term_hash(term) for _, terms in chunk for term in terms),
+                    dtype=np.uint64,
+                ),
+                return_counts=True,
+            )
+        )
+        if len(parts) > MERGE_PARTS:
+            parts = [_merge_frequencies(parts)]
+        documents += len(chunk)
+        last_id = chunk[-1][0]
+    return (*_merge_frequencies(parts), documents, last_id)
+
+
+def build_index(dimensions=None, chunk_size=None, progress=None):
+    """
+    Build the vectors of the whole catalogue into a new build, publish it
+    and remove older builds. Returns build statistics.
+    """
+    options = settings.CONTENT_SIMILARITY
+    dimensions = dimensions or options["DIMENSIONS"]
+    chunk_size = chunk_size or options["CHUNK_SIZE"]
+    started = time.perf_counter()
+
+    hashes, frequencies, documents, last_id = _document_frequencies(chunk_size)
+    vocabulary = Vocabulary.from_frequencies(hashes, frequencies, documents)
+
+    build = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    path = os.path.join(index_dir(), build)
+    os.makedirs(path)
+    vocabulary.save(os.path.join(path, "idf.npz"))
+    rows = 0
+    with open(os.path.join(path, "vectors.f32"), "wb") as vectors, open(
+        os.path.join(path, "ids.i64"), "wb"
+    ) as ids:
+        for chunk in catalogue_terms(chunk_size):
+            # Books created since the first pass are added after publishing
+            chunk = [(book_id, terms) for book_id, terms in chunk if book_id <= last_id]
+            vectors.write(vectorize(chunk, vocabulary, dimensions).tobytes())
+            ids.write(np.array([book_id for book_id, _ in chunk], np.int64).tobytes())
+            rows += len(chunk)
+            if progress:
+                progress(rows, documents)
+
+    with _write_lock():
+        _write_manifest(
+            {
+                "version": INDEX_VERSION,
+                "build": build,
+                "dimensions": dimensions,
+                "rows": rows,
+                "documents": documents,
+            }
+        )
+        _add_books(Book.objects.filter(id__gt=last_id).values_list("id", flat=True))
+    for name in os.listdir(index_dir()):
+        old = os.path.join(index_dir(), name)
+        if name != build and os.path.isdir(old):
+            # Processes that still map old files keep them until they reload
+            shutil.rmtree(old, ignore_errors=True)
+
+    stats = {
+        "books": len(get_index().mapped[1]),
+        "terms": len(hashes),
+        "dimensions": dimensions,
+        "seconds": time.perf_counter() - started,
+    }
+    return stats
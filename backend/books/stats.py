@@ -0,0 +1,159 @@
+"""
+Denormalised per-book aggregates: review count and average rating over
+public reviews, number of owners and copies available for exchange.
+
+``books.signals`` keeps the Book columns in step with every BookReview and
+UserBook change through F() updates in the writer's transaction; each
+instance remembers what it contributed when loaded (``post_init``), so a
+save applies only the difference. ``reconcile`` recomputes the columns from
+scratch for drift left by bulk writes that skip signals; until then,
+decrements stop at zero so such drift never fails a delete.
+"""
+
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Q, Sum, Value
+from django.db.models.functions import Cast, Coalesce, Greatest, NullIf
+
+from .models import Book, BookReview, UserBook
+
+STAT_FIELDS = Book.STAT_FIELDS
+
+
+def review_contribution(review):
+    if review.book_id is None or not review.is_public:
+        return review.book_id, {}
+    return review.book_id, {"review_count": 1, "rating_sum": review.rating}
+
+
+def user_book_contribution(user_book):
+    return user_book.book_id, {
+        "owner_count": 1,
+        "available_count": int(bool(user_book.available_for_exchange)),
+    }
+
+
+def remember(instance, contribution):
+    instance._stats_contribution = contribution(instance)
+
+
+def _shifted(field, delta):
+    # Rows written without signals leave counters short; never go below zero
+    value = F(field) + delta
+    return Greatest(value, Value(0)) if delta < 0 else value
+
+
+def _apply(book_id, deltas):
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if book_id is None or not deltas:
+        return
+    updates = {field: _shifted(field, delta) for field, delta in deltas.items()}
+    if "review_count" in deltas or "rating_sum" in deltas:
+        # SET expressions see the row as it was, so add the deltas again
+        rating_sum = Cast(
+            _shifted("rating_sum", deltas.get("rating_sum", 0)), FloatField()
+        )
+        review_count = NullIf(
+            _shifted("review_count", deltas.get("review_count", 0)), 0
+        )
+        updates["average_rating"] = Coalesce(
+            rating_sum / review_count, Value(0.0), output_field=FloatField()
+        )
+    Book.objects.filter(pk=book_id).update(**updates)
+
+
+def changed(instance, contribution, created=False):
+    """Apply the difference between an instance's old and new contribution"""
+    # post_init also runs for unsaved instances, which contributed nothing
+    old_book_id, old = (
+        (None, {}) if created else getattr(instance, "_stats_contribution", (None, {}))
+    )
+    new_book_id, new = contribution(instance)
+    if old_book_id == new_book_id:
+        fields = set(old) | set(new)
+        _apply(new_book_id, {f: new.get(f, 0) - old.get(f, 0) for f in fields})
+    else:
+        _apply(old_book_id, {field: -value for field, value in old.items()})
+        _apply(new_book_id, new)
+    instance._stats_contribution = (new_book_id, new)
+
+
+def removed(instance):
+    book_id, old = getattr(instance, "_stats_contribution", (None, {}))
+    _apply(book_id, {field: -value for field, value in old.items()})
+    instance._stats_contribution = (None, {})
+
+
+def compute(book_ids, review_model=BookReview, user_book_model=UserBook):
+    """Return ``{book_id: {field: value}}`` computed from the source rows"""
+    stats = defaultdict(
+        lambda: {
+            "review_count": 0,
+            "rating_sum": 0,
+            "average_rating": 0.0,
+            "owner_count": 0,
+            "available_count": 0,
+        }
+    )
+    for book_id, count, total in (
+        review_model.objects.filter(book_id__in=book_ids, is_public=True)
+        .values("book_id")
+        .annotate(count=Count("id"), total=Sum("rating"))
+        .values_list("book_id", "count", "total")
+    ):
+        stats[book_id].update(
+            review_count=count, rating_sum=total, average_rating=total / count
+        )
+    for book_id, owners, available in (
+        user_book_model.objects.filter(book_id__in=book_ids)
+        .values("book_id")
+        .annotate(
+            owners=Count("id"),
+            available=Count("id", filter=Q(available_for_exchange=True)),
+        )
+        .values_list("book_id", "owners", "available")
+    ):
+        stats[book_id].update(owner_count=owners, available_count=available)
+    return {book_id: stats[book_id] for book_id in book_ids}
+
+
+def reconcile(
+    chunk_size=1000, book_model=Book, review_model=BookReview, user_book_model=UserBook
+):
+    """
+    Recompute the columns of every book in id-ordered chunks, writing only
+    rows that drifted. Takes the models so migrations can pass historical
+    ones. Returns ``(books_checked, books_fixed)``.
+    """
+    checked = fixed = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            # Locking the chunk first makes concurrent signal updates wait
+            # and the counts below include every committed change
+            books = list(
+                book_model.objects.select_for_update()
+                .filter(id__gt=last_id)
+                .order_by("id")
+                .only("id", *STAT_FIELDS)[:chunk_size]
+            )
+            if not books:
+                return checked, fixed
+            last_id = books[-1].id
+            expected = compute(
+                [book.id for book in books], review_model, user_book_model
+            )
+            drifted = []
+            for book in books:
+                values = expected[book.id]
+                if any(
+                    abs(getattr(book, field) - value) > 1e-9
+                    for field, value in values.items()
+                ):
+                    for field, value in values.items():
+                        setattr(book, field, value)
+                    drifted.append(book)
+            book_model.objects.bulk_update(drifted, STAT_FIELDS)
+        checked += len(books)
+        fixed += len(drifted)
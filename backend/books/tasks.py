@@ -0,0 +1,52 @@
+from celery import shared_task
+
+from . import stats
+from .autocomplete import build_index
+
+
+@shared_task
+def rebuild_autocomplete_index():
+    """Rebuild the autocomplete index and publish a fresh snapshot"""
+    return build_index().stats()
+
+
+@shared_task
+def reconcile_book_stats():
+    """Correct book counters that drifted through writes that skip signals"""
+    checked, fixed = stats.reconcile()
+    return {"checked": checked, "fixed": fixed}
+
+
+@shared_task
+def build_book_neighbors():
+    """Recompute the item-item neighbours behind recommendations"""
+    from .recommendations import build_neighbors
+
+    return build_neighbors()
+
+
+@shared_task
+def build_similarity_index():
+    """Rebuild the content vectors behind similar books"""
+    from .similarity import build_index as build_similarity
+
+    return build_similarity()
+
+
+@shared_task
+def import_catalogue(import_id):
+    """Run (or resume) an uploaded catalogue import"""
+    from django.conf import settings
+
+    from .importer import import_file
+    from .models import CatalogueImport
+
+    catalogue_import = CatalogueImport.objects.get(id=import_id)
+    if catalogue_import.status == "completed":
+        return None
+    import_file(catalogue_import, settings.CATALOGUE_IMPORT["CHUNK_SIZE"])
+    return {
+        "records": catalogue_import.records_processed,
+        "books_created": catalogue_import.books_created,
+        "rows_per_second": catalogue_import.rows_per_second,
+    }
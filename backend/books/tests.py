@@ -1,3 +1,863 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+from datetime import timedelta
+from itertools import islice
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from kombu.exceptions import OperationalError
+from PIL import Image
+
+from accounts.api import create_tokens
+from accounts.principal import principal_cache
+from bookexchange import renditions
+from friendships.models import BlockedUser, Friendship
+
+from . import autocomplete, fuzzy, importer, isbn, models, similarity, stats
+from .models import Author, Book, BookReview, Genre, Publisher, UserBook
+from .recommendations import build_neighbors
+from .tasks import import_catalogue
+
+
+class BookSerializationQueryCountTests(TestCase):
+    """Listing books must not issue per-book queries for their relations"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username="reader", email="reader@example.com", password="secret"
+        )
+        publisher = Publisher.objects.create(name="Penguin")
+        genre = Genre.objects.create(name="Fiction")
+        for i in range(15):
+            book = Book.objects.create(
+                title=f"Book {i}", pages=300, publisher=publisher
+            )
+            book.authors.add(
+                Author.objects.create(first_name="Author", last_name=str(i)),
+                Author.objects.create(first_name="Editor", last_name=str(i)),
+            )
+            book.genres.add(genre)
+            UserBook.objects.create(user=cls.user, book=book, current_page=150)
+
+    def test_list_books_query_count_is_constant(self):
+        # Books with publisher, then authors, then genres
+        with self.assertNumQueries(3):
+            response = self.client.get("/api/books/")
+        self.assertEqual(response.status_code, 200)
+        books = response.json()["items"]
+        self.assertEqual(len(books), 15)
+        self.assertEqual(books[0]["author_names"], "Author 0, Editor 0")
+        self.assertEqual(books[0]["genre_names"], ["Fiction"])
+        self.assertEqual(books[0]["publisher_name"], "Penguin")
+
+    def test_book_detail_query_count(self):
+        book = Book.objects.get(title="Book 3")
+        with self.assertNumQueries(3):
+            response = self.client.get(f"/api/books/{book.id}")
+        self.assertEqual(response.json()["author_names"], "Author 3, Editor 3")
+
+    def test_my_books_query_count_is_constant(self):
+        access_token, _ = create_tokens(self.user)
+        # The principal is loaded once, then served from the cache
+        principal_cache.get(self.user.id, self.user.token_version)
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                "/api/books/mine", HTTP_AUTHORIZATION=f"Bearer {access_token}"
+            )
+        self.assertEqual(response.status_code, 200)
+        user_books = response.json()["items"]
+        self.assertEqual(len(user_books), 15)
+        self.assertEqual(user_books[0]["reading_progress"], 50.0)
+
+
+class BookCursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Duplicate titles exercise the id tie-breaker
+        for i in range(25):
+            Book.objects.create(title=f"Title {i % 10}", edition=str(i))
+
+    def test_cursor_walks_every_book_once_in_order(self):
+        seen = []
+        cursor = None
+        while True:
+            params = {"limit": 7}
+            if cursor:
+                params["cursor"] = cursor
+            with self.assertNumQueries(3):
+                page = self.client.get("/api/books/", params).json()
+            seen.extend((book["title"], book["id"]) for book in page["items"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(seen, sorted(seen))
+        self.assertEqual(len(seen), 25)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get("/api/books/", {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 400)
+
+
+class BookStatsTests(TestCase):
+    """Book counters follow review and copy changes without recounting"""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.alice = User.objects.create_user(
+            username="alice", email="alice@example.com", password="secret"
+        )
+        cls.bob = User.objects.create_user(
+            username="bob", email="bob@example.com", password="secret"
+        )
+
+    def assertStats(self, book, **expected):
+        book.refresh_from_db()
+        self.assertEqual({field: getattr(book, field) for field in expected}, expected)
+
+    def test_reviews_update_count_and_average(self):
+        book = Book.objects.create(title="Dune")
+        review = BookReview.objects.create(
+            user=self.alice, book=book, rating=5, content="Great"
+        )
+        BookReview.objects.create(user=self.bob, book=book, rating=2, content="Meh")
+        self.assertStats(book, review_count=2, rating_sum=7, average_rating=3.5)
+
+        review.rating = 3
+        review.save()
+        self.assertStats(book, review_count=2, average_rating=2.5)
+
+        review.is_public = False
+        review.save()
+        self.assertStats(book, review_count=1, average_rating=2.0)
+
+        BookReview.objects.get(user=self.bob).delete()
+        self.assertStats(book, review_count=0, rating_sum=0, average_rating=0.0)
+
+    def test_copies_update_owner_and_available_counts(self):
+        book = Book.objects.create(title="Dune")
+        copy = UserBook.objects.create(
+            user=self.alice, book=book, available_for_exchange=True
+        )
+        UserBook.objects.create(user=self.bob, book=book)
+        self.assertStats(book, owner_count=2, available_count=1)
+
+        copy = UserBook.objects.get(pk=copy.pk)
+        copy.available_for_exchange = False
+        copy.save()
+        self.assertStats(book, owner_count=2, available_count=0)
+
+        copy.delete()
+        self.assertStats(book, owner_count=1, available_count=0)
+
+    def test_deleting_rows_that_skipped_the_signals(self):
+        book = Book.objects.create(title="Dune")
+        UserBook.objects.bulk_create(
+            [UserBook(user=self.alice, book=book, available_for_exchange=True)]
+        )
+        BookReview.objects.bulk_create(
+            [BookReview(user=self.alice, book=book, rating=4, content="Good")]
+        )
+        self.assertStats(book, owner_count=0, review_count=0)
+
+        UserBook.objects.get(book=book).delete()
+        BookReview.objects.get(book=book).delete()
+        self.assertStats(
+            book,
+            owner_count=0,
+            available_count=0,
+            review_count=0,
+            rating_sum=0,
+            average_rating=0.0,
+        )
+
+    def test_saving_a_book_keeps_newer_counters(self):
+        book = Book.objects.create(title="Dune")
+        UserBook.objects.create(user=self.alice, book=book)
+        book.title = "Dune Messiah"
+        book.save()
+        self.assertStats(book, title="Dune Messiah", owner_count=1)
+
+    def test_reconcile_corrects_drift(self):
+        book = Book.objects.create(title="Dune")
+        UserBook.objects.create(user=self.alice, book=book)
+        Book.objects.filter(pk=book.pk).update(owner_count=7, review_count=3)
+        self.assertEqual(stats.reconcile(chunk_size=1), (1, 1))
+        self.assertStats(book, owner_count=1, review_count=0)
+
+    def test_list_sorted_by_popularity(self):
+        quiet = Book.objects.create(title="A quiet book")
+        popular = Book.objects.create(title="Popular")
+        UserBook.objects.create(user=self.alice, book=popular)
+        response = self.client.get("/api/books/?sort=popular&limit=1")
+        page = response.json()
+        self.assertEqual([book["id"] for book in page["items"]], [popular.id])
+        response = self.client.get(
+            f"/api/books/?sort=popular&limit=1&cursor={page['next_cursor']}"
+        )
+        self.assertEqual([book["id"] for book in response.json()["items"]], [quiet.id])
+
+
+class NearbyBooksTests(TestCase):
+    """Nearby copies are matched through the geohash index and refined"""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+
+        def user(name, latitude, longitude, **fields):
+            return User.objects.create_user(
+                username=name,
+                email=f"{name}@example.com",
+                password="secret",
+                latitude=latitude,
+                longitude=longitude,
+                **fields,
+            )
+
+        cls.me = user("me", "51.500000", "-0.120000")
+        book = Book.objects.create(title="Dune")
+        for owner in [
+            cls.me,
+            user("far", "51.600000", "-0.120000"),
+            user("near", "51.510000", "-0.130000"),
+            user("paris", "48.850000", "2.350000"),
+            user("hidden", "51.500100", "-0.120100", show_location=False),
+        ]:
+            UserBook.objects.create(user=owner, book=book, available_for_exchange=True)
+        cls.token = create_tokens(cls.me)[0]
+
+    def setUp(self):
+        cache.clear()
+
+    def nearby(self, query=""):
+        return self.client.get(
+            f"/api/books/nearby?{query}", HTTP_AUTHORIZATION=f"Bearer {self.token}"
+        )
+
+    def test_geo_cell_follows_coordinates(self):
+        self.assertEqual(self.me.geo_cell, "gcpuvr295")
+        self.me.latitude = None
+        self.me.save(update_fields=["latitude"])
+        self.me.refresh_from_db()
+        self.assertIsNone(self.me.geo_cell)
+
+    def test_copies_within_radius_nearest_first(self):
+        response = self.nearby("radius_km=20")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(copy["owner_name"], copy["distance_km"]) for copy in response.json()],
+            [("near", 1.3), ("far", 11.1)],
+        )
+
+    def test_radius_excludes_farther_copies(self):
+        response = self.nearby("radius_km=5&latitude=51.6&longitude=-0.12")
+        self.assertEqual([copy["owner_name"] for copy in response.json()], ["far"])
+
+    def test_blocked_owners_are_left_out(self):
+        User = get_user_model()
+        near, far = User.objects.get(username="near"), User.objects.get(username="far")
+        BlockedUser.objects.create(blocker=self.me, blocked=near)
+        BlockedUser.objects.create(blocker=far, blocked=self.me)
+        response = self.nearby("radius_km=20")
+        self.assertEqual(response.json(), [])
+
+
+class NetworkAvailabilityTests(TestCase):
+    """Copies available in the caller's network, ranked by hops or distance"""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+
+        def user(name, latitude=None, longitude=None):
+            return User.objects.create_user(
+                username=name,
+                email=f"{name}@example.com",
+                password="secret",
+                latitude=latitude,
+                longitude=longitude,
+            )
+
+        cls.me = user("me", "51.500000", "-0.120000")
+        cls.friend = user("friend")
+        cls.neighbour = user("neighbour", "51.510000", "-0.120000")
+        cls.second = user("second", "51.700000", "-0.120000")
+        cls.stranger = user("stranger", "51.520000", "-0.120000")
+        for a, b in [(cls.me, cls.friend), (cls.me, cls.neighbour)]:
+            Friendship.objects.create(
+                user1=a, user2=b, status="accepted", initiated_by=a
+            )
+        Friendship.objects.create(
+            user1=cls.friend,
+            user2=cls.second,
+            status="accepted",
+            initiated_by=cls.friend,
+        )
+        cls.book = Book.objects.create(title="Dune")
+        for owner in [cls.friend, cls.neighbour, cls.second, cls.stranger]:
+            UserBook.objects.create(
+                user=owner, book=cls.book, available_for_exchange=True
+            )
+        cls.token = create_tokens(cls.me)[0]
+
+    def setUp(self):
+        cache.clear()
+
+    def available(self, query):
+        response = self.client.get(
+            f"/api/books/available?book_id={self.book.id}&{query}",
+            HTTP_AUTHORIZATION=f"Bearer {self.token}",
+        )
+        self.assertEqual(response.status_code, 200)
+        return [
+            (copy["owner_name"], copy["hops"], copy["distance_km"])
+            for copy in response.json()
+        ]
+
+    def test_friends_and_network_scopes_rank_by_hops(self):
+        self.assertEqual(
+            self.available("scope=friends"),
+            [("friend", 1, None), ("neighbour", 1, None)],
+        )
+        self.assertEqual(
+            self.available("scope=network"),
+            [("friend", 1, None), ("neighbour", 1, None), ("second", 2, None)],
+        )
+
+    def test_radius_scope_ranks_by_distance(self):
+        self.assertEqual(
+            self.available("scope=radius&radius_km=5"),
+            [("neighbour", None, 1.1), ("stranger", None, 2.2)],
+        )
+
+    def test_blocked_owners_are_left_out(self):
+        self.available("scope=network")
+        BlockedUser.objects.create(blocker=self.me, blocked=self.second)
+        self.assertEqual(
+            [owner for owner, _, _ in self.available("scope=network")],
+            ["friend", "neighbour"],
+        )
+
+    def test_inactive_owners_are_left_out(self):
+        self.available("scope=network")
+        self.available("scope=radius&radius_km=5")
+        get_user_model().objects.filter(
+            pk__in=[self.friend.pk, self.stranger.pk]
+        ).update(is_active=False)
+        self.assertEqual(
+            [owner for owner, _, _ in self.available("scope=network")],
+            ["neighbour", "second"],
+        )
+        self.assertEqual(
+            [owner for owner, _, _ in self.available("scope=radius&radius_km=5")],
+            ["neighbour"],
+        )
+
+
+class RecommendationTests(TestCase):
+    """Item-item neighbours from co-ratings drive per-user recommendations"""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        readers = [
+            User.objects.create_user(
+                username=f"reader{i}", email=f"reader{i}@example.com", password="x"
+            )
+            for i in range(6)
+        ]
+        cls.dune, cls.messiah, cls.hobbit, cls.lotr = [
+            Book.objects.create(title=title)
+            for title in ["Dune", "Dune Messiah", "The Hobbit", "The Lord of the Rings"]
+        ]
+        for reader in readers[:3]:
+            UserBook.objects.create(user=reader, book=cls.dune, rating=5)
+            UserBook.objects.create(user=reader, book=cls.messiah, rating=4)
+        for reader in readers[3:]:
+            UserBook.objects.create(user=reader, book=cls.hobbit, rating=5)
+            UserBook.objects.create(user=reader, book=cls.lotr, status="read")
+        # A one-star review is no preference, even over a shelf rating
+        UserBook.objects.create(user=readers[3], book=cls.dune, rating=5)
+        BookReview.objects.create(
+            user=readers[3], book=cls.dune, rating=1, content="Not for me"
+        )
+
+        cls.me = User.objects.create_user(
+            username="me", email="me@example.com", password="x"
+        )
+        UserBook.objects.create(user=cls.me, book=cls.dune, rating=5)
+        build_neighbors(neighbors=10, min_support=2)
+
+    def test_neighbors_need_enough_co_raters(self):
+        self.assertEqual(
+            set(
+                Book.objects.filter(neighbors__isnull=False).values_list(
+                    "id", "neighbors__neighbor_id"
+                )
+            ),
+            {
+                (self.dune.id, self.messiah.id),
+                (self.messiah.id, self.dune.id),
+                (self.hobbit.id, self.lotr.id),
+                (self.lotr.id, self.hobbit.id),
+            },
+        )
+
+    def test_recommendations_follow_liked_books(self):
+        response = self.client.get(
+            "/api/books/recommendations",
+            HTTP_AUTHORIZATION=f"Bearer {create_tokens(self.me)[0]}",
+        )
+        self.assertEqual(
+            [item["book"]["title"] for item in response.json()], ["Dune Messiah"]
+        )
+
+
+class ContentSimilarityTests(TestCase):
+    """Similar books by TF-IDF content vectors, extended without rebuilds"""
+
+    @classmethod
+    def setUpTestData(cls):
+        herbert = Author.objects.create(first_name="Frank", last_name="Herbert")
+        tolkien = Author.objects.create(first_name="J. R. R.", last_name="Tolkien")
+        science_fiction = Genre.objects.create(name="Science fiction")
+        fantasy = Genre.objects.create(name="Fantasy")
+        books = [
+            ("Dune", "Spice, sandworms and politics on the desert planet Arrakis."),
+            ("Dune Messiah", "Paul rules Arrakis as emperor of the desert planet."),
+            ("The Hobbit", "Bilbo Baggins leaves the Shire on a quest with dwarves."),
+            ("The Two Towers", "The fellowship is broken and the quest goes on."),
+        ]
+        cls.dune, cls.messiah, cls.hobbit, cls.towers = [
+            Book.objects.create(title=title, description=description)
+            for title, description in books
+        ]
+        for book in (cls.dune, cls.messiah):
+            book.authors.add(herbert)
+            book.genres.add(science_fiction)
+        for book in (cls.hobbit, cls.towers):
+            book.authors.add(tolkien)
+            book.genres.add(fantasy)
+        cls.herbert, cls.science_fiction = herbert, science_fiction
+
+    def setUp(self):
+        index_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, index_dir, ignore_errors=True)
+        settings = override_settings(
+            CONTENT_SIMILARITY={
+                "INDEX_DIR": index_dir,
+                "DIMENSIONS": 64,
+                "CHUNK_SIZE": 3,
+            }
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def similar_titles(self, book, limit=3):
+        return [
+            Book.objects.get(id=book_id).title
+            for book_id, _ in similarity.similar_books(book.id, limit)
+        ]
+
+    def test_books_sharing_content_rank_first(self):
+        stats = similarity.build_index()
+        self.assertEqual(stats["books"], 4)
+        self.assertEqual(self.similar_titles(self.dune)[0], "Dune Messiah")
+        self.assertEqual(self.similar_titles(self.hobbit)[0], "The Two Towers")
+
+    def test_new_books_are_added_without_a_rebuild(self):
+        similarity.build_index()
+        build = similarity.get_index().build
+        with self.captureOnCommitCallbacks(execute=True):
+            children = Book.objects.create(
+                title="Children of Dune",
+                description="The twins of Paul inherit the desert planet Arrakis.",
+            )
+            children.authors.add(self.herbert)
+            children.genres.add(self.science_fiction)
+
+        index = similarity.get_index()
+        self.assertEqual((index.build, len(index.row_of)), (build, 5))
+        self.assertEqual(
+            set(self.similar_titles(children, 2)), {"Dune", "Dune Messiah"}
+        )
+        self.assertIn("Children of Dune", self.similar_titles(self.messiah, 2))
+
+    def test_similar_endpoint(self):
+        response = self.client.get(f"/api/books/{self.dune.id}/similar")
+        self.assertEqual(response.json(), [])
+
+        similarity.build_index()
+        response = self.client.get(f"/api/books/{self.dune.id}/similar?limit=1")
+        self.assertEqual(
+            [item["book"]["title"] for item in response.json()], ["Dune Messiah"]
+        )
+        response = self.client.get("/api/books/999999/similar")
+        self.assertEqual(response.status_code, 404)
+
+
+class CatalogueImportTests(TestCase):
+    CSV = (
+        "title,isbn_13,authors,publisher,genres,publication_date,pages\n"
+        "Dune,9780441172719,Frank Herbert,Ace,Science fiction;Classics,1965-08-01,412\n"
+        "Dune Messiah,,Frank Herbert,Ace,Science fiction,1969-10-15,256\n"
+        ",,Nobody,,,,\n"
+        "Dune (reprint),978-0-441-17271-9,Frank Herbert,Ace,,,\n"
+    )
+
+    def setUp(self):
+        upload_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, upload_dir, ignore_errors=True)
+        settings = override_settings(
+            CATALOGUE_IMPORT={
+                "UPLOAD_DIR": upload_dir,
+                "CHUNK_SIZE": 2,
+                "STALE_AFTER_MINUTES": 30,
+            },
+            AUTOCOMPLETE={"SNAPSHOT_PATH": f"{upload_dir}/autocomplete.pickle"},
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        autocomplete._index = None
+        self.addCleanup(setattr, autocomplete, "_index", None)
+
+    def test_import_creates_books_once(self):
+        catalogue_import = models.CatalogueImport.objects.create(
+            source="test", format="csv"
+        )
+        importer.run_import(catalogue_import, io.StringIO(self.CSV), chunk_size=2)
+        self.assertEqual(catalogue_import.status, "completed")
+        self.assertEqual(catalogue_import.records_processed, 4)
+        # The untitled row and the ISBN duplicate are skipped
+        self.assertEqual(catalogue_import.books_created, 2)
+        dune = Book.objects.get(isbn_key="9780441172719")
+        self.assertEqual(dune.pages, 412)
+        self.assertEqual(str(dune.authors.get()), "Frank Herbert")
+        self.assertEqual(
+            sorted(dune.genres.values_list("name", flat=True)),
+            ["Classics", "Science fiction"],
+        )
+        self.assertEqual(Author.objects.count(), 1)
+
+    def test_imported_books_reach_autocomplete(self):
+        autocomplete.get_index()
+        catalogue_import = models.CatalogueImport.objects.create(
+            source="test", format="csv"
+        )
+        records = io.StringIO(self.CSV)
+        reader = importer.read_records(records, "csv")
+        importer.import_chunk(list(islice(reader, 2)))
+        # This process's index follows each chunk
+        self.assertEqual(
+            [label for _, _, label, _ in autocomplete.get_index().complete("dune")],
+            ["Dune", "Dune Messiah"],
+        )
+        self.assertEqual(
+            autocomplete.get_index().complete("herb")[0][2], "Frank Herbert"
+        )
+
+        # Other processes load the snapshot a completed import rebuilds
+        importer.run_import(catalogue_import, io.StringIO(self.CSV))
+        snapshot = autocomplete.PrefixIndex.load(autocomplete.snapshot_path())
+        self.assertEqual(
+            [label for _, _, label, _ in snapshot.complete("science")],
+            ["Science fiction"],
+        )
+
+    def test_resumed_import_skips_committed_records(self):
+        catalogue_import = models.CatalogueImport.objects.create(
+            source="test", format="csv", records_processed=2
+        )
+        importer.run_import(catalogue_import, io.StringIO(self.CSV), chunk_size=2)
+        self.assertEqual(catalogue_import.records_processed, 4)
+        self.assertEqual(
+            list(Book.objects.values_list("title", flat=True)), ["Dune (reprint)"]
+        )
+
+    def staff_post(self, path, data=None):
+        staff, _ = get_user_model().objects.get_or_create(
+            username="staff", defaults={"email": "staff@example.com", "is_staff": True}
+        )
+        access_token, _ = create_tokens(staff)
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                path, data or {}, HTTP_AUTHORIZATION=f"Bearer {access_token}"
+            )
+
+    def test_upload_is_never_imported_in_the_request(self):
+        upload = SimpleUploadedFile("catalogue.csv", self.CSV.encode())
+        with patch.object(import_catalogue, "delay", side_effect=OperationalError):
+            response = self.staff_post(
+                "/api/books/imports", {"file": upload, "format": "csv"}
+            )
+        self.assertEqual(response.status_code, 503)
+        catalogue_import = models.CatalogueImport.objects.get()
+        self.assertEqual(catalogue_import.status, "failed")
+        self.assertFalse(Book.objects.exists())
+
+    def test_only_failed_or_stalled_imports_resume(self):
+        catalogue_import = models.CatalogueImport.objects.create(
+            source="test", format="csv", status="running"
+        )
+        path = f"/api/books/imports/{catalogue_import.id}/resume"
+        with patch.object(import_catalogue, "delay") as delay:
+            self.assertEqual(self.staff_post(path).status_code, 400)
+            models.CatalogueImport.objects.update(
+                updated_at=timezone.now() - timedelta(hours=1)
+            )
+            response = self.staff_post(path)
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(response.json()["status"], "pending")
+            # The resume claimed the import, so a second one is turned away
+            self.assertEqual(self.staff_post(path).status_code, 400)
+        delay.assert_called_once_with(catalogue_import.id)
+
+
+class BookSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        herbert = Author.objects.create(first_name="Frank", last_name="Herbert")
+        cls.dune = Book.objects.create(
+            title="Dune", description="A desert planet", language="en"
+        )
+        cls.dune.authors.add(herbert)
+        cls.guide = Book.objects.create(
+            title="Desert plants",
+            description="A field guide, with notes on Dune landscapes",
+            language="fr",
+        )
+        Book.objects.create(title="The Hobbit", description="A hole in the ground")
+
+    def search(self, **params):
+        response = self.client.get("/api/books/search", params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def titles(self, **params):
+        return [book["title"] for book in self.search(**params)["results"]]
+
+    def test_title_matches_rank_above_description_matches(self):
+        self.assertEqual(self.titles(q="dune"), ["Dune", "Desert plants"])
+
+    def test_author_names_are_searchable(self):
+        self.assertEqual(self.titles(q="herbert"), ["Dune"])
+
+    def test_filters_and_paging(self):
+        self.assertEqual(self.titles(q="dune", language="fr"), ["Desert plants"])
+        first = self.search(q="dune", page_size=1)
+        self.assertTrue(first["has_next"])
+        self.assertEqual(self.titles(q="dune", page_size=1, page=2), ["Desert plants"])
+
+    def test_index_follows_edits_and_deletes(self):
+        self.dune.title = "Arrakis"
+        self.dune.save()
+        self.assertEqual(self.titles(q="arrakis"), ["Arrakis"])
+        self.dune.delete()
+        self.assertEqual(self.titles(q="arrakis"), [])
+
+
+class FuzzyMatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.herbert = Author.objects.create(first_name="Frank", last_name="Herbert")
+        Author.objects.create(first_name="Franz", last_name="Kafka")
+        cls.dune = Book.objects.create(title="Dune Messiah")
+        Book.objects.create(title="The Hobbit")
+
+    def test_trigrams_follow_pg_trgm(self):
+        self.assertEqual(fuzzy.trigrams("Cat"), {"  c", " ca", "cat", "at "})
+
+    def test_misspelled_author_and_title(self):
+        authors = fuzzy.similar_authors("Frank Hebert")
+        self.assertEqual(authors[0][0], self.herbert)
+        self.assertEqual(len(authors), 1)
+        books = fuzzy.similar_books("dune mesiah")
+        self.assertEqual([book for book, _ in books], [self.dune])
+
+    def test_renamed_author_is_reindexed(self):
+        self.assertEqual(len(fuzzy.similar_authors("Frank Hebert", threshold=0.6)), 1)
+        self.herbert.last_name = "Herbertson"
+        self.herbert.save()
+        self.assertEqual(fuzzy.similar_authors("Frank Hebert", threshold=0.6), [])
+
+    def test_empty_search_suggests_a_spelling(self):
+        response = self.client.get("/api/books/search", {"q": "Dune Mesiah"})
+        self.assertEqual(response.json()["did_you_mean"], "Dune Messiah")
+
+
+class AutocompleteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.dune = Book.objects.create(title="Dune")
+        cls.dune.authors.add(
+            Author.objects.create(first_name="Frank", last_name="Herbert")
+        )
+        Genre.objects.create(name="Drama")
+
+    def setUp(self):
+        snapshot_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, snapshot_dir, ignore_errors=True)
+        settings = override_settings(
+            AUTOCOMPLETE={"SNAPSHOT_PATH": f"{snapshot_dir}/autocomplete.pickle"}
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        autocomplete._index = None
+        self.addCleanup(setattr, autocomplete, "_index", None)
+
+    def labels(self, prefix):
+        response = self.client.get("/api/books/autocomplete", {"q": prefix})
+        return [(match["kind"], match["label"]) for match in response.json()]
+
+    def test_prefixes_match_titles_authors_and_genres(self):
+        self.assertEqual(self.labels("du"), [("book", "Dune")])
+        self.assertEqual(self.labels("herb"), [("author", "Frank Herbert")])
+        self.assertEqual(self.labels("DRA"), [("genre", "Drama")])
+        self.assertEqual(self.labels(""), [])
+
+    def test_index_follows_new_and_deleted_books(self):
+        autocomplete.get_index()
+        book = Book.objects.create(title="Dune Messiah")
+        self.assertEqual(
+            self.labels("dune"), [("book", "Dune"), ("book", "Dune Messiah")]
+        )
+        book.delete()
+        self.assertEqual(self.labels("dune"), [("book", "Dune")])
+
+    def test_capped_short_prefixes_are_refilled(self):
+        index = autocomplete.PrefixIndex()
+        with patch.object(autocomplete, "MAX_RESULTS", 2):
+            for book_id, weight in ((1, 3), (2, 2), (3, 1)):
+                index.upsert("book", book_id, f"Dune {book_id}", weight)
+
+            def ranked(prefix):
+                return [object_id for _, object_id, _, _ in index.complete(prefix)]
+
+            self.assertEqual(ranked("d"), [1, 2])
+            index.remove("book", 1)
+            self.assertEqual(ranked("d"), [2, 3])
+            index.add_weight("book", 2, -2)
+            self.assertEqual(ranked("du"), [3, 2])
+
+    def test_warm_start_from_snapshot(self):
+        autocomplete.build_index()
+        autocomplete._index = None
+        with self.assertNumQueries(0):
+            self.assertEqual(self.labels("du"), [("book", "Dune")])
+
+
+class IsbnTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.dune = Book.objects.create(title="Dune", isbn_10="0-441-17271-7")
+
+    def test_isbn10_and_isbn13_share_a_key(self):
+        self.assertEqual(isbn.to_isbn13("0-441-17271-7"), "9780441172719")
+        self.assertEqual(isbn.to_isbn13("978 0 441 17271 9"), "9780441172719")
+        self.assertEqual(isbn.to_isbn13("080442957x"), "9780804429573")
+        with self.assertRaises(ValueError):
+            isbn.to_isbn13("0441172718")
+        self.assertEqual(self.dune.isbn_key, "9780441172719")
+
+    def test_key_follows_isbn_changes(self):
+        self.dune.isbn_10 = None
+        self.dune.isbn_13 = "9780306406157"
+        self.dune.save()
+        self.dune.refresh_from_db()
+        self.assertEqual(self.dune.isbn_key, "9780306406157")
+
+    def test_books_sharing_a_key_still_save(self):
+        # Left without a key, as backfill_keys leaves conflicting books
+        duplicate = Book.objects.create(title="Dune (copy)")
+        Book.objects.filter(pk=duplicate.pk).update(isbn_13="9780441172719")
+        duplicate = Book.objects.get(pk=duplicate.pk)
+        duplicate.subtitle = "Deluxe edition"
+        duplicate.save()
+        self.assertIsNone(duplicate.isbn_key)
+
+        other = Book.objects.create(title="Dune Messiah")
+        other.isbn_10 = "0441172717"
+        with self.assertLogs("books.models", "WARNING"):
+            other.save()
+        other.refresh_from_db()
+        self.assertIsNone(other.isbn_key)
+
+    def test_lookup_by_either_form(self):
+        for value in ("0441172717", "978-0-441-17271-9"):
+            response = self.client.get(f"/api/books/isbn/{value}")
+            self.assertEqual(response.json()["id"], self.dune.id)
+        self.assertEqual(self.client.get("/api/books/isbn/123").status_code, 400)
+        self.assertEqual(
+            self.client.get("/api/books/isbn/9780306406157").status_code, 404
+        )
+
+    def test_bulk_lookup_reports_each_isbn(self):
+        response = self.client.post(
+            "/api/books/isbn/lookup",
+            {"isbns": ["0441172717", "9780306406157", "bad"]},
+            content_type="application/json",
+        )
+        results = response.json()
+        self.assertEqual(results[0]["book"]["id"], self.dune.id)
+        self.assertEqual(results[1]["error"], "Not found")
+        self.assertEqual(results[2]["error"], "Invalid ISBN: BAD")
+
+
+class CoverRenditionTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def jpeg(self, size):
+        exif = Image.Exif()
+        exif[0x010F] = "Camera maker"
+        output = io.BytesIO()
+        Image.new("RGB", size, "navy").save(output, "JPEG", exif=exif)
+        return ContentFile(output.getvalue())
+
+    def test_renditions_wait_for_the_command_without_a_broker(self):
+        book = Book(title="Dune")
+        book.cover_image.save("cover.jpg", self.jpeg((1600, 800)), save=False)
+        with patch.object(
+            renditions.generate_image_renditions, "delay", side_effect=OperationalError
+        ):
+            with self.captureOnCommitCallbacks(execute=True):
+                book.save()
+
+        # Nothing is rendered in the request; the original stands in
+        book.refresh_from_db()
+        self.assertEqual(book.cover_image_renditions, {})
+        self.assertEqual(book.cover_urls["thumb"], book.cover_image.url)
+
+        call_command("generate_renditions", only="covers", stdout=io.StringIO())
+        book.refresh_from_db()
+        stored = book.cover_image_renditions
+        self.assertEqual(stored["source"], book.cover_image.name)
+        for name, size in (("thumb", 150), ("card", 400), ("full", 1200)):
+            with book.cover_image.storage.open(stored[name]) as file:
+                image = Image.open(file)
+                self.assertEqual(image.size, (size, size // 2))
+                self.assertEqual(image.format, "WEBP")
+                self.assertFalse(image.getexif())
+        self.assertTrue(book.cover_urls["thumb"].endswith(".webp"))
+
+    def test_small_images_are_not_upscaled(self):
+        book = Book.objects.create(title="Dune")
+        book.cover_image.save("cover.jpg", self.jpeg((100, 80)), save=False)
+        self.assertTrue(renditions.is_stale(book, "cover_image"))
+        renditions.generate(book, "cover_image")
+        with book.cover_image.storage.open(book.cover_image_renditions["full"]) as file:
+            self.assertEqual(Image.open(file).size, (100, 80))
+        self.assertFalse(renditions.is_stale(book, "cover_image"))
@@ -1,12 +1,44 @@
+from datetime import datetime
+from typing import List, Optional
+
+from django.db.models import Q
 from ninja import Router
+from ninja.pagination import paginate
+from pydantic import BaseModel
+
+from accounts.api import auth_id
+from bookexchange.pagination import CursorPagination
+
+from .models import BookExchange
 
 router = Router()
 
 
-@router.get("/")
-def list_exchanges(request):
-    """List book exchanges - placeholder"""
-    return {"message": "Exchanges API - Coming Soon"}
+class ExchangeSchema(BaseModel):
+    id: int
+    requester_id: int
+    owner_id: int
+    requested_book_id: int
+    offered_book_id: Optional[int] = None
+    exchange_type: str
+    status: str
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+@router.get("/", response=List[ExchangeSchema], auth=auth_id)
+@paginate(CursorPagination, ordering=("-created_at", "-id"))
+def list_exchanges(request, status: Optional[str] = None):
+    """List exchanges the current user requested or owns, newest first"""
+    exchanges = BookExchange.objects.filter(
+        Q(requester_id=request.auth) | Q(owner_id=request.auth)
+    )
+    if status:
+        exchanges = exchanges.filter(status=status)
+    return exchanges
 
 
 @router.post("/request")
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.1 on 2026-10-16 20:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books", "0004_book_books_book_title_keyset"),
+        ("exchanges", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="bookexchange",
+            index=models.Index(
+                fields=["requester", "-created_at", "-id"],
+                name="exchanges_requester_keyset",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="bookexchange",
+            index=models.Index(
+                fields=["owner", "-created_at", "-id"], name="exchanges_owner_keyset"
+            ),
+        ),
+    ]
@@ -72,10 +72,30 @@ class BookExchange(models.Model):
     class Meta:
         db_table = "exchanges_book_exchange"
         ordering = ["-created_at"]
+        indexes = [
+            # Keyset pagination of a user's exchanges on either side
+            models.Index(
+                fields=["requester", "-created_at", "-id"],
+                name="exchanges_requester_keyset",
+            ),
+            models.Index(
+                fields=["owner", "-created_at", "-id"], name="exchanges_owner_keyset"
+            ),
+        ]
 
     def __str__(self):
         return f"Exchange: {self.requester.display_name} -> {self.requested_book.book.title}"
 
+    def save(self, *args, **kwargs):
+        # Blocked users cannot request exchanges from each other
+        if not self.pk:
+            from friendships.blocking import is_blocked
+
+            if is_blocked(self.requester_id, self.owner_id, fresh=True):
+                raise ValueError("Cannot exchange with a blocked user")
+
+        super().save(*args, **kwargs)
+
 
 class ExchangeRating(models.Model):
     """Rating and feedback for completed exchanges"""
@@ -1,3 +1,43 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
 
-# Create your tests here.
+from books.models import Book, UserBook
+from friendships.models import BlockedUser
+
+from .models import BookExchange
+
+
+class BlockedExchangeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.owner = User.objects.create_user(
+            username="owner", email="owner@example.com", password="secret"
+        )
+        self.requester = User.objects.create_user(
+            username="requester", email="requester@example.com", password="secret"
+        )
+        self.copy = UserBook.objects.create(
+            user=self.owner,
+            book=Book.objects.create(title="Dune"),
+            available_for_exchange=True,
+        )
+
+    def request_exchange(self):
+        return BookExchange.objects.create(
+            requester=self.requester, owner=self.owner, requested_book=self.copy
+        )
+
+    def test_exchange_between_unblocked_users(self):
+        self.assertEqual(self.request_exchange().status, "requested")
+
+    def test_blocked_users_cannot_request_exchanges(self):
+        for blocker, blocked in (
+            (self.owner, self.requester),
+            (self.requester, self.owner),
+        ):
+            block = BlockedUser.objects.create(blocker=blocker, blocked=blocked)
+            with self.assertRaisesMessage(ValueError, "blocked user"):
+                self.request_exchange()
+            block.delete()
@@ -1,15 +1,138 @@
+import time
+from typing import List, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
 from ninja import Router
+from ninja.pagination import paginate
+from pydantic import BaseModel, Field
+
+from accounts.api import auth_id
+from bookexchange.pagination import CursorPagination
+
+from . import blocking, graph, invitations
+from .models import FriendSuggestion
 
 router = Router()
 
 
-@router.get("/")
-def list_friendships(request):
-    """List friendships - placeholder"""
-    return {"message": "Friendships API - Coming Soon"}
+class RelationshipStatusRequestSchema(BaseModel):
+    user_ids: List[int] = Field(..., max_length=200)
+
+
+class RelationshipStatusSchema(BaseModel):
+    user_id: int
+    status: str  # friend, pending, blocked or none
+    initiated_by_me: bool
+
+
+class UserSummarySchema(BaseModel):
+    id: int
+    display_name: str
+
+    class Config:
+        from_attributes = True
+
+
+class BulkInvitationSchema(BaseModel):
+    emails: List[str] = Field(..., max_length=1000)
+    message: str = Field("", max_length=500)
+
+
+class BulkInvitationResultSchema(BaseModel):
+    created: int
+    already_members: List[str]
+    already_invited: List[str]
+    invalid: List[str]
+
+
+class FriendSuggestionSchema(BaseModel):
+    suggested_user: UserSummarySchema
+    score: float
+    mutual_friends: int
+    shared_genres: int
+    distance_km: Optional[float] = None
+
+    class Config:
+        from_attributes = True
+
+
+class FriendshipPathSchema(BaseModel):
+    found: bool
+    degree: Optional[int] = None
+    path: List[UserSummarySchema]
+    nodes_expanded: int
+    # The search hit MAX_EXPANDED_NODES before finding a path
+    truncated: bool
+    elapsed_ms: float
+
+
+@router.get("/", response=List[UserSummarySchema], auth=auth_id)
+@paginate(CursorPagination, ordering=("username", "id"))
+def list_friends(request):
+    """List the current user's accepted friends by username"""
+    return graph.friends(request.auth)
 
 
 @router.post("/request")
 def send_friend_request(request):
     """Send friend request - placeholder"""
     return {"message": "Friend request sent - Coming Soon"}
+
+
+@router.post("/statuses", response=List[RelationshipStatusSchema], auth=auth_id)
+def relationship_statuses(request, data: RelationshipStatusRequestSchema):
+    """Get the relationship between the current user and each listed user"""
+    statuses = graph.relationship_statuses(request.auth, data.user_ids)
+    return [
+        {
+            "user_id": user_id,
+            "status": statuses[user_id][0],
+            "initiated_by_me": statuses[user_id][1],
+        }
+        for user_id in dict.fromkeys(data.user_ids)
+        if user_id in statuses
+    ]
+
+
+@router.get("/path/{user_id}", response=FriendshipPathSchema, auth=auth_id)
+def friendship_path(request, user_id: int, max_depth: Optional[int] = None):
+    """Get the shortest chain of friends between the current user and another"""
+    limit = settings.FRIEND_GRAPH["MAX_PATH_DEPTH"]
+    max_depth = min(max_depth or limit, limit)
+
+    started = time.perf_counter()
+    path, nodes_expanded, truncated = graph.shortest_path(
+        request.auth, user_id, max_depth=max_depth
+    )
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    users = get_user_model().objects.in_bulk(path or [])
+    return {
+        "found": path is not None,
+        "degree": len(path) - 1 if path else None,
+        "path": [
+            {"id": user_id, "display_name": users[user_id].display_name}
+            for user_id in path or []
+            if user_id in users
+        ],
+        "nodes_expanded": nodes_expanded,
+        "truncated": truncated,
+        "elapsed_ms": elapsed_ms,
+    }
+
+
+@router.get("/suggestions", response=List[FriendSuggestionSchema], auth=auth_id)
+@paginate(CursorPagination, ordering=("-score", "suggested_user_id"))
+def friend_suggestions(request):
+    """List precomputed "people you may know" suggestions, best first"""
+    suggestions = FriendSuggestion.objects.filter(user_id=request.auth).select_related(
+        "suggested_user"
+    )
+    return blocking.exclude_blocked(suggestions, request.auth, "suggested_user")
+
+
+@router.post("/invitations/bulk", response=BulkInvitationResultSchema, auth=auth_id)
+def bulk_invite(request, data: BulkInvitationSchema):
+    """Invite a list of email addresses, e.g. from a contact import"""
+    return invitations.create_invitations(request.auth, data.emails, data.message)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class FriendshipsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "friendships"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,90 @@
+"""
+Synthetic data and timing helpers for the friend graph benchmark commands.
+"""
+
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .models import Friendship
+
+
+def create_synthetic_users(count, batch_size=5000, prefix="bench"):
+    """Bulk insert ``count`` users and return their ids"""
+    User = get_user_model()
+    start = User.objects.order_by("-id").values_list("id", flat=True).first() or 0
+    for offset in range(0, count, batch_size):
+        User.objects.bulk_create(
+            User(
+                email=f"{prefix}{start + i}@example.com",
+                username=f"{prefix}{start + i}",
+                first_name="Bench",
+                last_name=str(start + i),
+                password="!",
+            )
+            for i in range(offset, min(offset + batch_size, count))
+        )
+    return list(
+        User.objects.filter(username__startswith=prefix)
+        .order_by("id")
+        .values_list("id", flat=True)
+    )
+
+
+def create_synthetic_graph(user_ids, average_degree, seed=0, batch_size=10000):
+    """
+    Connect users with random accepted friendships so that the average
+    degree is roughly ``average_degree``. Returns the number of edges stored.
+    """
+    rng = random.Random(seed)
+    edges_per_user = max(1, average_degree // 2)
+    batch = []
+    for user_id in user_ids:
+        for other_id in rng.sample(user_ids, min(edges_per_user, len(user_ids))):
+            if other_id == user_id:
+                continue
+            low, high = min(user_id, other_id), max(user_id, other_id)
+            batch.append(
+                Friendship(
+                    user1_id=low, user2_id=high, initiated_by_id=low, status="accepted"
+                )
+            )
+            if len(batch) >= batch_size:
+                Friendship.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+    Friendship.objects.bulk_create(batch, ignore_conflicts=True)
+    return Friendship.objects.filter(
+        user1_id__gte=min(user_ids), user1_id__lte=max(user_ids)
+    ).count()
+
+
+def measure(fn, samples):
+    """
+    Call ``fn`` once per sample argument and return timing and query stats.
+    """
+    timings = []
+    queries = []
+    for sample in samples:
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            fn(sample)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(len(context.captured_queries))
+    timings.sort()
+    return {
+        "p50_ms": statistics.median(timings),
+        "p95_ms": timings[round(0.95 * (len(timings) - 1))],
+        "max_ms": timings[-1],
+        "avg_queries": statistics.mean(queries),
+    }
+
+
+def format_stats(label, stats):
+    return (
+        f"{label}: p50={stats['p50_ms']:.2f}ms p95={stats['p95_ms']:.2f}ms "
+        f"max={stats['max_ms']:.2f}ms queries={stats['avg_queries']:.1f}"
+    )
@@ -0,0 +1,74 @@
+"""
+Cached view of who a user must not interact with.
+
+A user's blocked set holds every user they blocked and every user who blocked
+them. It is cached per user and dropped whenever a BlockedUser row involving
+them is saved or deleted, and again once that change commits, so discovery
+can filter with an ``id__in`` exclusion or a set lookup instead of a
+per-row join.
+
+Other processes only see the invalidation through a shared CACHE_BACKEND;
+with the default per-process cache they may serve a stale set until
+``BLOCKED_CACHE_TIMEOUT`` expires. Writes that must never slip past a block,
+such as new messages and exchange requests, check with ``fresh=True``.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+from .models import BlockedUser
+
+
+def _blocked_key(user_id):
+    return f"friends:blocked:{user_id}"
+
+
+def blocked_ids(user_id):
+    """Return ids of users blocked by, or blocking, ``user_id``"""
+    key = _blocked_key(user_id)
+    ids = cache.get(key)
+    if ids is None:
+        rows = BlockedUser.objects.filter(
+            Q(blocker_id=user_id) | Q(blocked_id=user_id)
+        ).values_list("blocker_id", "blocked_id")
+        ids = {
+            blocked_id if blocker_id == user_id else blocker_id
+            for blocker_id, blocked_id in rows
+        }
+        cache.set(key, ids, settings.FRIEND_GRAPH["BLOCKED_CACHE_TIMEOUT"])
+    return ids
+
+
+def is_blocked(user_id, other_id, fresh=False):
+    """
+    Check whether either user has blocked the other, against the database
+    rather than the cached set when ``fresh`` is set.
+    """
+    if fresh:
+        return BlockedUser.objects.filter(
+            Q(blocker_id=user_id, blocked_id=other_id)
+            | Q(blocker_id=other_id, blocked_id=user_id)
+        ).exists()
+    return other_id in blocked_ids(user_id)
+
+
+def exclude_blocked(queryset, user_id, field="id"):
+    """
+    Drop rows whose ``field`` points at a user in the blocked set of
+    ``user_id``, e.g. ``exclude_blocked(UserBook.objects.all(), me, "user")``.
+    """
+    ids = blocked_ids(user_id)
+    if not ids:
+        return queryset
+    lookup = field if field.endswith("id") else f"{field}_id"
+    return queryset.exclude(**{f"{lookup}__in": ids})
+
+
+def invalidate_pair(user1_id, user2_id):
+    """Drop both users' sets now and again once the change is committed"""
+    keys = [_blocked_key(user1_id), _blocked_key(user2_id)]
+    cache.delete_many(keys)
+    # A concurrent reader may have cached the old set before the commit
+    transaction.on_commit(lambda: cache.delete_many(keys))
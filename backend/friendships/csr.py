@@ -0,0 +1,309 @@
+"""
+Optional in-process friend graph stored in compressed sparse row form.
+
+Accepted friendships are held as three ``array("q")`` buffers: the sorted ids
+of users with at least one friend, row offsets into the neighbour buffer and
+the neighbour ids themselves (sorted within each row). Changes arriving from
+the Friendship signals are kept in a small overlay and folded back into the
+arrays once the overlay grows past ``COMPACT_THRESHOLD`` edges.
+
+Enable it with ``FRIEND_GRAPH_IN_MEMORY=True``; the graph is loaded from the
+database the first time a process uses it.
+
+Deltas are applied only in the process that committed the change. Every
+committed change also bumps a version counter in the default cache, and a
+process whose graph was built at another version rebuilds it, checking at
+most every ``FRIEND_GRAPH_SYNC_INTERVAL`` seconds. The counter is only shared
+when the default cache is (Redis, Memcached): with the per-process
+LocMemCache other web and worker processes never see each other's changes,
+so leave the CSR graph disabled in multi-process deployments without one.
+"""
+
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Friendship
+from .paths import bidirectional_shortest_path
+
+COMPACT_THRESHOLD = 10000
+
+VERSION_KEY = "friends:csr:version"
+
+
+class CSRFriendGraph:
+    """Read-optimised adjacency of accepted friendships"""
+
+    def __init__(self):
+        self.node_ids = array("q")
+        self.offsets = array("q", [0])
+        self.neighbour_ids = array("q")
+        self._added = defaultdict(set)
+        self._removed = defaultdict(set)
+        self._delta_count = 0
+        self._lock = threading.RLock()
+        self.built_at = None
+        self.build_seconds = None
+        # Shared version the graph reflects, and when that was last checked
+        self.version = None
+        self.checked_at = time.monotonic()
+
+    @classmethod
+    def from_database(cls, chunk_size=20000):
+        graph = cls()
+        graph.rebuild(chunk_size=chunk_size)
+        return graph
+
+    def rebuild(self, chunk_size=20000):
+        """Reload every accepted friendship from the database"""
+        started = time.perf_counter()
+        sources = array("q")
+        targets = array("q")
+        rows = (
+            Friendship.objects.filter(status="accepted")
+            .values_list("user1_id", "user2_id")
+            .iterator(chunk_size=chunk_size)
+        )
+        for user1_id, user2_id in rows:
+            sources.append(user1_id)
+            targets.append(user2_id)
+        with self._lock:
+            self._load_edges(sources, targets)
+            self._added.clear()
+            self._removed.clear()
+            self._delta_count = 0
+        self.built_at = timezone.now()
+        self.build_seconds = time.perf_counter() - started
+
+    def _load_edges(self, sources, targets):
+        degrees = defaultdict(int)
+        for user_id in sources:
+            degrees[user_id] += 1
+        for user_id in targets:
+            degrees[user_id] += 1
+
+        node_ids = array("q", sorted(degrees))
+        offsets = array("q", [0]) * (len(node_ids) + 1)
+        positions = {}
+        for index, user_id in enumerate(node_ids):
+            offsets[index + 1] = offsets[index] + degrees[user_id]
+            positions[user_id] = offsets[index]
+        del degrees
+
+        neighbour_ids = array("q", [0]) * offsets[-1]
+        for user1_id, user2_id in zip(sources, targets):
+            neighbour_ids[positions[user1_id]] = user2_id
+            positions[user1_id] += 1
+            neighbour_ids[positions[user2_id]] = user1_id
+            positions[user2_id] += 1
+        del positions
+
+        for index in range(len(node_ids)):
+            start, end = offsets[index], offsets[index + 1]
+            neighbour_ids[start:end] = array("q", sorted(neighbour_ids[start:end]))
+
+        self.node_ids = node_ids
+        self.offsets = offsets
+        self.neighbour_ids = neighbour_ids
+
+    def _row(self, user_id):
+        index = bisect_left(self.node_ids, user_id)
+        if index < len(self.node_ids) and self.node_ids[index] == user_id:
+            return self.neighbour_ids[self.offsets[index] : self.offsets[index + 1]]
+        return array("q")
+
+    def _in_row(self, user_id, other_id):
+        row = self._row(user_id)
+        index = bisect_left(row, other_id)
+        return index < len(row) and row[index] == other_id
+
+    # Incremental updates
+
+    def apply_edge(self, user1_id, user2_id, connected):
+        """Add or remove an accepted friendship without reloading"""
+        with self._lock:
+            for source, target in ((user1_id, user2_id), (user2_id, user1_id)):
+                in_base = self._in_row(source, target)
+                if connected:
+                    self._removed[source].discard(target)
+                    if not in_base:
+                        self._added[source].add(target)
+                else:
+                    self._added[source].discard(target)
+                    if in_base:
+                        self._removed[source].add(target)
+            self._delta_count += 1
+            if self._delta_count >= COMPACT_THRESHOLD:
+                self.compact()
+
+    def compact(self):
+        """Fold the pending overlay back into the CSR arrays"""
+        started = time.perf_counter()
+        with self._lock:
+            sources = array("q")
+            targets = array("q")
+            for user_id in self._all_node_ids():
+                for other_id in self.neighbours(user_id):
+                    if user_id < other_id:
+                        sources.append(user_id)
+                        targets.append(other_id)
+            self._load_edges(sources, targets)
+            self._added.clear()
+            self._removed.clear()
+            self._delta_count = 0
+        self.build_seconds = time.perf_counter() - started
+        self.built_at = timezone.now()
+
+    def _all_node_ids(self):
+        return set(self.node_ids) | set(self._added)
+
+    # Queries
+
+    def neighbours(self, user_id):
+        """Return the set of friend ids of a user"""
+        with self._lock:
+            friends = set(self._row(user_id))
+            if user_id in self._removed:
+                friends -= self._removed[user_id]
+            if user_id in self._added:
+                friends |= self._added[user_id]
+            return friends
+
+    def degree(self, user_id):
+        return len(self.neighbours(user_id))
+
+    def mutual_count(self, user1_id, user2_id):
+        return len(self.neighbours(user1_id) & self.neighbours(user2_id))
+
+    def friends_of_friends(self, user_id, limit=None):
+        """Same contract as ``friendships.graph.friends_of_friends``"""
+        friends = self.neighbours(user_id)
+        counts = defaultdict(int)
+        for friend_id in friends:
+            for other_id in self.neighbours(friend_id):
+                counts[other_id] += 1
+        counts.pop(user_id, None)
+        for friend_id in friends:
+            counts.pop(friend_id, None)
+        ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit] if limit is not None else ranked
+
+    def shortest_path(self, source_id, target_id, max_depth=6):
+        """
+        Return the list of user ids on a shortest friendship chain from
+        ``source_id`` to ``target_id`` (both included), or None if they are
+        further apart than ``max_depth`` hops.
+        """
+        path, _, _ = bidirectional_shortest_path(
+            source_id, target_id, self.neighbours_of, max_depth=max_depth
+        )
+        return path
+
+    def neighbours_of(self, user_ids):
+        return {user_id: self.neighbours(user_id) for user_id in user_ids}
+
+    def degree_of_separation(self, user1_id, user2_id, max_depth=6):
+        path = self.shortest_path(user1_id, user2_id, max_depth=max_depth)
+        return len(path) - 1 if path else None
+
+    # Introspection
+
+    def stats(self):
+        """Memory usage of the graph buffers and timing of the last build"""
+        array_bytes = sum(
+            buffer.buffer_info()[1] * buffer.itemsize
+            for buffer in (self.node_ids, self.offsets, self.neighbour_ids)
+        )
+        overlay_bytes = sum(
+            sys.getsizeof(delta) + sum(sys.getsizeof(ids) for ids in delta.values())
+            for delta in (self._added, self._removed)
+        )
+        return {
+            "nodes": len(self.node_ids),
+            "edges": len(self.neighbour_ids) // 2,
+            "pending_deltas": self._delta_count,
+            "version": self.version,
+            "array_bytes": array_bytes,
+            "overlay_bytes": overlay_bytes,
+            "built_at": self.built_at,
+            "build_seconds": self.build_seconds,
+        }
+
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def is_enabled():
+    return settings.FRIEND_GRAPH["IN_MEMORY"]
+
+
+def shared_version():
+    """Return the cluster-wide friend graph version, creating it if missing"""
+    # Start from the clock rather than 0 so that a counter lost to eviction
+    # does not come back at a version a process already built from
+    cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+    return cache.get(VERSION_KEY)
+
+
+def _bump_version():
+    shared_version()
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        # Evicted between the two calls, the next check rebuilds
+        return None
+
+
+def _is_stale(graph):
+    now = time.monotonic()
+    if now - graph.checked_at < settings.FRIEND_GRAPH["SYNC_INTERVAL"]:
+        return False
+    graph.checked_at = now
+    return graph.version != shared_version()
+
+
+def get_graph():
+    """
+    Return the process-wide graph, loading it on first use and rebuilding it
+    once another process has committed a friendship change.
+    """
+    global _graph
+    graph = _graph
+    if graph is not None and not _is_stale(graph):
+        return graph
+    with _graph_lock:
+        # Read the version first: a change committed while the rows load
+        # leaves the graph behind and triggers the next rebuild
+        version = shared_version()
+        if _graph is None:
+            _graph = CSRFriendGraph.from_database()
+            _graph.version = version
+        elif _graph.version != version:
+            _graph.rebuild()
+            _graph.version = version
+    return _graph
+
+
+def apply_edge(user1_id, user2_id, connected):
+    """
+    Publish a committed friendship change to other processes and forward it
+    to this process's graph if it loaded one
+    """
+    if not is_enabled():
+        return
+    version = _bump_version()
+    graph = _graph
+    if graph is None:
+        return
+    graph.apply_edge(user1_id, user2_id, connected)
+    # Skip the rebuild only if no other process changed the graph meanwhile
+    if version is not None and graph.version == version - 1:
+        graph.version = version
@@ -0,0 +1,248 @@
+"""
+Friend graph queries over accepted friendships.
+
+Adjacency sets are cached per user and dropped by the Friendship signal
+handlers once a change involving the user commits, so repeated lookups only
+reach the database after the user's friendships change.
+"""
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Q
+
+from . import blocking, csr
+from .models import BlockedUser, Friendship
+from .paths import bidirectional_shortest_path
+
+FRIENDSHIP_DISPLAY_STATUS = {
+    "accepted": "friend",
+    "pending": "pending",
+    "blocked": "blocked",
+}
+
+
+def canonical_pair(user1_id, user2_id):
+    """Return the ids in the order Friendship stores them"""
+    if user1_id < user2_id:
+        return user1_id, user2_id
+    return user2_id, user1_id
+
+
+def relationship_status(user1_id, user2_id):
+    """
+    Return the Friendship status between two users, or None if they have no
+    friendship row. Resolves with a single unique index lookup.
+    """
+    low, high = canonical_pair(user1_id, user2_id)
+    return (
+        Friendship.objects.filter(user1_id=low, user2_id=high)
+        .values_list("status", flat=True)
+        .first()
+    )
+
+
+def are_friends(user1_id, user2_id):
+    """Check whether two users have an accepted friendship"""
+    low, high = canonical_pair(user1_id, user2_id)
+    return Friendship.objects.filter(
+        user1_id=low, user2_id=high, status="accepted"
+    ).exists()
+
+
+def relationship_statuses(user_id, other_ids):
+    """
+    Resolve how ``user_id`` relates to each of ``other_ids`` with one
+    Friendship query and one BlockedUser query.
+
+    Returns ``{other_id: (status, initiated_by_me)}`` where status is one of
+    "friend", "pending", "blocked" or "none"; blocks in either direction win.
+    """
+    other_ids = set(other_ids) - {user_id}
+    statuses = {other_id: ("none", False) for other_id in other_ids}
+    if not other_ids:
+        return statuses
+
+    rows = Friendship.objects.filter(
+        Q(user1_id=user_id, user2_id__in=other_ids)
+        | Q(user2_id=user_id, user1_id__in=other_ids)
+    ).values_list("user1_id", "user2_id", "status", "initiated_by_id")
+    for user1_id, user2_id, status, initiated_by_id in rows:
+        other_id = user2_id if user1_id == user_id else user1_id
+        statuses[other_id] = (
+            FRIENDSHIP_DISPLAY_STATUS.get(status, "none"),
+            initiated_by_id == user_id,
+        )
+
+    blocks = BlockedUser.objects.filter(
+        Q(blocker_id=user_id, blocked_id__in=other_ids)
+        | Q(blocked_id=user_id, blocker_id__in=other_ids)
+    ).values_list("blocker_id", "blocked_id")
+    for blocker_id, blocked_id in blocks:
+        other_id = blocked_id if blocker_id == user_id else blocker_id
+        statuses[other_id] = ("blocked", blocker_id == user_id)
+
+    return statuses
+
+
+def _adjacency_key(user_id):
+    return f"friends:adjacency:{user_id}"
+
+
+def _load_friend_ids(user_id):
+    rows = Friendship.objects.filter(
+        Q(user1_id=user_id) | Q(user2_id=user_id), status="accepted"
+    ).values_list("user1_id", "user2_id")
+    return {
+        user2_id if user1_id == user_id else user1_id for user1_id, user2_id in rows
+    }
+
+
+def friend_ids(user_id):
+    """Return the set of ids of the user's accepted friends"""
+    key = _adjacency_key(user_id)
+    ids = cache.get(key)
+    if ids is None:
+        ids = _load_friend_ids(user_id)
+        cache.set(key, ids, settings.FRIEND_GRAPH["CACHE_TIMEOUT"])
+    return ids
+
+
+def friends(user_id):
+    """Return the user's accepted friends as a single User queryset"""
+    return get_user_model().objects.filter(id__in=friend_ids(user_id))
+
+
+def invalidate_pair(user1_id, user2_id):
+    """
+    Drop both users' cached friend data once the current transaction commits,
+    so a rolled back change never reaches the cache and the next read in any
+    process loads the committed friendships.
+    """
+    keys = [
+        key_for(user_id)
+        for user_id in (user1_id, user2_id)
+        for key_for in (_adjacency_key, _network_key)
+    ]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+# Two-hop expansion of the caller's friends in a single statement. Friendships
+# are undirected, so each hop reads both orientations of the pair; every
+# branch is served by the user1/user2 foreign key indexes.
+FRIENDS_OF_FRIENDS_SQL = """
+    WITH friends AS (
+        SELECT user2_id AS id FROM {table}
+        WHERE user1_id = %s AND status = 'accepted'
+        UNION
+        SELECT user1_id FROM {table}
+        WHERE user2_id = %s AND status = 'accepted'
+    ),
+    second_hop AS (
+        SELECT f.user2_id AS id FROM {table} f
+        JOIN friends ON f.user1_id = friends.id
+        WHERE f.status = 'accepted'
+        UNION ALL
+        SELECT f.user1_id FROM {table} f
+        JOIN friends ON f.user2_id = friends.id
+        WHERE f.status = 'accepted'
+    )
+    SELECT id, COUNT(*) AS mutual_count FROM second_hop
+    WHERE id <> %s AND id NOT IN (SELECT id FROM friends)
+    GROUP BY id
+    ORDER BY mutual_count DESC, id
+"""
+
+
+def friends_of_friends(user_id, limit=None):
+    """
+    Return ``(user_id, mutual_count)`` pairs for friends of friends, excluding
+    the user, their direct friends and blocked users, most mutual friends
+    first.
+    """
+    blocked = blocking.blocked_ids(user_id)
+    # Over-fetch so that filtering blocked users still fills the limit
+    fetch = limit + len(blocked) if limit is not None else None
+
+    if csr.is_enabled():
+        rows = csr.get_graph().friends_of_friends(user_id, limit=fetch)
+    else:
+        sql = FRIENDS_OF_FRIENDS_SQL.format(table=Friendship._meta.db_table)
+        params = [user_id, user_id, user_id]
+        if fetch is not None:
+            sql += " LIMIT %s"
+            params.append(fetch)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+
+    rows = [row for row in rows if row[0] not in blocked]
+    return rows[:limit] if limit is not None else rows
+
+
+def _network_key(user_id):
+    return f"friends:network:{user_id}"
+
+
+def network_hops(user_id):
+    """
+    Return ``{user_id: hops}`` for the user's friends (1) and friends of
+    friends (2), without blocked users. Friends of friends are capped at
+    MAX_EXPANDED_NODES, keeping those with the most mutual friends. Cached per
+    user and dropped when one of the user's own friendships changes; a change
+    between two of their friends' friends only shows after
+    NETWORK_CACHE_TIMEOUT.
+    """
+    key = _network_key(user_id)
+    hops = cache.get(key)
+    if hops is None:
+        limit = settings.FRIEND_GRAPH["MAX_EXPANDED_NODES"]
+        hops = {other_id: 2 for other_id, _ in friends_of_friends(user_id, limit)}
+        hops.update((other_id, 1) for other_id in friend_ids(user_id))
+        cache.set(key, hops, settings.FRIEND_GRAPH["NETWORK_CACHE_TIMEOUT"])
+    blocked = blocking.blocked_ids(user_id)
+    if blocked:
+        hops = {
+            other_id: hop for other_id, hop in hops.items() if other_id not in blocked
+        }
+    return hops
+
+
+def neighbours_of(user_ids, chunk_size=5000):
+    """
+    Return ``{user_id: friend_ids}`` for a whole BFS frontier, loading each
+    chunk of ``chunk_size`` users with a single query.
+    """
+    user_ids = list(user_ids)
+    neighbours = {user_id: set() for user_id in user_ids}
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[start : start + chunk_size]
+        rows = Friendship.objects.filter(
+            Q(user1_id__in=chunk) | Q(user2_id__in=chunk), status="accepted"
+        ).values_list("user1_id", "user2_id")
+        for user1_id, user2_id in rows:
+            if user1_id in neighbours:
+                neighbours[user1_id].add(user2_id)
+            if user2_id in neighbours:
+                neighbours[user2_id].add(user1_id)
+    return neighbours
+
+
+def shortest_path(source_id, target_id, max_depth=None):
+    """
+    Find a shortest friendship chain between two users with a bidirectional
+    BFS. Returns ``(path, nodes_expanded, truncated)``; path is None beyond
+    max_depth, or when the search would expand more than MAX_EXPANDED_NODES
+    users, in which case truncated is True.
+    """
+    if max_depth is None:
+        max_depth = settings.FRIEND_GRAPH["MAX_PATH_DEPTH"]
+    expand = csr.get_graph().neighbours_of if csr.is_enabled() else neighbours_of
+    return bidirectional_shortest_path(
+        source_id,
+        target_id,
+        expand,
+        max_depth=max_depth,
+        max_expanded=settings.FRIEND_GRAPH["MAX_EXPANDED_NODES"],
+    )
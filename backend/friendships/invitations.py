@@ -0,0 +1,195 @@
+"""
+Bulk friend invitations: creation, batched delivery and expiry sweeps.
+
+A contact import is deduplicated against existing users and earlier
+invitations with set-based queries, written with ``bulk_create`` and handed to
+the ``send_friend_invitations`` task once the transaction commits.
+Invitations that could not be queued stay unsent until the periodic
+``send_pending_friend_invitations`` task delivers them.
+"""
+
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.mail import EmailMessage, get_connection
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from bookexchange.celery import enqueue
+
+from .models import FriendshipInvitation
+
+LOOKUP_CHUNK_SIZE = 500
+
+
+def normalize_emails(emails):
+    """
+    Lower-case, strip and deduplicate addresses, preserving their order.
+    Returns ``(valid, invalid)`` lists.
+    """
+    valid, invalid = [], []
+    for email in dict.fromkeys(email.strip().lower() for email in emails):
+        if not email:
+            continue
+        try:
+            validate_email(email)
+        except ValidationError:
+            invalid.append(email)
+        else:
+            valid.append(email)
+    return valid, invalid
+
+
+def _chunks(items, size=LOOKUP_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def create_invitations(inviter_id, emails, message=""):
+    """
+    Invite every new address in ``emails`` on behalf of ``inviter_id`` and
+    queue delivery. Returns a summary of what happened to each address.
+    """
+    emails, invalid = normalize_emails(emails)
+
+    members = set()
+    already_invited = set()
+    for chunk in _chunks(emails):
+        members.update(
+            get_user_model()
+            .objects.annotate(email_lower=Lower("email"))
+            .filter(email_lower__in=chunk)
+            .values_list("email_lower", flat=True)
+        )
+        # Older rows may have been stored before addresses were normalised
+        already_invited.update(
+            FriendshipInvitation.objects.annotate(email_lower=Lower("email"))
+            .filter(inviter_id=inviter_id, email_lower__in=chunk)
+            .values_list("email_lower", flat=True)
+        )
+
+    expires_at = timezone.now() + timedelta(
+        days=settings.FRIEND_INVITATIONS["EXPIRE_DAYS"]
+    )
+    invitations = [
+        FriendshipInvitation(
+            inviter_id=inviter_id,
+            email=email,
+            message=message,
+            invitation_code=secrets.token_urlsafe(24),
+            expires_at=expires_at,
+        )
+        for email in emails
+        if email not in members and email not in already_invited
+    ]
+
+    with transaction.atomic():
+        # A concurrent import may have invited the same address meanwhile
+        FriendshipInvitation.objects.bulk_create(invitations, ignore_conflicts=True)
+        codes = [invitation.invitation_code for invitation in invitations]
+        invitation_ids = []
+        for chunk in _chunks(codes):
+            invitation_ids.extend(
+                FriendshipInvitation.objects.filter(
+                    invitation_code__in=chunk
+                ).values_list("id", flat=True)
+            )
+        if invitation_ids:
+            transaction.on_commit(lambda: _queue_delivery(invitation_ids))
+
+    return {
+        "created": len(invitation_ids),
+        "already_members": [email for email in emails if email in members],
+        "already_invited": [email for email in emails if email in already_invited],
+        "invalid": invalid,
+    }
+
+
+def _queue_delivery(invitation_ids):
+    from .tasks import send_friend_invitations
+
+    enqueue(send_friend_invitations, invitation_ids)
+
+
+def _invitation_email(invitation):
+    inviter = invitation.inviter
+    body = (
+        f"{inviter.display_name} invited you to join BookExchange.\n\n"
+        + (f"{invitation.message}\n\n" if invitation.message else "")
+        + "Accept the invitation: "
+        + settings.FRIEND_INVITATIONS["ACCEPT_URL"].format(
+            code=invitation.invitation_code
+        )
+    )
+    return EmailMessage(
+        subject=f"{inviter.display_name} invited you to BookExchange",
+        body=body,
+        to=[invitation.email],
+    )
+
+
+def send_invitations(invitation_ids):
+    """
+    Deliver unsent, unexpired invitations in batches, reusing one mail
+    connection per batch. Returns the number of messages sent.
+    """
+    batch_size = settings.FRIEND_INVITATIONS["SEND_BATCH_SIZE"]
+    sent = 0
+    for chunk in _chunks(list(invitation_ids), batch_size):
+        invitations = list(
+            FriendshipInvitation.objects.filter(
+                id__in=chunk,
+                is_sent=False,
+                is_accepted=False,
+                expires_at__gt=timezone.now(),
+            ).select_related("inviter")
+        )
+        if not invitations:
+            continue
+        with get_connection() as connection:
+            connection.send_messages(
+                [_invitation_email(invitation) for invitation in invitations]
+            )
+        FriendshipInvitation.objects.filter(
+            id__in=[invitation.id for invitation in invitations]
+        ).update(is_sent=True, sent_at=timezone.now())
+        sent += len(invitations)
+    return sent
+
+
+def send_pending_invitations():
+    """
+    Deliver invitations whose delivery could not be queued. Recent ones are
+    left alone, as they may still be waiting in the queue.
+    """
+    cutoff = timezone.now() - timedelta(
+        minutes=settings.FRIEND_INVITATIONS["RETRY_AFTER_MINUTES"]
+    )
+    pending = FriendshipInvitation.objects.filter(
+        is_sent=False,
+        is_accepted=False,
+        created_at__lt=cutoff,
+        expires_at__gt=timezone.now(),
+    ).values_list("id", flat=True)
+    return send_invitations(list(pending))
+
+
+def sweep_expired_invitations(batch_size=1000):
+    """
+    Delete expired, unaccepted invitations in chunks walked through the
+    expiry index. Returns the number of rows removed.
+    """
+    expired = FriendshipInvitation.objects.filter(
+        is_accepted=False, expires_at__lt=timezone.now()
+    ).order_by("expires_at")
+    deleted = 0
+    while True:
+        ids = list(expired.values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += FriendshipInvitation.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,77 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+
+from accounts.models import User
+from friendships import benchmarks
+from friendships.blocking import exclude_blocked
+from friendships.models import BlockedUser
+
+
+class Command(BaseCommand):
+    help = "Compare the cached blocked-set filter with a per-row EXISTS subquery"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=50000)
+        parser.add_argument("--blocks-per-user", type=int, default=5)
+        parser.add_argument("--page-size", type=int, default=100)
+        parser.add_argument("--samples", type=int, default=50)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--keep", action="store_true", help="Keep the synthetic data"
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        with transaction.atomic():
+            user_ids = benchmarks.create_synthetic_users(options["users"])
+            blocks = {
+                (blocker_id, blocked_id)
+                for blocker_id in user_ids
+                for blocked_id in rng.sample(user_ids, options["blocks_per_user"])
+                if blocker_id != blocked_id
+            }
+            BlockedUser.objects.bulk_create(
+                (
+                    BlockedUser(blocker_id=blocker_id, blocked_id=blocked_id)
+                    for blocker_id, blocked_id in blocks
+                ),
+                batch_size=10000,
+            )
+            self.stdout.write(f"Created {len(user_ids)} users, {len(blocks)} blocks")
+
+            page_size = options["page_size"]
+            samples = rng.sample(user_ids, min(options["samples"], len(user_ids)))
+
+            def cached_set(user_id):
+                return list(
+                    exclude_blocked(User.objects.order_by("id"), user_id)[:page_size]
+                )
+
+            def exists_subquery(user_id):
+                blocked = BlockedUser.objects.filter(
+                    Q(blocker_id=user_id, blocked_id=OuterRef("pk"))
+                    | Q(blocked_id=user_id, blocker_id=OuterRef("pk"))
+                )
+                return list(
+                    User.objects.filter(~Exists(blocked)).order_by("id")[:page_size]
+                )
+
+            # Warm the blocked-set cache once, as steady-state traffic would
+            for user_id in samples:
+                cached_set(user_id)
+            self.stdout.write(
+                benchmarks.format_stats(
+                    "cached set", benchmarks.measure(cached_set, samples)
+                )
+            )
+            self.stdout.write(
+                benchmarks.format_stats(
+                    "EXISTS subquery", benchmarks.measure(exists_subquery, samples)
+                )
+            )
+
+            if not options["keep"]:
+                transaction.set_rollback(True)
@@ -0,0 +1,85 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from accounts.models import User
+from friendships import benchmarks
+from friendships.graph import friends_of_friends
+from friendships.models import Friendship
+
+
+class Command(BaseCommand):
+    help = "Benchmark the friends-of-friends query on a synthetic friend graph"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100000)
+        parser.add_argument("--degree", type=int, default=150)
+        parser.add_argument("--samples", type=int, default=50)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--legacy",
+            action="store_true",
+            help="Also time the per-friend loop the query engine replaced",
+        )
+        parser.add_argument(
+            "--keep", action="store_true", help="Keep the synthetic data"
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.stdout.write(
+                f"Building graph: {options['users']} users, "
+                f"average degree {options['degree']}"
+            )
+            user_ids = benchmarks.create_synthetic_users(options["users"])
+            edges = benchmarks.create_synthetic_graph(
+                user_ids, options["degree"], seed=options["seed"]
+            )
+            self.stdout.write(f"Created {edges} friendships")
+
+            samples = random.Random(options["seed"]).sample(
+                user_ids, min(options["samples"], len(user_ids))
+            )
+            self.stdout.write(
+                benchmarks.format_stats(
+                    "friends_of_friends",
+                    benchmarks.measure(friends_of_friends, samples),
+                )
+            )
+            if options["legacy"]:
+                self.stdout.write(
+                    benchmarks.format_stats(
+                        "legacy loop", benchmarks.measure(self.legacy, samples[:5])
+                    )
+                )
+
+            if not options["keep"]:
+                transaction.set_rollback(True)
+
+    @staticmethod
+    def legacy_friends(user):
+        # The original User.get_friends: one query for the friendships, then
+        # one per row to load whichever side is the friend
+        friendships = Friendship.objects.filter(
+            Q(user1=user, status="accepted") | Q(user2=user, status="accepted")
+        )
+        friends = []
+        for friendship in friendships:
+            if friendship.user1 == user:
+                friends.append(friendship.user2)
+            else:
+                friends.append(friendship.user1)
+        return friends
+
+    @classmethod
+    def legacy(cls, user_id):
+        user = User.objects.get(id=user_id)
+        friends = cls.legacy_friends(user)
+        friends_of_friends = set()
+        for friend in friends:
+            for fof in cls.legacy_friends(friend):
+                if fof != user and fof not in friends:
+                    friends_of_friends.add(fof)
+        return friends_of_friends
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_datetime
+
+from friendships.suggestions import refresh_suggestions
+
+
+class Command(BaseCommand):
+    help = "Precompute ranked friend suggestions for users"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Only refresh users whose graph or profile changed since the last run",
+        )
+        parser.add_argument(
+            "--since", help="ISO timestamp overriding the last run time"
+        )
+        parser.add_argument("--chunk-size", type=int, default=100)
+
+    def handle(self, *args, **options):
+        since = parse_datetime(options["since"]) if options["since"] else None
+        processed, written, seconds = refresh_suggestions(
+            incremental=options["incremental"] or since is not None,
+            since=since,
+            chunk_size=options["chunk_size"],
+        )
+        rate = processed / seconds if seconds else 0
+        self.stdout.write(
+            f"Refreshed {processed} users, wrote {written} suggestions "
+            f"in {seconds:.1f}s ({rate:.0f} users/s)"
+        )
@@ -0,0 +1,48 @@
+import random
+
+from django.core.management.base import BaseCommand
+
+from friendships.benchmarks import format_stats, measure
+from friendships.csr import CSRFriendGraph
+
+
+class Command(BaseCommand):
+    help = "Load the in-memory CSR friend graph and report its size and speed"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--samples", type=int, default=100)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        graph = CSRFriendGraph.from_database()
+        stats = graph.stats()
+        self.stdout.write(
+            f"Loaded {stats['nodes']} users and {stats['edges']} friendships "
+            f"in {stats['build_seconds']:.2f}s"
+        )
+        self.stdout.write(
+            f"Arrays: {stats['array_bytes'] / 1024 / 1024:.1f} MiB, "
+            f"overlay: {stats['overlay_bytes'] / 1024:.1f} KiB"
+        )
+        if not stats["nodes"]:
+            return
+
+        rng = random.Random(options["seed"])
+        samples = rng.sample(
+            list(graph.node_ids), min(options["samples"], stats["nodes"])
+        )
+        pairs = iter(rng.sample(list(graph.node_ids), 2) for _ in samples)
+        self.stdout.write(
+            format_stats("neighbours", measure(graph.neighbours, samples))
+        )
+        self.stdout.write(
+            format_stats(
+                "friends_of_friends", measure(graph.friends_of_friends, samples)
+            )
+        )
+        self.stdout.write(
+            format_stats(
+                "degree_of_separation",
+                measure(lambda _: graph.degree_of_separation(*next(pairs)), samples),
+            )
+        )
@@ -0,0 +1,66 @@
+# Generated by Django 5.0.1 on 2026-10-16 20:33
+
+from django.conf import settings
+from django.db import migrations, models
+
+# When both orientations of a pair exist, keep the most significant status
+STATUS_PRIORITY = {"blocked": 3, "accepted": 2, "pending": 1, "declined": 0}
+
+
+def canonicalize_friendships(apps, schema_editor):
+    Friendship = apps.get_model("friendships", "Friendship")
+    reversed_rows = (
+        Friendship.objects.filter(user1__gt=models.F("user2"))
+        .order_by("id")
+        .values("id", "user1_id", "user2_id", "status", "created_at")
+    )
+    losers = []
+    offset = 0
+    batch = list(reversed_rows[:1000])
+    while batch:
+        counterparts = {
+            (row["user1_id"], row["user2_id"]): row
+            for row in Friendship.objects.filter(
+                user1_id__in={row["user2_id"] for row in batch},
+                user2_id__in={row["user1_id"] for row in batch},
+            ).values("id", "user1_id", "user2_id", "status", "created_at")
+        }
+        for row in batch:
+            canonical = counterparts.get((row["user2_id"], row["user1_id"]))
+            if canonical is None:
+                continue
+            keep_reversed = (
+                STATUS_PRIORITY.get(row["status"], 0),
+                -row["created_at"].timestamp(),
+            ) > (
+                STATUS_PRIORITY.get(canonical["status"], 0),
+                -canonical["created_at"].timestamp(),
+            )
+            losers.append(canonical["id"] if keep_reversed else row["id"])
+        offset += len(batch)
+        batch = list(reversed_rows[offset : offset + 1000])
+
+    for start in range(0, len(losers), 1000):
+        Friendship.objects.filter(id__in=losers[start : start + 1000]).delete()
+    Friendship.objects.filter(user1__gt=models.F("user2")).update(
+        user1=models.F("user2"), user2=models.F("user1")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("friendships", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(canonicalize_friendships, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="friendship",
+            constraint=models.CheckConstraint(
+                check=models.Q(("user1__lt", models.F("user2"))),
+                name="friendship_canonical_pair",
+            ),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.0.1 on 2026-10-16 20:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("friendships", "0002_friendship_canonical_pair"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FriendSuggestion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("score", models.FloatField()),
+                ("mutual_friends", models.PositiveIntegerField(default=0)),
+                ("shared_genres", models.PositiveIntegerField(default=0)),
+                ("distance_km", models.FloatField(blank=True, null=True)),
+                ("computed_at", models.DateTimeField()),
+                (
+                    "suggested_user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="friend_suggestions",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "friendships_suggestion",
+                "ordering": ["-score"],
+                "indexes": [
+                    models.Index(
+                        fields=["user", "-score"], name="friendships_suggestion_rank"
+                    )
+                ],
+                "unique_together": {("user", "suggested_user")},
+            },
+        ),
+    ]
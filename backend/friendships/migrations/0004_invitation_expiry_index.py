@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-16 20:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("friendships", "0003_friendsuggestion"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="friendshipinvitation",
+            index=models.Index(
+                condition=models.Q(("is_accepted", False)),
+                fields=["expires_at"],
+                name="friendships_invitation_expiry",
+            ),
+        ),
+    ]
@@ -3,7 +3,12 @@ from django.db import models
 
 
 class Friendship(models.Model):
-    """Friendship relationship between users"""
+    """
+    Friendship relationship between users
+
+    Each pair of users has a single row stored in canonical order
+    (user1 has the lower id); initiated_by records who sent the request.
+    """
 
     STATUS_CHOICES = [
         ("pending", "Pending"),
@@ -43,15 +48,25 @@ class Friendship(models.Model):
         db_table = "friendships_friendship"
         unique_together = ["user1", "user2"]
         ordering = ["-created_at"]
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(user1__lt=models.F("user2")),
+                name="friendship_canonical_pair",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user1.display_name} -> {self.user2.display_name} ({self.status})"
 
     def save(self, *args, **kwargs):
         # Ensure user1 != user2
-        if self.user1 == self.user2:
+        if self.user1_id == self.user2_id:
             raise ValueError("Users cannot be friends with themselves")
 
+        # Store the pair in canonical order so lookups probe a single row
+        if self.user1_id > self.user2_id:
+            self.user1_id, self.user2_id = self.user2_id, self.user1_id
+
         # Set accepted_at when status changes to accepted
         if self.status == "accepted" and not self.accepted_at:
             from django.utils import timezone
@@ -109,10 +124,22 @@ class FriendshipInvitation(models.Model):
         db_table = "friendships_invitation"
         unique_together = ["inviter", "email"]
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["expires_at"],
+                condition=models.Q(is_accepted=False),
+                name="friendships_invitation_expiry",
+            ),
+        ]
 
     def __str__(self):
         return f"Invitation from {self.inviter.display_name} to {self.email}"
 
+    def save(self, *args, **kwargs):
+        # Compare addresses case-insensitively, like create_invitations does
+        self.email = self.email.strip().lower()
+        super().save(*args, **kwargs)
+
     @property
     def is_expired(self):
         from django.utils import timezone
@@ -160,3 +187,35 @@ class BlockedUser(models.Model):
         if self.blocker == self.blocked:
             raise ValueError("Users cannot block themselves")
         super().save(*args, **kwargs)
+
+
+class FriendSuggestion(models.Model):
+    """Precomputed "people you may know" entry, rebuilt by the suggestions job"""
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="friend_suggestions",
+    )
+    suggested_user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+    score = models.FloatField()
+
+    # Signals behind the score
+    mutual_friends = models.PositiveIntegerField(default=0)
+    shared_genres = models.PositiveIntegerField(default=0)
+    distance_km = models.FloatField(blank=True, null=True)
+
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        db_table = "friendships_suggestion"
+        unique_together = ["user", "suggested_user"]
+        ordering = ["-score"]
+        indexes = [
+            models.Index(fields=["user", "-score"], name="friendships_suggestion_rank"),
+        ]
+
+    def __str__(self):
+        return f"Suggest {self.suggested_user_id} to {self.user_id} ({self.score:.2f})"
@@ -0,0 +1,74 @@
+"""
+Bidirectional breadth-first search over the friend graph.
+
+The search is independent of where edges come from: ``expand`` receives a
+whole frontier and returns ``{user_id: neighbour_ids}`` for it, which lets the
+database-backed search resolve each level with a single query.
+"""
+
+
+def bidirectional_shortest_path(
+    source_id, target_id, expand, max_depth=6, max_expanded=None
+):
+    """
+    Return ``(path, nodes_expanded, truncated)`` where path lists the user ids
+    of a shortest chain from ``source_id`` to ``target_id`` (both included),
+    or is None when the users are more than ``max_depth`` hops apart.
+
+    The search gives up before a level would take it past ``max_expanded``
+    nodes; path is then None and truncated is True.
+    """
+    if source_id == target_id:
+        return [source_id], 0, False
+
+    parents = {source_id: None}
+    children = {target_id: None}
+    forward, backward = {source_id}, {target_id}
+    nodes_expanded = 0
+
+    for _ in range(max_depth):
+        # Always grow the smaller side, it is the cheaper level to load
+        if len(forward) <= len(backward):
+            frontier, visited, other_side = forward, parents, children
+        else:
+            frontier, visited, other_side = backward, children, parents
+
+        if max_expanded is not None and nodes_expanded + len(frontier) > max_expanded:
+            return None, nodes_expanded, True
+        nodes_expanded += len(frontier)
+        next_frontier = set()
+        meeting = None
+        for user_id, neighbour_ids in expand(frontier).items():
+            for other_id in neighbour_ids:
+                if other_id in visited:
+                    continue
+                visited[other_id] = user_id
+                if other_id in other_side:
+                    meeting = other_id
+                    break
+                next_frontier.add(other_id)
+            if meeting is not None:
+                return _join_path(meeting, parents, children), nodes_expanded, False
+
+        if frontier is forward:
+            forward = next_frontier
+        else:
+            backward = next_frontier
+        if not forward or not backward:
+            break
+
+    return None, nodes_expanded, False
+
+
+def _join_path(meeting, parents, children):
+    path = []
+    node = meeting
+    while node is not None:
+        path.append(node)
+        node = parents[node]
+    path.reverse()
+    node = children[meeting]
+    while node is not None:
+        path.append(node)
+        node = children[node]
+    return path
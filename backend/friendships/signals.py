@@ -0,0 +1,34 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import blocking, csr, graph, suggestions
+from .models import BlockedUser, Friendship
+
+
+@receiver(post_save, sender=Friendship)
+def update_friend_graph(sender, instance, **kwargs):
+    user1_id, user2_id = instance.user1_id, instance.user2_id
+    connected = instance.status == "accepted"
+    graph.invalidate_pair(user1_id, user2_id)
+    transaction.on_commit(lambda: csr.apply_edge(user1_id, user2_id, connected))
+
+
+@receiver(post_delete, sender=Friendship)
+def remove_from_friend_graph(sender, instance, **kwargs):
+    user1_id, user2_id = instance.user1_id, instance.user2_id
+    graph.invalidate_pair(user1_id, user2_id)
+    transaction.on_commit(lambda: csr.apply_edge(user1_id, user2_id, False))
+
+
+@receiver(post_save, sender=BlockedUser)
+@receiver(post_delete, sender=BlockedUser)
+def invalidate_blocked_sets(sender, instance, **kwargs):
+    blocking.invalidate_pair(instance.blocker_id, instance.blocked_id)
+
+
+@receiver(post_save, sender=BlockedUser)
+def discard_blocked_suggestions(sender, instance, **kwargs):
+    # Suggestions are precomputed, so the block would otherwise only show
+    # after the next rebuild of either user
+    suggestions.discard_pair(instance.blocker_id, instance.blocked_id)
@@ -0,0 +1,219 @@
+"""
+Batch job ranking "people you may know" suggestions.
+
+Candidates are each user's friends of friends; they are scored by mutual
+friends, distance between the two users and overlap in favourite genres, and
+the top entries replace the user's rows in FriendSuggestion. Users are
+processed in chunks so memory stays bounded by the chunk size.
+"""
+
+import math
+import time
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from accounts.geo import haversine_km
+from accounts.models import UserProfile
+
+from .graph import friend_ids, friends_of_friends
+from .models import Friendship, FriendSuggestion
+
+MAX_SUGGESTIONS = 50
+CANDIDATES_PER_USER = 100
+
+MUTUAL_WEIGHT = 1.0
+PROXIMITY_WEIGHT = 0.5
+GENRE_WEIGHT = 0.5
+
+# Distance at which the proximity bonus halves
+PROXIMITY_SCALE_KM = 25.0
+
+
+def score_candidate(mutual_friends, distance_km, shared_genres, total_genres):
+    score = MUTUAL_WEIGHT * math.log1p(mutual_friends)
+    if distance_km is not None:
+        score += PROXIMITY_WEIGHT / (1 + distance_km / PROXIMITY_SCALE_KM)
+    if total_genres:
+        score += GENRE_WEIGHT * shared_genres / total_genres
+    return score
+
+
+def _genre_set(genres):
+    return {str(genre).strip().lower() for genre in genres or []}
+
+
+def build_suggestions(user_ids):
+    """Recompute and store suggestions for one chunk of users"""
+    user_ids = list(user_ids)
+    candidates = {
+        user_id: friends_of_friends(user_id, limit=CANDIDATES_PER_USER)
+        for user_id in user_ids
+    }
+    everyone = set(user_ids)
+    for rows in candidates.values():
+        everyone.update(candidate_id for candidate_id, _ in rows)
+
+    people = {
+        row["id"]: row
+        for row in get_user_model()
+        .objects.filter(id__in=everyone)
+        .values(
+            "id",
+            "latitude",
+            "longitude",
+            "show_location",
+            "is_active",
+            "allow_friend_requests",
+        )
+    }
+    genres = {
+        user_id: _genre_set(favorite_genres)
+        for user_id, favorite_genres in UserProfile.objects.filter(
+            user_id__in=everyone
+        ).values_list("user_id", "favorite_genres")
+    }
+    # Pending, declined or blocked pairs are not worth suggesting again
+    existing = set(
+        Friendship.objects.filter(
+            Q(user1_id__in=user_ids) | Q(user2_id__in=user_ids)
+        ).values_list("user1_id", "user2_id")
+    )
+
+    now = timezone.now()
+    suggestions = []
+    for user_id in user_ids:
+        me = people.get(user_id)
+        if me is None:
+            continue
+        my_genres = genres.get(user_id, set())
+        ranked = []
+        for candidate_id, mutual_friends in candidates[user_id]:
+            other = people.get(candidate_id)
+            if (
+                other is None
+                or not other["is_active"]
+                or not other["allow_friend_requests"]
+                or (min(user_id, candidate_id), max(user_id, candidate_id)) in existing
+            ):
+                continue
+
+            distance_km = None
+            if (
+                me["show_location"]
+                and other["show_location"]
+                and None not in (me["latitude"], me["longitude"])
+                and None not in (other["latitude"], other["longitude"])
+            ):
+                distance_km = haversine_km(
+                    me["latitude"],
+                    me["longitude"],
+                    other["latitude"],
+                    other["longitude"],
+                )
+
+            other_genres = genres.get(candidate_id, set())
+            shared_genres = len(my_genres & other_genres)
+            score = score_candidate(
+                mutual_friends,
+                distance_km,
+                shared_genres,
+                len(my_genres | other_genres),
+            )
+            ranked.append(
+                FriendSuggestion(
+                    user_id=user_id,
+                    suggested_user_id=candidate_id,
+                    score=score,
+                    mutual_friends=mutual_friends,
+                    shared_genres=shared_genres,
+                    distance_km=distance_km,
+                    computed_at=now,
+                )
+            )
+        ranked.sort(key=lambda suggestion: suggestion.score, reverse=True)
+        suggestions.extend(ranked[:MAX_SUGGESTIONS])
+
+    with transaction.atomic():
+        FriendSuggestion.objects.filter(user_id__in=user_ids).delete()
+        FriendSuggestion.objects.bulk_create(suggestions)
+    return len(suggestions)
+
+
+def discard_pair(user1_id, user2_id):
+    """Drop suggestions between two users in both directions"""
+    FriendSuggestion.objects.filter(
+        Q(user_id=user1_id, suggested_user_id=user2_id)
+        | Q(user_id=user2_id, suggested_user_id=user1_id)
+    ).delete()
+
+
+def users_changed_since(since):
+    """
+    Ids of users whose suggestions may be stale: both sides of friendships
+    changed since ``since`` and their friends, plus users who edited their
+    location or profile.
+    """
+    User = get_user_model()
+    changed = set()
+    for user1_id, user2_id in Friendship.objects.filter(
+        updated_at__gte=since
+    ).values_list("user1_id", "user2_id"):
+        changed.update((user1_id, user2_id))
+    for user_id in list(changed):
+        changed.update(friend_ids(user_id))
+    changed.update(
+        User.objects.filter(updated_at__gte=since).values_list("id", flat=True)
+    )
+    changed.update(
+        UserProfile.objects.filter(updated_at__gte=since).values_list(
+            "user_id", flat=True
+        )
+    )
+    return changed
+
+
+def last_run_at():
+    return FriendSuggestion.objects.aggregate(last=Max("computed_at"))["last"]
+
+
+def _chunks(user_ids, chunk_size):
+    user_ids = sorted(user_ids)
+    for start in range(0, len(user_ids), chunk_size):
+        yield user_ids[start : start + chunk_size]
+
+
+def _active_user_chunks(chunk_size):
+    users = get_user_model().objects.filter(is_active=True).order_by("id")
+    last_id = 0
+    while True:
+        chunk = list(
+            users.filter(id__gt=last_id).values_list("id", flat=True)[:chunk_size]
+        )
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1]
+
+
+def refresh_suggestions(incremental=False, since=None, chunk_size=100):
+    """
+    Rebuild suggestions for every active user, or only for users whose graph
+    or profile changed since the previous run when ``incremental`` is set.
+    Returns ``(users_processed, suggestions_written, seconds)``.
+    """
+    started = time.perf_counter()
+    if incremental:
+        since = since or last_run_at()
+    if incremental and since is not None:
+        chunks = _chunks(users_changed_since(since), chunk_size)
+    else:
+        chunks = _active_user_chunks(chunk_size)
+
+    processed = written = 0
+    for chunk in chunks:
+        written += build_suggestions(chunk)
+        processed += len(chunk)
+    return processed, written, time.perf_counter() - started
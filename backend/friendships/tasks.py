@@ -0,0 +1,30 @@
+from celery import shared_task
+
+from .invitations import send_invitations, send_pending_invitations
+from .invitations import sweep_expired_invitations as sweep_expired
+from .suggestions import refresh_suggestions
+
+
+@shared_task
+def refresh_friend_suggestions(incremental=True):
+    """Recompute "people you may know" suggestions"""
+    processed, written, _ = refresh_suggestions(incremental=incremental)
+    return {"users": processed, "suggestions": written}
+
+
+@shared_task
+def send_friend_invitations(invitation_ids):
+    """Email a batch of freshly created invitations"""
+    return send_invitations(invitation_ids)
+
+
+@shared_task
+def send_pending_friend_invitations():
+    """Send invitations whose delivery could not be queued"""
+    return send_pending_invitations()
+
+
+@shared_task
+def sweep_expired_invitations():
+    """Remove invitations that expired without being accepted"""
+    return sweep_expired(batch_size=1000)
@@ -1,3 +1,406 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest.mock import patch
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from kombu.exceptions import OperationalError
+
+from accounts.api import create_tokens
+from accounts.principal import principal_cache
+
+from . import blocking, csr, graph, invitations, models
+from .models import BlockedUser, Friendship, FriendSuggestion
+from .suggestions import refresh_suggestions
+from .tasks import send_friend_invitations
+
+
+def create_users(count):
+    User = get_user_model()
+    return [
+        User.objects.create_user(
+            username=f"user{i}", email=f"user{i}@example.com", password="secret"
+        )
+        for i in range(count)
+    ]
+
+
+class FriendGraphCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = create_users(3)
+        u0, u1, _ = self.users
+        Friendship.objects.create(
+            user1=u0, user2=u1, initiated_by=u0, status="accepted"
+        )
+
+    def test_friend_ids_are_cached(self):
+        u0, u1, _ = self.users
+        self.assertEqual(graph.friend_ids(u0.id), {u1.id})
+        with self.assertNumQueries(0):
+            self.assertEqual(graph.friend_ids(u0.id), {u1.id})
+
+    def test_accepting_drops_both_users_on_commit(self):
+        u0, _, u2 = self.users
+        graph.friend_ids(u0.id)
+        graph.friend_ids(u2.id)
+        friendship = Friendship.objects.create(
+            user1=u0, user2=u2, initiated_by=u2, status="pending"
+        )
+        friendship.status = "accepted"
+        with self.captureOnCommitCallbacks(execute=True):
+            friendship.save()
+        self.assertIn(u2.id, graph.friend_ids(u0.id))
+        self.assertEqual(graph.friend_ids(u2.id), {u0.id})
+
+    def test_unfriending_drops_both_users_on_commit(self):
+        u0, u1, _ = self.users
+        graph.friend_ids(u0.id)
+        graph.friend_ids(u1.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            Friendship.objects.filter(user1=u0, user2=u1).get().delete()
+        self.assertEqual(graph.friend_ids(u0.id), set())
+        self.assertEqual(graph.friend_ids(u1.id), set())
+
+    def test_cache_is_untouched_until_commit(self):
+        u0, u1, _ = self.users
+        graph.friend_ids(u0.id)
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            Friendship.objects.filter(user1=u0, user2=u1).get().delete()
+        self.assertTrue(callbacks)
+        # Had the transaction rolled back, the cached set would still be right
+        with self.assertNumQueries(0):
+            self.assertEqual(graph.friend_ids(u0.id), {u1.id})
+
+
+@override_settings(
+    FRIEND_GRAPH={**settings.FRIEND_GRAPH, "IN_MEMORY": True, "SYNC_INTERVAL": 0}
+)
+class CSRFriendGraphSyncTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        csr._graph = None
+        self.addCleanup(setattr, csr, "_graph", None)
+        self.users = create_users(3)
+
+    def test_local_changes_apply_without_a_rebuild(self):
+        u0, u1, _ = self.users
+        built_at = csr.get_graph().built_at
+        with self.captureOnCommitCallbacks(execute=True):
+            Friendship.objects.create(
+                user1=u0, user2=u1, initiated_by=u0, status="accepted"
+            )
+        friend_graph = csr.get_graph()
+        self.assertEqual(friend_graph.neighbours(u0.id), {u1.id})
+        self.assertEqual(friend_graph.built_at, built_at)
+
+    def test_changes_from_other_processes_trigger_a_rebuild(self):
+        u0, _, u2 = self.users
+        self.assertEqual(csr.get_graph().neighbours(u0.id), set())
+        # Another process commits a friendship and bumps the shared version
+        Friendship.objects.bulk_create(
+            [Friendship(user1=u0, user2=u2, initiated_by=u0, status="accepted")]
+        )
+        csr._bump_version()
+        self.assertEqual(csr.get_graph().neighbours(u0.id), {u2.id})
+
+
+class ShortestPathTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # A chain u0 - u1 - u2 - u3, with u4 on its own
+        cls.users = create_users(5)
+        for first, second in zip(cls.users, cls.users[1:4]):
+            Friendship.objects.create(
+                user1=first, user2=second, initiated_by=first, status="accepted"
+            )
+
+    def ids(self, *indexes):
+        return [self.users[index].id for index in indexes]
+
+    def test_path_found(self):
+        path, nodes_expanded, truncated = graph.shortest_path(*self.ids(0, 3))
+        self.assertEqual(path, self.ids(0, 1, 2, 3))
+        self.assertFalse(truncated)
+        self.assertGreater(nodes_expanded, 0)
+
+    def test_path_not_found(self):
+        path, _, truncated = graph.shortest_path(*self.ids(0, 4))
+        self.assertIsNone(path)
+        self.assertFalse(truncated)
+        path, _, truncated = graph.shortest_path(*self.ids(0, 3), max_depth=2)
+        self.assertIsNone(path)
+        self.assertFalse(truncated)
+
+    @override_settings(FRIEND_GRAPH={**settings.FRIEND_GRAPH, "MAX_EXPANDED_NODES": 2})
+    def test_search_stops_at_max_expanded_nodes(self):
+        path, nodes_expanded, truncated = graph.shortest_path(*self.ids(0, 3))
+        self.assertIsNone(path)
+        self.assertTrue(truncated)
+        self.assertLessEqual(nodes_expanded, 2)
+
+    @override_settings(FRIEND_GRAPH={**settings.FRIEND_GRAPH, "MAX_EXPANDED_NODES": 2})
+    def test_endpoint_reports_truncated_searches(self):
+        access_token, _ = create_tokens(self.users[0])
+        response = self.client.get(
+            f"/api/friends/path/{self.users[3].id}",
+            HTTP_AUTHORIZATION=f"Bearer {access_token}",
+        )
+        body = response.json()
+        self.assertEqual((body["found"], body["truncated"]), (False, True))
+
+
+class FriendSuggestionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # u0 and u2 share u1 as a friend, u3 shares both u1 and u4 with u0
+        self.users = create_users(5)
+        u0, u1, u2, u3, u4 = self.users
+        for first, second in ((u0, u1), (u1, u2), (u1, u3), (u0, u4), (u4, u3)):
+            Friendship.objects.create(
+                user1=first, user2=second, initiated_by=first, status="accepted"
+            )
+        refresh_suggestions()
+        access_token, _ = create_tokens(u0)
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {access_token}"}
+
+    def get_suggestions(self, **params):
+        response = self.client.get("/api/friends/suggestions", params, **self.auth)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_suggestions_ranked_by_mutual_friends(self):
+        body = self.get_suggestions()
+        self.assertEqual(
+            [item["suggested_user"]["id"] for item in body["items"]],
+            [self.users[3].id, self.users[2].id],
+        )
+        self.assertEqual(body["items"][0]["mutual_friends"], 2)
+
+    def test_cursor_pages_through_suggestions(self):
+        first = self.get_suggestions(limit=1)
+        second = self.get_suggestions(limit=1, cursor=first["next_cursor"])
+        self.assertEqual(second["items"][0]["suggested_user"]["id"], self.users[2].id)
+        self.assertIsNone(second["next_cursor"])
+
+    def test_blocked_users_disappear(self):
+        u0, _, u2, u3, _ = self.users
+        BlockedUser.objects.create(blocker=u0, blocked=u3)
+        BlockedUser.objects.create(blocker=u2, blocked=u0)
+        self.assertEqual(self.get_suggestions()["items"], [])
+
+        refresh_suggestions(incremental=True)
+        self.assertFalse(
+            FriendSuggestion.objects.filter(
+                user=u0, suggested_user__in=[u2, u3]
+            ).exists()
+        )
+
+
+class BlockingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = create_users(3)
+        BlockedUser.objects.create(blocker=self.users[0], blocked=self.users[1])
+
+    def test_is_blocked_in_both_directions(self):
+        u0, u1, u2 = (user.id for user in self.users)
+        self.assertTrue(blocking.is_blocked(u0, u1))
+        self.assertTrue(blocking.is_blocked(u1, u0))
+        self.assertFalse(blocking.is_blocked(u0, u2))
+        self.assertFalse(blocking.is_blocked(u2, u1))
+
+    def test_blocked_sets_follow_new_and_removed_blocks(self):
+        u0, u1, u2 = self.users
+        self.assertEqual(blocking.blocked_ids(u2.id), set())
+        block = BlockedUser.objects.create(blocker=u2, blocked=u0)
+        self.assertEqual(blocking.blocked_ids(u0.id), {u1.id, u2.id})
+        block.delete()
+        self.assertEqual(blocking.blocked_ids(u2.id), set())
+        self.assertEqual(blocking.blocked_ids(u0.id), {u1.id})
+
+    def test_blocked_sets_are_dropped_again_on_commit(self):
+        u0, u1, u2 = self.users
+        with self.captureOnCommitCallbacks(execute=True):
+            BlockedUser.objects.create(blocker=u2, blocked=u0)
+            # A concurrent reader caches the set as it was before the commit
+            cache.set(f"friends:blocked:{u0.id}", {u1.id})
+        self.assertEqual(blocking.blocked_ids(u0.id), {u1.id, u2.id})
+
+    def test_fresh_checks_skip_the_cached_set(self):
+        u0, u1, _ = self.users
+        cache.set(f"friends:blocked:{u0.id}", set())
+        self.assertFalse(blocking.is_blocked(u0.id, u1.id))
+        self.assertTrue(blocking.is_blocked(u0.id, u1.id, fresh=True))
+        self.assertTrue(blocking.is_blocked(u1.id, u0.id, fresh=True))
+
+    def test_exclude_blocked(self):
+        u0, u1, u2 = self.users
+        User = get_user_model()
+        self.assertEqual(
+            set(blocking.exclude_blocked(User.objects.all(), u0.id)), {u0, u2}
+        )
+        friendships = Friendship.objects.bulk_create(
+            [
+                Friendship(user1=u0, user2=u2, initiated_by=u0),
+                Friendship(user1=u1, user2=u2, initiated_by=u1),
+            ]
+        )
+        self.assertEqual(
+            list(
+                blocking.exclude_blocked(
+                    Friendship.objects.filter(user2=u2), u0.id, "user1"
+                )
+            ),
+            [friendships[0]],
+        )
+        # Users without blocks get their queryset back untouched
+        queryset = User.objects.all()
+        self.assertIs(blocking.exclude_blocked(queryset, u2.id), queryset)
+
+
+class FriendInvitationTests(TestCase):
+    def setUp(self):
+        self.inviter, self.member = create_users(2)
+
+    def invite(self, emails):
+        with self.captureOnCommitCallbacks(execute=True):
+            return invitations.create_invitations(self.inviter.id, emails)
+
+    def test_addresses_are_deduplicated_case_insensitively(self):
+        with patch.object(send_friend_invitations, "delay") as delay:
+            result = self.invite(["Bob@Example.com", " bob@example.com", "nope"])
+        self.assertEqual(result["created"], 1)
+        self.assertEqual(result["invalid"], ["nope"])
+        self.assertEqual(delay.call_count, 1)
+        invitation = models.FriendshipInvitation.objects.get()
+        self.assertEqual(invitation.email, "bob@example.com")
+
+        # Including rows stored before addresses were normalised
+        models.FriendshipInvitation.objects.bulk_create(
+            [
+                models.FriendshipInvitation(
+                    inviter=self.inviter,
+                    email="Carol@Example.com",
+                    invitation_code="legacy",
+                    expires_at=invitation.expires_at,
+                )
+            ]
+        )
+        with patch.object(send_friend_invitations, "delay"):
+            result = self.invite(["BOB@example.com", "carol@example.com"])
+        self.assertEqual(result["created"], 0)
+        self.assertEqual(
+            result["already_invited"], ["bob@example.com", "carol@example.com"]
+        )
+
+    def test_existing_members_are_not_invited(self):
+        with patch.object(send_friend_invitations, "delay"):
+            result = self.invite(["USER1@example.com"])
+        self.assertEqual(result["already_members"], ["user1@example.com"])
+        self.assertFalse(models.FriendshipInvitation.objects.exists())
+
+    def test_sent_later_without_a_broker(self):
+        with patch.object(
+            send_friend_invitations, "delay", side_effect=OperationalError
+        ):
+            result = self.invite(["dave@example.com", "erin@example.com"])
+        self.assertEqual(result["created"], 2)
+        self.assertEqual(mail.outbox, [])
+
+        # Recent invitations may still be queued, so they are left alone
+        self.assertEqual(invitations.send_pending_invitations(), 0)
+        models.FriendshipInvitation.objects.update(
+            created_at=timezone.now() - timedelta(hours=1)
+        )
+        self.assertEqual(invitations.send_pending_invitations(), 2)
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            ["dave@example.com", "erin@example.com"],
+        )
+        self.assertFalse(
+            models.FriendshipInvitation.objects.filter(is_sent=False).exists()
+        )
+
+
+class FriendsOfFriendsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # u0 - u1, u0 - u2; u3 knows both u1 and u2, u4 only u1, u5 is blocked
+        cls.users = create_users(6)
+        u0, u1, u2, u3, u4, u5 = cls.users
+        for first, second in ((u0, u1), (u0, u2), (u1, u3), (u2, u3), (u1, u4)):
+            Friendship.objects.create(
+                user1=first, user2=second, initiated_by=first, status="accepted"
+            )
+        Friendship.objects.create(
+            user1=u2, user2=u5, initiated_by=u5, status="accepted"
+        )
+        BlockedUser.objects.create(blocker=u5, blocked=u0)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_ranked_by_mutual_friends_without_friends_or_blocked_users(self):
+        u0, _, _, u3, u4, _ = self.users
+        with self.assertNumQueries(2):
+            rows = graph.friends_of_friends(u0.id)
+        self.assertEqual(rows, [(u3.id, 2), (u4.id, 1)])
+        self.assertEqual(graph.friends_of_friends(u0.id, limit=1), [(u3.id, 2)])
+
+    @override_settings(FRIEND_GRAPH={**settings.FRIEND_GRAPH, "IN_MEMORY": True})
+    def test_in_memory_graph_gives_the_same_answer(self):
+        csr._graph = None
+        self.addCleanup(setattr, csr, "_graph", None)
+        u0, _, _, u3, u4, _ = self.users
+        self.assertEqual(graph.friends_of_friends(u0.id), [(u3.id, 2), (u4.id, 1)])
+
+
+class CanonicalPairTests(TestCase):
+    def test_pairs_are_stored_in_canonical_order(self):
+        u0, u1 = create_users(2)
+        # Created from the higher id, stored as the canonical pair
+        Friendship.objects.create(
+            user1=u1, user2=u0, initiated_by=u1, status="accepted"
+        )
+        friendship = Friendship.objects.get(user1=u0, user2=u1)
+        self.assertEqual(friendship.initiated_by, u1)
+        self.assertTrue(graph.are_friends(u1.id, u0.id))
+        self.assertEqual(graph.relationship_status(u1.id, u0.id), "accepted")
+        with self.assertRaises(ValueError):
+            Friendship.objects.create(user1=u0, user2=u0, initiated_by=u0)
+
+
+class RelationshipStatusTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = create_users(5)
+        u0, u1, u2, u3, _ = cls.users
+        Friendship.objects.create(
+            user1=u1, user2=u0, initiated_by=u1, status="accepted"
+        )
+        Friendship.objects.create(user1=u0, user2=u2, initiated_by=u0)
+        BlockedUser.objects.create(blocker=u3, blocked=u0)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_statuses_endpoint(self):
+        u0, u1, u2, u3, u4 = self.users
+        access_token, _ = create_tokens(u0)
+        # The principal is loaded once, then served from the cache
+        principal_cache.get(u0.id, u0.token_version)
+        with self.assertNumQueries(2):
+            response = self.client.post(
+                "/api/friends/statuses",
+                {"user_ids": [u1.id, u2.id, u3.id, u4.id, u0.id]},
+                content_type="application/json",
+                HTTP_AUTHORIZATION=f"Bearer {access_token}",
+            )
+        self.assertEqual(
+            [(row["status"], row["initiated_by_me"]) for row in response.json()],
+            [("friend", False), ("pending", True), ("blocked", False), ("none", False)],
+        )
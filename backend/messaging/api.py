@@ -1,12 +1,42 @@
+from datetime import datetime
+from typing import List, Optional
+
+from django.db.models import Q
 from ninja import Router
+from ninja.pagination import paginate
+from pydantic import BaseModel
+
+from accounts.api import auth_id
+from bookexchange.pagination import CursorPagination
+
+from .models import PrivateMessage
 
 router = Router()
 
 
-@router.get("/")
+class MessageSchema(BaseModel):
+    id: int
+    sender_id: int
+    recipient_id: int
+    subject: str
+    content: str
+    is_read: bool
+    related_book_id: Optional[int] = None
+    reply_to_id: Optional[int] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+@router.get("/", response=List[MessageSchema], auth=auth_id)
+@paginate(CursorPagination, ordering=("-created_at", "-id"))
 def list_messages(request):
-    """List messages - placeholder"""
-    return {"message": "Messaging API - Coming Soon"}
+    """List the current user's sent and received messages, newest first"""
+    return PrivateMessage.objects.filter(
+        Q(sender_id=request.auth, is_deleted_by_sender=False)
+        | Q(recipient_id=request.auth, is_deleted_by_recipient=False)
+    )
 
 
 @router.post("/send")
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.1 on 2026-10-16 20:52
+
+from django.db import migrations, models
+
+import blobs.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("messaging", "0002_privatemessage_messaging_sender_keyset_and_more"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="messageattachment",
+            name="file",
+            field=models.FileField(
+                storage=blobs.storage.get_storage, upload_to="message_attachments/"
+            ),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.conf import settings
 from django.db import models
 
+from blobs.storage import get_storage
+
 
 class PrivateMessage(models.Model):
     """Private messages between users"""
@@ -41,12 +43,32 @@ class PrivateMessage(models.Model):
     class Meta:
         db_table = "messaging_private_message"
         ordering = ["-created_at"]
+        indexes = [
+            # Keyset pagination of each side of a user's mailbox
+            models.Index(
+                fields=["sender", "-created_at", "-id"], name="messaging_sender_keyset"
+            ),
+            models.Index(
+                fields=["recipient", "-created_at", "-id"],
+                name="messaging_recipient_keyset",
+            ),
+        ]
 
     def __str__(self):
         return (
             f"Message from {self.sender.display_name} to {self.recipient.display_name}"
         )
 
+    def save(self, *args, **kwargs):
+        # Blocked users cannot start messaging each other
+        if not self.pk:
+            from friendships.blocking import is_blocked
+
+            if is_blocked(self.sender_id, self.recipient_id, fresh=True):
+                raise ValueError("Cannot message a blocked user")
+
+        super().save(*args, **kwargs)
+
     def mark_as_read(self):
         if not self.is_read:
             from django.utils import timezone
@@ -158,7 +180,7 @@ class MessageAttachment(models.Model):
     message = models.ForeignKey(
         PrivateMessage, on_delete=models.CASCADE, related_name="attachments"
     )
-    file = models.FileField(upload_to="message_attachments/")
+    file = models.FileField(upload_to="message_attachments/", storage=get_storage)
     file_name = models.CharField(max_length=255)
     file_size = models.PositiveIntegerField()  # in bytes
     file_type = models.CharField(
@@ -1,3 +1,39 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
 
-# Create your tests here.
+from friendships.models import BlockedUser
+
+from .models import PrivateMessage
+
+
+class BlockedMessagingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.sender = User.objects.create_user(
+            username="sender", email="sender@example.com", password="secret"
+        )
+        self.recipient = User.objects.create_user(
+            username="recipient", email="recipient@example.com", password="secret"
+        )
+
+    def test_blocked_users_cannot_message_each_other(self):
+        BlockedUser.objects.create(blocker=self.recipient, blocked=self.sender)
+        for sender, recipient in (
+            (self.sender, self.recipient),
+            (self.recipient, self.sender),
+        ):
+            with self.assertRaisesMessage(ValueError, "blocked user"):
+                PrivateMessage.objects.create(
+                    sender=sender, recipient=recipient, content="Hello"
+                )
+
+    def test_existing_messages_can_still_be_updated(self):
+        message = PrivateMessage.objects.create(
+            sender=self.sender, recipient=self.recipient, content="Hello"
+        )
+        BlockedUser.objects.create(blocker=self.recipient, blocked=self.sender)
+        message.mark_as_read()
+        message.refresh_from_db()
+        self.assertTrue(message.is_read)
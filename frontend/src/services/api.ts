@@ -1,5 +1,5 @@
 import axios, { AxiosInstance, AxiosResponse } from 'axios';
-import { AuthResponse, LoginCredentials, RegisterData, User, Book, ApiError } from '../types';
+import { AuthResponse, LoginCredentials, RegisterData, User, Book, ApiError, CursorPage, BookSearchParams, BookSearchResult } from '../types';
 
 class ApiService {
   private api: AxiosInstance;
@@ -134,7 +134,16 @@ class ApiService {
   // Book endpoints
   async getBooks(): Promise<Book[]> {
     try {
-      const response = await this.api.get<Book[]>('/books/');
+      const response = await this.api.get<CursorPage<Book>>('/books/');
+      return this.handleResponse(response).items;
+    } catch (error) {
+      return this.handleError(error);
+    }
+  }
+
+  async getBooksPage(cursor?: string, sort: 'title' | 'popular' | 'rating' = 'title'): Promise<CursorPage<Book>> {
+    try {
+      const response = await this.api.get<CursorPage<Book>>('/books/', { params: { cursor, sort } });
       return this.handleResponse(response);
     } catch (error) {
       return this.handleError(error);
@@ -151,9 +160,9 @@ class ApiService {
   }
 
   // Search books
-  async searchBooks(query: string): Promise<Book[]> {
+  async searchBooks(query: string, params: BookSearchParams = {}): Promise<BookSearchResult> {
     try {
-      const response = await this.api.get<Book[]>(`/books/?search=${encodeURIComponent(query)}`);
+      const response = await this.api.get<BookSearchResult>('/books/search', { params: { q: query, ...params } });
       return this.handleResponse(response);
     } catch (error) {
       return this.handleError(error);
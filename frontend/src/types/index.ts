@@ -80,7 +80,14 @@ export interface Book {
   format?: string;
   description?: string;
   genres: Genre[];
+  genre_names?: string[];
+  publisher_name?: string;
   cover_image?: string;
+  cover_urls?: Record<string, string>;
+  review_count?: number;
+  average_rating?: number;
+  owner_count?: number;
+  available_count?: number;
   created_at: string;
   updated_at: string;
 }
@@ -192,7 +199,26 @@ export interface PaginatedResponse<T> {
   previous?: string;
 }
 
+export interface CursorPage<T> {
+  items: T[];
+  next_cursor: string | null;
+}
+
 // Search types
+export interface BookSearchParams {
+  language?: string;
+  genre_id?: number;
+  page?: number;
+  page_size?: number;
+}
+
+export interface BookSearchResult {
+  results: Book[];
+  page: number;
+  has_next: boolean;
+  did_you_mean?: string | null;
+}
+
 export interface SearchFilters {
   query?: string;
   genre?: string;